@@ -1,13 +1,13 @@
 """
 题目管理相关API
 """
-import os
 import json
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import FileResponse
+from typing import Dict, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.utils.database import get_db
-from app.utils.security import get_current_active_user
+from app.utils.security import get_current_active_user, get_optional_user_id
 from app.models.user import User
 from app.models.student_result import StudentResult
 from sqlalchemy.sql import func
@@ -15,69 +15,179 @@ from pydantic import BaseModel
 
 # 引入服务层
 from app.services.problems_service import (
+    get_catalog_snapshot as svc_get_catalog_snapshot,
     get_courses as svc_get_courses,
     get_course_problems as svc_get_course_problems,
     get_problem_markdown_path as svc_get_problem_markdown_path,
     get_problem_solution_path as svc_get_problem_solution_path,
-    mock_run_code as svc_mock_run_code,
-    mock_submit_code as svc_mock_submit_code,
-    run_code_against_tests as svc_run_code_against_tests,
+    get_problem_asset_path as svc_get_problem_asset_path,
     create_problem as svc_create_problem,
     delete_problem as svc_delete_problem,
     create_course as svc_create_course,
     delete_course as svc_delete_course,
 )
+from app.services.case_history_service import get_case_priority, record_case_results
+from app.services.judge import jobs as judge_jobs
+from app.services.judge.dedup import get_submit_coalescer, submit_key
+from app.services.judge.engine import get_engine
+from app.services.judge.metrics import get_judge_metrics
+from app.services.judge.queue import get_judge_queue, JudgeQueueFull
+from app.services.judge.verdict_cache import get_verdict_cache
+from app.services.judge.fixtures import get_test_set_cache, test_set_to_dict
+from app.services.judge.remote import JUDGE_WORKER_TOKEN, TOKEN_HEADER, get_remote_pool, is_loopback
+from app.services.markdown_render import UnsupportedMarkdown, get_markdown_cache
+from app.utils.http_cache import ASSET_CACHE_CONTROL, BytesEntity, file_response
 import asyncio
 
 router = APIRouter(prefix="/problems", tags=["题目管理"])
 
+# 题目索引的响应实体，随目录快照替换：{"index": (快照, BytesEntity)}
+_index_entity: Dict = {}
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "../../../data/problems")  # 指向 problems 文件夹
 
 @router.get("/index", summary="获取题目索引")
-async def get_problem_index():
+async def get_problem_index(request: Request):
     """
-    返回 index.json 内容
+    返回 index.json 内容（经题库目录缓存，文件变化时自动重新加载）；
+    序列化与压缩结果随目录快照缓存，支持 ETag 条件请求
     """
-    index_path = os.path.join(DATA_DIR, "index.json")
-    if not os.path.exists(index_path):
+    snapshot = svc_get_catalog_snapshot()
+    if snapshot.index is None:
         raise HTTPException(status_code=404, detail="index.json 未找到")
-    with open(index_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    cached = _index_entity.get("index")
+    if cached is None or cached[0] is not snapshot:
+        body = json.dumps(snapshot.index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        cached = (snapshot, BytesEntity(body, "application/json"))
+        _index_entity["index"] = cached
+    return cached[1].response(request)
 
 @router.get("/{lesson}/{problem}/problem", summary="获取题目 Markdown")
-async def get_problem_markdown(lesson: str, problem: str):
+async def get_problem_markdown(lesson: str, problem: str, request: Request):
     """
-    读取指定题目的 problem.md 文件
+    读取指定题目的 problem.md 文件（支持 ETag / Last-Modified 条件请求与 gzip 压缩）
     """
-    md_path = os.path.join(DATA_DIR, lesson, problem, "README.md")
-    if not os.path.exists(md_path):
+    md_path = svc_get_problem_markdown_path(lesson, problem)
+    if md_path is None:
         raise HTTPException(status_code=404, detail="题目文件未找到")
-    return FileResponse(md_path, media_type="text/markdown")
+    return await file_response(request, md_path, media_type="text/markdown")
 
 
 @router.get("/{lesson}/{problem}/assets/{filepath:path}", summary="获取题目静态资源（图片/附件）")
-async def get_problem_asset(lesson: str, problem: str, filepath: str):
+async def get_problem_asset(lesson: str, problem: str, filepath: str, request: Request):
     """
-    返回题目目录下的静态资源文件（例如图片），路径为 DATA_DIR/lesson/problem/{filepath}
+    返回题目目录下的静态资源文件（例如图片），路径为 {lesson}/{problem}/{filepath}（不允许跳出题目目录），
+    浏览器可缓存 PROBLEM_ASSET_MAX_AGE 秒，之后按 ETag 重新验证
     """
-    asset_path = os.path.join(DATA_DIR, lesson, problem, filepath)
-    if not os.path.exists(asset_path):
+    asset_path = svc_get_problem_asset_path(lesson, problem, filepath)
+    if asset_path is None:
         raise HTTPException(status_code=404, detail="资源未找到")
-    return FileResponse(asset_path)
+    return await file_response(request, asset_path, cache_control=ASSET_CACHE_CONTROL)
 
 @router.get("/{lesson}/{problem}/solution", summary="获取题目参考答案")
-async def get_problem_solution(lesson: str, problem: str):
+async def get_problem_solution(lesson: str, problem: str, request: Request):
     """
     读取指定题目的 solution.md 文件（如果有）
     """
-    md_path = os.path.join(DATA_DIR, lesson, problem, "solution.md")
-    if not os.path.exists(md_path):
+    md_path = svc_get_problem_solution_path(lesson, problem)
+    if md_path is None:
         raise HTTPException(status_code=404, detail="参考答案未找到")
-    return FileResponse(md_path, media_type="text/markdown")
+    return await file_response(request, md_path, media_type="text/markdown")
+
+async def _rendered_markdown(request: Request, lesson: str, problem: str, md_path: str):
+    """返回 Markdown 文件渲染后的 HTML 片段（磁盘缓存），相对路径的图片与链接指向该题的资源路由；
+    文档用到服务端渲染器不支持的写法时返回 422，客户端改为自行渲染 Markdown 原文"""
+    asset_base = str(request.url_for("get_problem_asset", lesson=lesson, problem=problem, filepath=""))
+    try:
+        html_path = await asyncio.to_thread(get_markdown_cache().get, md_path, asset_base)
+    except UnsupportedMarkdown as e:
+        raise HTTPException(status_code=422, detail=f"该文档包含服务端渲染不支持的写法（{e}），请在客户端渲染")
+    return await file_response(request, html_path, media_type="text/html")
+
+
+@router.get("/{lesson}/{problem}/problem/html", summary="获取题目渲染后的 HTML")
+async def get_problem_html(lesson: str, problem: str, request: Request):
+    """
+    返回服务端渲染并清理过的题面 HTML 片段（按源文件内容缓存，支持条件请求与 gzip）
+    """
+    md_path = svc_get_problem_markdown_path(lesson, problem)
+    if md_path is None:
+        raise HTTPException(status_code=404, detail="题目文件未找到")
+    return await _rendered_markdown(request, lesson, problem, md_path)
+
+
+@router.get("/{lesson}/{problem}/solution/html", summary="获取参考答案渲染后的 HTML")
+async def get_solution_html(lesson: str, problem: str, request: Request):
+    """
+    返回服务端渲染并清理过的参考答案 HTML 片段
+    """
+    md_path = svc_get_problem_solution_path(lesson, problem)
+    if md_path is None:
+        raise HTTPException(status_code=404, detail="参考答案未找到")
+    return await _rendered_markdown(request, lesson, problem, md_path)
+
+def _judge_busy(e: JudgeQueueFull) -> HTTPException:
+    """评测队列已满时的快速拒绝"""
+    return HTTPException(status_code=429, detail=f"评测繁忙，请 {e.retry_after} 秒后重试",
+                         headers={"Retry-After": str(e.retry_after)})
+
+
+def _caller_key(http_request: Request, user_id: Optional[int]):
+    """评测队列中用于按用户轮询的调用者标识：已登录用户按用户ID，未登录时按客户端地址"""
+    if user_id is not None:
+        return user_id
+    return f"ip:{http_request.client.host if http_request.client else 'unknown'}"
+
+
+@router.get("/judge/stats", summary="评测监控")
+async def get_judge_stats():
+    """返回评测队列（并发、排队、等待时间、拒绝次数，以及 submit/run/check 各类别的排队长度）、评测引擎（占用 worker 与等待 worker 的样例数）、
+    结果缓存、测试集缓存与提交去重的统计；
+    queue 模式下另外返回任务表中各状态的任务数（评测引擎与两级缓存位于 worker 进程中），
+    remote 模式下另外返回各远程 worker 的健康状态、在途与完成任务数"""
+    stats = {
+        "mode": judge_jobs.JUDGE_MODE,
+        "queue": get_judge_queue().stats(),
+        "engine": get_engine().stats(),
+        "verdict_cache": get_verdict_cache().stats(),
+        "fixture_cache": get_test_set_cache().stats(),
+        "submit_dedup": get_submit_coalescer().stats(),
+    }
+    if judge_jobs.JUDGE_MODE == 'queue':
+        stats["jobs"] = await asyncio.to_thread(judge_jobs.get_job_store().stats)
+    if judge_jobs.JUDGE_MODE == 'remote':
+        stats["remote"] = get_remote_pool().stats()
+    return stats
+
+
+@router.get("/judge/testsets/{fingerprint}", summary="按指纹获取测试集（远程评测 worker 用）")
+async def get_judge_test_set(fingerprint: str, http_request: Request,
+                             x_judge_token: Optional[str] = Header(None, alias=TOKEN_HEADER)):
+    """返回 API 进程测试集缓存中指纹匹配的测试集（含期望输出）。
+    配置了 JUDGE_WORKER_TOKEN 时须携带相同的 X-Judge-Token，未配置时只接受本机请求"""
+    if JUDGE_WORKER_TOKEN:
+        if x_judge_token != JUDGE_WORKER_TOKEN:
+            raise HTTPException(status_code=401, detail="无效的 worker 令牌")
+    elif not http_request.client or not is_loopback(http_request.client.host):
+        raise HTTPException(status_code=403, detail="未配置 JUDGE_WORKER_TOKEN 时只接受本机 worker")
+    test_set = get_test_set_cache().find(fingerprint)
+    if test_set is None:
+        raise HTTPException(status_code=404, detail="测试集不存在或已更新")
+    return test_set_to_dict(test_set)
+
+
+@router.get("/judge/metrics", summary="评测分阶段耗时")
+async def get_judge_metrics_endpoint():
+    """返回评测各阶段（读取测试集、创建工作目录、编译、启动进程、执行、解码、比较、清理、排队等）的耗时直方图；
+    queue 模式下执行相关的阶段发生在 worker 进程中，这里只包含 API 进程内的阶段（如 admission_wait）"""
+    return {"mode": judge_jobs.JUDGE_MODE, **get_judge_metrics().snapshot()}
+
 
 class CodeExecutionRequest(BaseModel):
     code: str
+    # 仅对 /submit 生效：遇到第一个未通过的样例即停止；不传时取 index.json 中该题的设置
+    fail_fast: Optional[bool] = None
+    # 为真时在结果中附带本次评测的分阶段耗时（timings）
+    debug: bool = False
 
 
 class CreateProblemRequest(BaseModel):
@@ -166,19 +276,22 @@ async def get_course_problem_status(
             path = p.get('path', f"{course_id}/{p.get('problem', '')}")
             problem_paths.append(path)
         
-        # 查询该学生在这些题目上的提交结果
+        # 一次查询该学生在这些课次下的全部提交结果，再按题目路径匹配
+        keys = [tuple(path.split('/')[:2]) for path in problem_paths if len(path.split('/')) >= 2]
+        results = {}
+        if keys:
+            rows = db.query(StudentResult).filter(
+                StudentResult.student_id == current_user.id,
+                StudentResult.lesson.in_({lesson for lesson, _ in keys})
+            ).order_by(StudentResult.id).all()
+            for result in rows:
+                results.setdefault((result.lesson, result.problem), result)
+
         status_map = {}
         for path in problem_paths:
             parts = path.split('/')
             if len(parts) >= 2:
-                lesson = parts[0]
-                problem = parts[1]
-                result = db.query(StudentResult).filter(
-                    StudentResult.student_id == current_user.id,
-                    StudentResult.lesson == lesson,
-                    StudentResult.problem == problem
-                ).first()
-                
+                result = results.get((parts[0], parts[1]))
                 if result:
                     status_map[path] = {
                         "passed": bool(result.passed),
@@ -195,21 +308,31 @@ async def get_course_problem_status(
         raise HTTPException(status_code=500, detail=f"获取题目状态失败: {str(e)}")
 
 @router.post("/{lesson}/{problem}/run", summary="运行代码")
-async def run_code(lesson: str, problem: str, request: CodeExecutionRequest):
+async def run_code(lesson: str, problem: str, request: CodeExecutionRequest, http_request: Request,
+                   user_id: Optional[int] = Depends(get_optional_user_id)):
     """
     模拟运行代码并返回结果
     """
-    return await svc_mock_run_code(lesson,problem,request.code)
+    try:
+        async with get_judge_queue().slot("run", _caller_key(http_request, user_id)):
+            return await judge_jobs.judge("run", {"lesson": lesson, "problem": problem, "code": request.code,
+                                                  "debug": request.debug})
+    except JudgeQueueFull as e:
+        raise _judge_busy(e)
+
+def _case_priority(db: Session, current_user: User, lesson: str, problem: str):
+    """查询该学生本题应优先执行的样例；查询失败时按默认顺序评测"""
+    try:
+        return get_case_priority(db, current_user.id if current_user else None, lesson, problem)
+    except Exception:
+        db.rollback()
+        return None
 
-@router.post("/{lesson}/{problem}/submit", summary="提交代码")
-async def submit_code(lesson: str, problem: str, request: CodeExecutionRequest,
-                      current_user: User = Depends(get_current_active_user),
-                      db: Session = Depends(get_db)):
-    """
-    模拟提交代码并返回测评结果，并记录学生提交结果到数据库
-    """
-    res = await svc_mock_submit_code(lesson, problem, request.code)
 
+def _record_submit_result(db: Session, current_user: User, lesson: str, problem: str, res: dict):
+    """根据评测汇总结果更新或创建 StudentResult，再在单独的事务中更新样例失败记录；
+    样例统计写入失败不影响已提交的 StudentResult，命中结果缓存（res["cached"]）时样例没有实际执行，不计入统计
+    """
     try:
         # 兼容返回格式：res 包含 total 和 passed（数量）
         total = int(res.get('total', 0))
@@ -218,7 +341,7 @@ async def submit_code(lesson: str, problem: str, request: CodeExecutionRequest,
         
         # 判断是否通过：
         # 1. 如果题目不需要测试（total=0 且 message 包含"无需测试"），直接标记为通过
-        # 2. 否则根据测试结果判断（passed_count >= total）
+        # 2. 否则根据测试结果判断（passed_count >= total）；fail-fast 跳过的样例计入 total，不会误判为通过
         message = res.get('message', '')
         if total == 0 and ('无需测试' in message or '无需测试' in res.get('result', '')):
             overall_passed = True
@@ -249,17 +372,117 @@ async def submit_code(lesson: str, problem: str, request: CodeExecutionRequest,
             db.commit()
     except Exception:
         db.rollback()
+        return
+    if not current_user or not current_user.id or res.get('cached'):
+        return
+    try:
+        record_case_results(db, current_user.id, lesson, problem, res)
+        db.commit()
+    except Exception:
+        db.rollback()
+
+
+@router.post("/{lesson}/{problem}/submit", summary="提交代码")
+async def submit_code(lesson: str, problem: str, request: CodeExecutionRequest, response: Response,
+                      idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                      current_user: User = Depends(get_current_active_user),
+                      db: Session = Depends(get_db)):
+    """
+    模拟提交代码并返回测评结果，并记录学生提交结果到数据库；
+    短时间内重复到达的相同提交（或相同 Idempotency-Key）等待并返回第一次的结果，只记录一次（见 judge.dedup）
+    """
+    key = submit_key(current_user.id, lesson, problem, request.code, request.fail_fast, idempotency_key)
 
+    async def _judge():
+        priority = _case_priority(db, current_user, lesson, problem)
+        async with get_judge_queue().slot("submit", current_user.id):
+            res = await judge_jobs.judge("submit", {"lesson": lesson, "problem": problem, "code": request.code,
+                                                    "fail_fast": request.fail_fast, "priority": priority,
+                                                    "debug": request.debug})
+        _record_submit_result(db, current_user, lesson, problem, res)
+        return res
+
+    try:
+        res, replayed = await get_submit_coalescer().run(key, _judge)
+    except JudgeQueueFull as e:
+        raise _judge_busy(e)
+    if replayed:
+        response.headers["X-Idempotent-Replay"] = "true"
     return res
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/{lesson}/{problem}/submit/stream", summary="提交代码（SSE 流式返回）")
+async def submit_code_stream(lesson: str, problem: str, request: CodeExecutionRequest,
+                             idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                             current_user: User = Depends(get_current_active_user),
+                             db: Session = Depends(get_db)):
+    """
+    与 /submit 相同的评测与记录逻辑，但以 Server-Sent Events 返回：
+    每个样例完成后立即发送一条 `event: case`（按完成顺序，data 为 testResults 中的一项），
+    最后发送 `event: summary`（data 为不含 testResults 的汇总结果）；
+    与进行中或刚完成的提交重复时，等到第一次的结果后一次性发送全部样例
+    """
+    key = submit_key(current_user.id, lesson, problem, request.code, request.fail_fast, idempotency_key)
+    coalescer = get_submit_coalescer()
+
+    async def _events():
+        accepted = False
+        while True:
+            leader, fut = coalescer.claim(key)
+            if leader:
+                break
+            if not accepted:
+                accepted = True
+                yield ": accepted\n\n"
+            res = await coalescer.wait(fut)
+            if res is None:
+                # 第一次提交未完成评测，改由本请求评测
+                continue
+            for entry in res.get("testResults") or []:
+                yield _sse("case", entry)
+            yield _sse("summary", {k: v for k, v in res.items() if k != "testResults"})
+            return
+
+        try:
+            priority = _case_priority(db, current_user, lesson, problem)
+            async with get_judge_queue().slot("submit", current_user.id):
+                if not accepted:
+                    # 首条注释在取得评测名额后立即产出，见下方预取
+                    yield ": accepted\n\n"
+                async for event, payload in judge_jobs.iter_submit(lesson, problem, request.code, request.fail_fast,
+                                                                   priority, request.debug):
+                    if event == "summary":
+                        _record_submit_result(db, current_user, lesson, problem, payload)
+                        coalescer.resolve(key, fut, payload)
+                        payload = {k: v for k, v in payload.items() if k != "testResults"}
+                    yield _sse(event, payload)
+        finally:
+            coalescer.abandon(key, fut)
+
+    # 在开始响应前预取第一条，使排队已满时仍能返回 429；之后名额随生成器结束（或被回收）释放
+    events = _events()
+    try:
+        await events.__anext__()
+    except JudgeQueueFull as e:
+        raise _judge_busy(e)
+
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 class CheckTestsRequest(BaseModel):
     code: str
     tests: list
+    debug: bool = False
 
 
 @router.post('/check_tests', summary='检查测评集（教师向导用）')
-async def check_tests(request: CheckTestsRequest):
+async def check_tests(request: CheckTestsRequest, http_request: Request,
+                      user_id: Optional[int] = Depends(get_optional_user_id)):
     """接收任意代码与 tests（[{input, output}, ...]），在后端运行并返回每个用例的结果。
     该接口不创建题目，仅用于向导中检测测评集是否正确。
     """
@@ -274,5 +497,9 @@ async def check_tests(request: CheckTestsRequest):
     except Exception:
         pass
 
-    res = await asyncio.to_thread(lambda: svc_run_code_against_tests(code, request.tests))
+    try:
+        async with get_judge_queue().slot("check", _caller_key(http_request, user_id)):
+            res = await judge_jobs.judge("check", {"code": code, "tests": request.tests, "debug": request.debug})
+    except JudgeQueueFull as e:
+        raise _judge_busy(e)
     return res
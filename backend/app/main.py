@@ -13,6 +13,9 @@ from app.api.resources import router as resources_router  # 添加这一行
 from app.api.ai.routes import router as ai_router
 from app.api.analytics import router as analytics_router
 from app.utils.database import init_db
+from app.services.judge.runner import shutdown as shutdown_judge
+from app.services.problem_catalog import compact_catalogs, get_problem_catalog
+from app.services.problems_service import DATA_DIR
 import uvicorn
 
 # 创建FastAPI应用实例
@@ -94,6 +97,9 @@ async def startup_event():
     # 初始化数据库
     init_db()
     print("数据库初始化完成")
+    # 合并上次未正常关闭时遗留的题库变更日志
+    get_problem_catalog(DATA_DIR)
+    compact_catalogs()
 
 
 @app.on_event("shutdown")
@@ -101,6 +107,10 @@ async def shutdown_event():
     """
     应用关闭事件
     """
+    # 释放评测 worker 池与 zygote 进程
+    shutdown_judge()
+    # 把题库变更日志合并进 index.json / courses.json
+    compact_catalogs()
     print("应用正在关闭...")
 
 
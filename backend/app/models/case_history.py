@@ -0,0 +1,44 @@
+"""
+样例评测历史模型
+记录每个学生在某题上一次提交未通过的样例，以及每道题各样例在所有学生提交中的失败次数，
+用于再次提交时优先执行最可能失败的样例
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, JSON
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class StudentCaseFailure(Base):
+    """学生在某题上一次提交未通过的样例"""
+    __tablename__ = 'student_case_failures'
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey('users.id'), nullable=False, comment='学生ID')
+    lesson = Column(String(100), nullable=False, comment='课次/目录')
+    problem = Column(String(100), nullable=False, comment='题目标识')
+    failed_cases = Column(JSON, default=list, comment='上次未通过的样例名')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+    __table_args__ = (
+        UniqueConstraint('student_id', 'lesson', 'problem', name='uq_case_failure_student_problem'),
+    )
+
+
+class ProblemCaseStat(Base):
+    """某题单个样例的累计执行与失败次数（所有学生）"""
+    __tablename__ = 'problem_case_stats'
+
+    id = Column(Integer, primary_key=True, index=True)
+    lesson = Column(String(100), nullable=False, comment='课次/目录')
+    problem = Column(String(100), nullable=False, comment='题目标识')
+    case = Column(String(100), nullable=False, comment='样例名')
+    runs = Column(Integer, default=0, comment='执行次数')
+    failures = Column(Integer, default=0, comment='未通过次数')
+
+    __table_args__ = (
+        UniqueConstraint('lesson', 'problem', 'case', name='uq_case_stat_problem_case'),
+    )
+
+    @property
+    def failure_rate(self) -> float:
+        return (self.failures or 0) / self.runs if self.runs else 0.0
@@ -0,0 +1,55 @@
+"""
+题库目录模型（PROBLEM_CATALOG_BACKEND=db 时使用）
+课程、题目条目与测试集元信息存放在带索引的表中，index.json / courses.json 仍是导入导出的交换格式
+"""
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class CatalogCourse(Base):
+    """courses.json 中的一门课程"""
+    __tablename__ = 'catalog_courses'
+
+    id = Column(String(100), primary_key=True, comment='课程ID（题库目录名）')
+    name = Column(String(200), nullable=False, comment='课程名称')
+    position = Column(Integer, nullable=False, default=0, comment='在 courses.json 中的顺序')
+
+
+class CatalogProblem(Base):
+    """index.json 中的一个题目条目"""
+    __tablename__ = 'catalog_problems'
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(200), nullable=False, unique=True, comment='lesson/problem 目录路径')
+    course_id = Column(String(100), nullable=False, index=True, comment='课程ID（path 的第一段）')
+    lesson = Column(String(100), nullable=True, comment='index.json 中的 lesson 字段')
+    problem = Column(String(100), nullable=True, comment='index.json 中的 problem 字段')
+    title = Column(String(200), nullable=True, comment='标题')
+    has_test = Column(Boolean, nullable=True, comment='是否需要测试')
+    position = Column(Integer, nullable=False, default=0, comment='在 index.json 中的顺序')
+    data = Column(JSON, nullable=False, comment='完整条目（含 time_limit 等可选字段）')
+
+    __table_args__ = (
+        Index('ix_catalog_problems_course_position', 'course_id', 'position'),
+        Index('ix_catalog_problems_lesson_problem', 'lesson', 'problem'),
+    )
+
+
+class CatalogTestSet(Base):
+    """题目测试集的元信息（不含样例内容，样例仍从题库目录读取）"""
+    __tablename__ = 'catalog_test_sets'
+
+    path = Column(String(200), primary_key=True, comment='lesson/problem 目录路径')
+    fingerprint = Column(String(64), nullable=True, comment='测试目录指纹')
+    case_count = Column(Integer, default=0, comment='样例数（.in 文件数）')
+    bytes = Column(Integer, default=0, comment='测试文件总大小')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+
+class CatalogMeta(Base):
+    """目录版本号：每次写入加一，各进程据此判断内存快照是否过期"""
+    __tablename__ = 'catalog_meta'
+
+    key = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
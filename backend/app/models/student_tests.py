@@ -2,21 +2,18 @@
 学生测试题数据读取模块
 读取 backend/data/problems/index.json 并提供查询接口
 """
-import json
 import os
 from typing import List, Dict
 
+from app.services.problem_catalog import get_problem_catalog
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-PROBLEMS_INDEX = os.path.join(BASE_DIR, 'data', 'problems', 'index.json')
+PROBLEMS_DIR = os.path.join(BASE_DIR, 'data', 'problems')
 
 
 def load_all_problems() -> List[Dict]:
-    """加载所有题目索引（如果文件存在）"""
-    try:
-        with open(PROBLEMS_INDEX, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    """加载所有题目索引（如果文件存在），经题库目录缓存"""
+    return list(get_problem_catalog(PROBLEMS_DIR).snapshot().index or [])
 
 
 def get_tests_for_student(student_id: int) -> List[Dict]:
@@ -0,0 +1,86 @@
+"""
+样例执行顺序（优先执行最可能失败的样例）
+学生再次提交同一题时，先执行该学生上次未通过的样例，其余样例按该题历史失败率从高到低排列；
+没有历史记录的样例保持原有的数字顺序。只影响执行（与 fail-fast 停止）的先后，评测结果仍按样例编号返回。
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.case_history import StudentCaseFailure, ProblemCaseStat
+
+
+def get_case_priority(db: Session, student_id: Optional[int], lesson: str, problem: str) -> List[str]:
+    """返回应优先执行的样例名（上次失败的在前，其后按历史失败率降序），未列出的样例排在最后"""
+    stats = db.query(ProblemCaseStat).filter(
+        ProblemCaseStat.lesson == lesson,
+        ProblemCaseStat.problem == problem,
+        ProblemCaseStat.failures > 0,
+    ).all()
+    # sorted 是稳定排序，失败率相同的样例保持查询顺序
+    order = [s.case for s in sorted(stats, key=lambda s: s.failure_rate, reverse=True)]
+    if student_id:
+        record = db.query(StudentCaseFailure).filter(
+            StudentCaseFailure.student_id == student_id,
+            StudentCaseFailure.lesson == lesson,
+            StudentCaseFailure.problem == problem,
+        ).first()
+        if record and record.failed_cases:
+            last_failed = [str(name) for name in record.failed_cases]
+            order = last_failed + [name for name in order if name not in set(last_failed)]
+    return order
+
+
+def _bump_case_stat(db: Session, lesson: str, problem: str, case: str, failed: bool):
+    """样例执行次数加一（未通过时失败次数也加一）：直接在 SQL 中累加，并发提交不会丢失计数"""
+    where = (ProblemCaseStat.lesson == lesson, ProblemCaseStat.problem == problem, ProblemCaseStat.case == case)
+    increment = update(ProblemCaseStat).where(*where).values(
+        runs=func.coalesce(ProblemCaseStat.runs, 0) + 1,
+        failures=func.coalesce(ProblemCaseStat.failures, 0) + (1 if failed else 0),
+    )
+    if db.execute(increment).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(ProblemCaseStat(lesson=lesson, problem=problem, case=case, runs=1, failures=1 if failed else 0))
+    except IntegrityError:
+        # 其他请求同时插入了这一行，改为累加
+        db.execute(increment)
+
+
+def record_case_results(db: Session, student_id: Optional[int], lesson: str, problem: str, res: Dict):
+    """按一次提交的 testResults 更新样例失败统计与该学生上次未通过的样例（调用方负责提交事务）。
+    编译错误与 fail-fast 跳过的样例没有实际执行，不计入统计；跳过的样例沿用上次的失败记录。
+    """
+    entries = res.get('testResults') or []
+    if not entries or res.get('compile_error'):
+        return
+    executed = [e for e in entries if e.get('test') and not e.get('skipped')]
+    skipped = {e.get('test') for e in entries if e.get('skipped')}
+    for e in executed:
+        _bump_case_stat(db, lesson, problem, e['test'], not e.get('passed'))
+
+    if not student_id:
+        return
+    record = db.query(StudentCaseFailure).filter(
+        StudentCaseFailure.student_id == student_id,
+        StudentCaseFailure.lesson == lesson,
+        StudentCaseFailure.problem == problem,
+    ).first()
+    failed = [e['test'] for e in executed if not e.get('passed')]
+    if record is not None:
+        failed += [name for name in (record.failed_cases or []) if name in skipped and name not in failed]
+        record.failed_cases = failed
+        return
+    try:
+        with db.begin_nested():
+            db.add(StudentCaseFailure(student_id=student_id, lesson=lesson, problem=problem, failed_cases=failed))
+    except IntegrityError:
+        # 同一学生的另一次提交刚插入了记录，以本次结果为准
+        db.query(StudentCaseFailure).filter(
+            StudentCaseFailure.student_id == student_id,
+            StudentCaseFailure.lesson == lesson,
+            StudentCaseFailure.problem == problem,
+        ).update({StudentCaseFailure.failed_cases: failed}, synchronize_session=False)
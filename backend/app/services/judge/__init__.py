@@ -0,0 +1,3 @@
+"""
+评测（judge）逻辑层 初始化
+"""
@@ -0,0 +1,225 @@
+"""
+基于 asyncio 子进程的执行后端（JUDGE_BACKEND=asyncio）
+直接在事件循环中启动子进程并异步等待，超时即杀掉整个进程组；运行中的样例不占用任何线程。
+Linux 上用 posix_spawn + pidfd 等待退出，再 wait4 回收以取得 CPU 时间与峰值内存；
+其他平台退回 asyncio.create_subprocess_exec，只测量墙钟时间。
+"""
+import os
+import time
+import asyncio
+from typing import Optional
+
+from app.services.judge import metrics, proc, runner
+from app.services.judge.runner import RunResult
+
+HAS_PIDFD = proc.HAS_SPAWN and hasattr(os, 'pidfd_open')
+
+
+def _kill(process: asyncio.subprocess.Process):
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, 9)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _read_bounded(stream: asyncio.StreamReader, limit: int, exceeded: asyncio.Event) -> bytes:
+    """读取到 EOF 或超过 limit 字节为止（超出时置位 exceeded），返回不超过 limit 字节的内容"""
+    chunks, size = [], 0
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        if size + len(chunk) > limit:
+            chunks.append(chunk[:limit - size])
+            exceeded.set()
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks)
+
+
+async def _feed(stream: asyncio.StreamWriter, data: bytes):
+    try:
+        if data:
+            stream.write(data)
+            await stream.drain()
+        stream.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+def _abandon(fut: asyncio.Future):
+    """取消不再需要的读写任务，并取走其异常以免事件循环告警"""
+    fut.cancel()
+    fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+async def _run_exec(argv, stdin_data: str, timeout: float) -> RunResult:
+    start = time.monotonic()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            # 独立进程组，超时时连同学生代码派生的子进程一起杀掉
+            start_new_session=hasattr(os, 'killpg'),
+        )
+    except Exception as e:
+        return RunResult(-2, "", str(e), False)
+
+    exceeded = asyncio.Event()
+    io = asyncio.gather(
+        _read_bounded(process.stdout, runner.OUTPUT_LIMIT, exceeded),
+        _read_bounded(process.stderr, runner.OUTPUT_LIMIT, exceeded),
+        _feed(process.stdin, stdin_data.encode("utf-8")),
+    )
+    stop = asyncio.ensure_future(exceeded.wait())
+    try:
+        await asyncio.wait_for(asyncio.wait({io, stop}, return_when=asyncio.FIRST_COMPLETED), timeout)
+        if exceeded.is_set():
+            _kill(process)
+            _abandon(io)
+            await process.wait()
+            return RunResult(-1, "", "Output limit exceeded", False, time.monotonic() - start, output_exceeded=True)
+        out, err, _ = io.result()
+        await asyncio.wait_for(process.wait(), max(0.0, start + timeout - time.monotonic()))
+    except asyncio.TimeoutError:
+        _kill(process)
+        _abandon(io)
+        await process.wait()
+        return RunResult(-1, "", "Timeout", True, time.monotonic() - start)
+    except asyncio.CancelledError:
+        _kill(process)
+        _abandon(io)
+        raise
+    except Exception as e:
+        _kill(process)
+        _abandon(io)
+        return RunResult(-2, "", str(e), False)
+    finally:
+        stop.cancel()
+
+    wall_time = time.monotonic() - start
+    with metrics.stage('decode'):
+        stdout = out.decode("utf-8", errors="replace")
+        stderr = err.decode("utf-8", errors="replace")
+    return RunResult(process.returncode, stdout, stderr, False, wall_time)
+
+
+async def _run_pidfd(argv, stdin_data: str, timeout: float, cpu_limit: Optional[float],
+                     memory_limit_kb: Optional[int] = None) -> RunResult:
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    in_r, in_w = os.pipe()
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    try:
+        pid = proc.spawn(argv, in_r, out_w, err_w, cpu_limit=cpu_limit, memory_limit_kb=memory_limit_kb)
+    except Exception as e:
+        for fd in (in_w, out_r, err_r):
+            os.close(fd)
+        return RunResult(-2, "", str(e), False)
+    finally:
+        for fd in (in_r, out_w, err_w):
+            os.close(fd)
+
+    pidfd = os.pidfd_open(pid)
+    exited = loop.create_future()
+    exceeded = loop.create_future()
+    chunks = {out_r: [], err_r: []}
+    sizes = {out_r: 0, err_r: 0}
+    eof = {out_r: loop.create_future(), err_r: loop.create_future()}
+    pending = memoryview(stdin_data.encode("utf-8"))
+    open_fds = {pidfd, out_r, err_r, in_w}
+
+    def _close(fd):
+        if fd in open_fds:
+            open_fds.discard(fd)
+            loop.remove_reader(fd)
+            loop.remove_writer(fd)
+            os.close(fd)
+
+    def _on_exit():
+        loop.remove_reader(pidfd)
+        if not exited.done():
+            exited.set_result(None)
+
+    def _on_read(fd):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        if data:
+            if sizes[fd] + len(data) > runner.OUTPUT_LIMIT:
+                # 输出超限：保留上限以内的部分并停止读取
+                chunks[fd].append(data[:runner.OUTPUT_LIMIT - sizes[fd]])
+                _close(fd)
+                if not exceeded.done():
+                    exceeded.set_result(None)
+                return
+            sizes[fd] += len(data)
+            chunks[fd].append(data)
+        else:
+            _close(fd)
+            if not eof[fd].done():
+                eof[fd].set_result(None)
+
+    def _on_write():
+        nonlocal pending
+        try:
+            n = os.write(in_w, pending[:65536])
+            pending = pending[n:]
+        except BlockingIOError:
+            return
+        except BrokenPipeError:
+            pending = pending[:0]
+        if not pending:
+            _close(in_w)
+
+    for fd in (out_r, err_r, in_w):
+        os.set_blocking(fd, False)
+    loop.add_reader(pidfd, _on_exit)
+    loop.add_reader(out_r, _on_read, out_r)
+    loop.add_reader(err_r, _on_read, err_r)
+    if pending:
+        loop.add_writer(in_w, _on_write)
+    else:
+        _close(in_w)
+
+    finished = asyncio.gather(exited, eof[out_r], eof[err_r])
+    try:
+        await asyncio.wait_for(asyncio.wait({finished, exceeded}, return_when=asyncio.FIRST_COMPLETED), timeout)
+        if exceeded.done():
+            cpu_time, max_rss = proc.usage_of(proc.kill_group(pid))
+            return RunResult(-1, b''.join(chunks[out_r]).decode("utf-8", errors="replace"), "Output limit exceeded",
+                             False, time.monotonic() - start, cpu_time, max_rss, True)
+    except asyncio.TimeoutError:
+        cpu_time, max_rss = proc.usage_of(proc.kill_group(pid))
+        return RunResult(-1, "", "Timeout", True, time.monotonic() - start, cpu_time, max_rss)
+    except BaseException:
+        proc.kill_group(pid)
+        raise
+    finally:
+        finished.cancel()
+        for fd in list(open_fds):
+            _close(fd)
+
+    _, status, rusage = os.wait4(pid, 0)
+    cpu_time, max_rss = proc.usage_of(rusage)
+    wall_time = time.monotonic() - start
+    with metrics.stage('decode'):
+        stdout = b''.join(chunks[out_r]).decode("utf-8", errors="replace")
+        stderr = b''.join(chunks[err_r]).decode("utf-8", errors="replace")
+    return RunResult(os.waitstatus_to_exitcode(status), stdout, stderr, False, wall_time, cpu_time, max_rss)
+
+
+async def run_file_async(file_path: str, stdin_data: str, timeout: float = 5, pyc_path: Optional[str] = None,
+                         cpu_limit: Optional[float] = None, memory_limit_kb: Optional[int] = None) -> RunResult:
+    argv = [runner.PYTHON_BIN, pyc_path or file_path]
+    if HAS_PIDFD:
+        return await _run_pidfd(argv, stdin_data, timeout, cpu_limit, memory_limit_kb)
+    if os.name == 'posix':
+        argv = proc.limited_argv(argv, cpu_limit, memory_limit_kb)
+    return await _run_exec(argv, stdin_data, timeout)
@@ -0,0 +1,253 @@
+"""
+执行后端（ExecutionBackend）
+所有执行方式实现同一接口：对已写入磁盘（并可能已字节编译）的 main.py 执行一次样例，返回 RunResult。
+由 JUDGE_BACKEND 选择：
+- subprocess: 每个样例冷启动一个解释器（默认，隔离最彻底）
+- asyncio: 同 subprocess，但在事件循环中等待子进程，运行中的样例不占线程（见 aio.py）
+- zygote（别名 forkserver）: 从预热的 zygote 进程 fork 子进程执行（仅 POSIX，见 zygote.py）
+- batched: 每份代码启动一个常驻进程，所有样例在该进程内依次执行（见 batch_server.py），
+  省去每个样例的进程创建，但样例之间共享解释器状态
+
+Workspace 通过 get_backend() 取得当前后端；基准对比见 benchmarks/bench_backends.py。
+"""
+import os
+import json
+import time
+import select
+import struct
+import threading
+from typing import Callable, Dict, List, Optional
+
+from app.services.judge import metrics, proc, runner
+from app.services.judge.runner import RunResult
+
+OnStart = Optional[Callable[[int], None]]
+
+
+class ExecutionBackend:
+    """执行后端基类。run 为阻塞调用，在评测 worker 池线程中执行；
+    is_async 为 True 的后端实现原生的 run_async，不占用线程"""
+
+    name = 'base'
+    is_async = False
+    # 执行进程与本进程为同一解释器时可直接加载本进程编译出的 .pyc
+    same_interpreter = False
+
+    def run(self, file_path: str, stdin_data: str, timeout: float, pyc_path: Optional[str] = None,
+            cpu_limit: Optional[float] = None, on_start: OnStart = None,
+            memory_limit_kb: Optional[int] = None) -> RunResult:
+        raise NotImplementedError
+
+    async def run_async(self, file_path: str, stdin_data: str, timeout: float, pyc_path: Optional[str] = None,
+                        cpu_limit: Optional[float] = None, on_start: OnStart = None,
+                        memory_limit_kb: Optional[int] = None) -> RunResult:
+        from app.services.judge.engine import get_engine
+        return await get_engine().run(self.run, file_path, stdin_data, timeout, pyc_path, cpu_limit, on_start,
+                                      memory_limit_kb)
+
+    def release(self, file_path: str):
+        """该代码的所有样例执行完毕（Workspace 关闭时调用）"""
+
+    def close(self):
+        """释放后端持有的进程（应用退出时调用）"""
+
+
+class SubprocessBackend(ExecutionBackend):
+    name = 'subprocess'
+
+    def run(self, file_path, stdin_data, timeout, pyc_path=None, cpu_limit=None, on_start=None, memory_limit_kb=None):
+        return runner._run_cold(file_path, stdin_data, timeout, pyc_path, cpu_limit, on_start, memory_limit_kb)
+
+
+class AsyncioBackend(SubprocessBackend):
+    name = 'asyncio'
+    is_async = True
+
+    async def run_async(self, file_path, stdin_data, timeout, pyc_path=None, cpu_limit=None, on_start=None,
+                        memory_limit_kb=None):
+        from app.services.judge.aio import run_file_async
+        return await run_file_async(file_path, stdin_data, timeout, pyc_path=pyc_path, cpu_limit=cpu_limit,
+                                    memory_limit_kb=memory_limit_kb)
+
+
+class ZygoteBackend(ExecutionBackend):
+    name = 'zygote'
+    same_interpreter = True
+
+    def run(self, file_path, stdin_data, timeout, pyc_path=None, cpu_limit=None, on_start=None, memory_limit_kb=None):
+        from app.services.judge.zygote import get_zygote_pool, ZygoteError
+        try:
+            return get_zygote_pool().run(file_path, stdin_data, timeout, pyc_path=pyc_path, cpu_limit=cpu_limit,
+                                         on_start=on_start, memory_limit_kb=memory_limit_kb)
+        except ZygoteError:
+            # zygote 不可用时退回冷启动，保证评测不中断
+            return runner._run_cold(file_path, stdin_data, timeout, cpu_limit=cpu_limit, on_start=on_start,
+                                    memory_limit_kb=memory_limit_kb)
+
+    def close(self):
+        from app.services.judge.zygote import close_zygote_pool
+        close_zygote_pool()
+
+
+class _BatchProcess:
+    """一个 batch_server 进程（只服务一份代码）"""
+
+    def __init__(self, file_path: str, pyc_path: Optional[str], memory_limit_kb: Optional[int] = None):
+        from app.services.judge.zygote import BACKEND_ROOT, ZYGOTE_PYTHON
+        in_r, self.in_w = os.pipe()
+        self.out_r, out_w = os.pipe()
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (BACKEND_ROOT, env.get('PYTHONPATH')) if p)
+        argv = [ZYGOTE_PYTHON, '-m', 'app.services.judge.batch_server', file_path, pyc_path or '-']
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        try:
+            # 进程只服务一份代码（同一道题），内存上限在启动时设置；CPU 时间跨样例累计，不能用 RLIMIT_CPU 限制
+            self.pid = proc.spawn(argv, in_r, out_w, devnull, env=env, memory_limit_kb=memory_limit_kb)
+        finally:
+            for fd in (in_r, out_w, devnull):
+                os.close(fd)
+        try:
+            if not self._recv(time.monotonic() + 10).get('ready'):
+                raise OSError('batch 进程启动失败')
+        except BaseException:
+            self.kill()
+            raise
+
+    def _read_exact(self, n: int, deadline: float) -> bytes:
+        buf = b''
+        while len(buf) < n:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.out_r], [], [], remaining)[0]:
+                raise TimeoutError
+            chunk = os.read(self.out_r, n - len(buf))
+            if not chunk:
+                raise EOFError
+            buf += chunk
+        return buf
+
+    def _recv(self, deadline: float) -> Dict:
+        (size,) = struct.unpack('>I', self._read_exact(4, deadline))
+        return json.loads(self._read_exact(size, deadline).decode('utf-8'))
+
+    def request(self, stdin_data: str, deadline: float) -> Dict:
+        data = json.dumps({"stdin": stdin_data, "output_limit": runner.OUTPUT_LIMIT}).encode('utf-8')
+        data = struct.pack('>I', len(data)) + data
+        while data:
+            n = os.write(self.in_w, data)
+            data = data[n:]
+        (size,) = struct.unpack('>I', self._read_exact(4, deadline))
+        frame = self._read_exact(size, deadline)
+        with metrics.stage('decode'):
+            return json.loads(frame.decode('utf-8'))
+
+    def kill(self):
+        """杀掉进程并回收，返回 (CPU 秒数, 峰值内存 KB)"""
+        usage = proc.usage_of(proc.kill_group(self.pid))
+        self._close_fds()
+        return usage
+
+    def close(self):
+        # 关闭请求管道后进程读到 EOF 自行退出
+        self._close_fds()
+        proc.wait_exit(self.pid, time.monotonic() + 1)
+
+    def _close_fds(self):
+        for fd in (self.in_w, self.out_r):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class BatchedBackend(ExecutionBackend):
+    """同一份代码的样例复用常驻进程；并行的样例各用一个进程，空闲进程在 release 时关闭"""
+
+    name = 'batched'
+    same_interpreter = True
+
+    def __init__(self):
+        self._idle: Dict[str, List[_BatchProcess]] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, file_path: str, pyc_path: Optional[str], memory_limit_kb: Optional[int]) -> _BatchProcess:
+        with self._lock:
+            idle = self._idle.get(file_path)
+            if idle:
+                return idle.pop()
+        return _BatchProcess(file_path, pyc_path, memory_limit_kb)
+
+    def run(self, file_path, stdin_data, timeout, pyc_path=None, cpu_limit=None, on_start=None, memory_limit_kb=None):
+        start = time.monotonic()
+        try:
+            bp = self._acquire(file_path, pyc_path, memory_limit_kb)
+        except (OSError, ValueError, EOFError, TimeoutError):
+            # 冷启动解释器不一定能加载本进程编译的 .pyc，回退时执行源码
+            return runner._run_cold(file_path, stdin_data, timeout, cpu_limit=cpu_limit, on_start=on_start,
+                                    memory_limit_kb=memory_limit_kb)
+        if on_start is not None:
+            on_start(bp.pid)
+        try:
+            resp = bp.request(stdin_data, start + timeout)
+        except TimeoutError:
+            cpu_time, max_rss = bp.kill()
+            return RunResult(-1, "", "Timeout", True, time.monotonic() - start, cpu_time, max_rss)
+        except (OSError, EOFError, ValueError):
+            # 进程被终止（取消）或学生代码直接退出了进程（如 os._exit），该样例退回冷启动执行
+            bp.kill()
+            return runner._run_cold(file_path, stdin_data, max(0.1, start + timeout - time.monotonic()),
+                                    cpu_limit=cpu_limit, on_start=on_start, memory_limit_kb=memory_limit_kb)
+        with self._lock:
+            self._idle.setdefault(file_path, []).append(bp)
+        return RunResult(resp['returncode'], resp['stdout'], resp['stderr'], False, time.monotonic() - start,
+                         resp.get('cpu_time', 0.0), resp.get('max_rss', 0), resp.get('output_exceeded', False))
+
+    def release(self, file_path: str):
+        with self._lock:
+            idle = self._idle.pop(file_path, [])
+        for bp in idle:
+            bp.close()
+
+    def close(self):
+        with self._lock:
+            paths = list(self._idle)
+        for file_path in paths:
+            self.release(file_path)
+
+
+BACKENDS = {
+    'subprocess': SubprocessBackend,
+    'asyncio': AsyncioBackend,
+    'zygote': ZygoteBackend,
+    'forkserver': ZygoteBackend,
+    'batched': BatchedBackend,
+}
+
+_instances: Dict[str, ExecutionBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def create_backend(name: str) -> ExecutionBackend:
+    """按名称新建后端实例；不支持的名称（或当前平台不支持 fork）退回 subprocess"""
+    cls = BACKENDS.get(name, SubprocessBackend)
+    if cls in (ZygoteBackend, BatchedBackend) and not (hasattr(os, 'fork') and proc.HAS_SPAWN):
+        cls = SubprocessBackend
+    return cls()
+
+
+def get_backend() -> ExecutionBackend:
+    """返回 JUDGE_BACKEND 对应的共享后端实例"""
+    name = runner.JUDGE_BACKEND
+    with _instances_lock:
+        backend = _instances.get(name)
+        if backend is None:
+            backend = _instances[name] = create_backend(name)
+        return backend
+
+
+def close_backends():
+    """关闭所有已创建的后端（应用退出时调用）"""
+    with _instances_lock:
+        backends = list(_instances.values())
+        _instances.clear()
+    for backend in backends:
+        backend.close()
@@ -0,0 +1,141 @@
+"""
+批量执行进程主程序（JUDGE_BACKEND=batched，由 backends.BatchedBackend 以 `python -m` 启动）
+一个进程只服务一份代码：启动时加载一次字节码，之后对每个请求在本进程内重新执行一遍，
+用内存中的 stdin/stdout 代替管道，省去每个样例的进程创建开销。
+
+与 zygote 的区别：不 fork，样例之间共享同一个解释器，
+因此学生代码导入的模块、对内置对象的修改会延续到下一个样例，峰值内存为进程级的历史最大值。
+CPU 时间限制无法用 RLIMIT_CPU 按样例施加，只按测得的 CPU 时间判定，由父进程的墙钟超时兜底。
+
+协议与 zygote 相同（4 字节大端长度 + UTF-8 JSON）：
+请求 {"stdin": "...", "output_limit": 8388608}
+响应 {"returncode": 0, "stdout": "...", "stderr": "...", "cpu_time": 0.01, "max_rss": 9000, "output_exceeded": false}
+"""
+import io
+import os
+import sys
+import types
+import traceback
+
+from app.services.judge import proc
+from app.services.judge.zygote_server import _exit_code, _load_code, _preload, _read_frame, _write_frame
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class _OutputExceeded(BaseException):
+    """输出超限；继承 BaseException，学生代码中的 except Exception 不会拦截"""
+
+
+class _BoundedBytesIO(io.BytesIO):
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+        self.exceeded = False
+
+    def write(self, b) -> int:
+        if self.tell() + len(b) > self.limit:
+            super().write(bytes(b)[:max(0, self.limit - self.tell())])
+            self.exceeded = True
+            raise _OutputExceeded()
+        return super().write(b)
+
+
+def _cpu_and_rss():
+    if resource is None:
+        return 0.0, 0
+    return proc.usage_of(resource.getrusage(resource.RUSAGE_SELF))
+
+
+def handle(code, file_path: str, req: dict) -> dict:
+    limit = int(req.get('output_limit') or (1 << 62))
+    out_buf, err_buf = _BoundedBytesIO(limit), _BoundedBytesIO(limit)
+    saved = sys.stdin, sys.stdout, sys.stderr, sys.argv, sys.modules.get('__main__')
+    # 包装对象需保持引用直到取出输出，否则被回收时会连同底层缓冲区一起关闭
+    stdout = io.TextIOWrapper(out_buf, encoding='utf-8', write_through=True)
+    stderr = io.TextIOWrapper(err_buf, encoding='utf-8', errors='backslashreplace', write_through=True)
+    sys.stdin = io.TextIOWrapper(io.BytesIO(req.get('stdin', '').encode('utf-8')), encoding='utf-8')
+    sys.stdout, sys.stderr = stdout, stderr
+    main = types.ModuleType('__main__')
+    main.__file__ = file_path
+    main.__builtins__ = __builtins__
+    sys.modules['__main__'] = main
+    sys.argv = [file_path]
+    if 'random' in sys.modules:
+        sys.modules['random'].seed()
+
+    cpu_before, _ = _cpu_and_rss()
+    rc = 0
+    try:
+        if isinstance(code, str):
+            # 编译失败时 code 为错误信息，与直接运行脚本时的输出一致
+            sys.stderr.write(code)
+            rc = 1
+        else:
+            exec(code, main.__dict__)
+    except _OutputExceeded:
+        pass
+    except SystemExit as e:
+        rc = _exit_code(e.code)
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        try:
+            traceback.print_exception(etype, value, tb.tb_next)
+        except _OutputExceeded:
+            pass
+        rc = 1
+    try:
+        stdout.flush()
+        stderr.flush()
+    except _OutputExceeded:
+        pass
+    except Exception:
+        rc = rc or 120
+    cpu_after, max_rss = _cpu_and_rss()
+    sys.stdin, sys.stdout, sys.stderr, sys.argv, sys.modules['__main__'] = saved
+    resp = {
+        "returncode": rc,
+        "stdout": out_buf.getvalue().decode('utf-8', errors='replace'),
+        "stderr": err_buf.getvalue().decode('utf-8', errors='replace'),
+        "cpu_time": cpu_after - cpu_before,
+        "max_rss": max_rss,
+        "output_exceeded": out_buf.exceeded or err_buf.exceeded,
+    }
+    for wrapper in (stdout, stderr):
+        try:
+            wrapper.detach()
+        except (ValueError, _OutputExceeded):
+            pass
+    return resp
+
+
+def main():
+    file_path = sys.argv[1]
+    pyc_path = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != '-' else None
+    # 协议使用复制出来的描述符，原 0/1 指向 /dev/null，防止学生代码直接写描述符破坏帧
+    proto_in = os.dup(0)
+    proto_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    _preload()
+    sys.path[0] = os.path.dirname(file_path)
+    try:
+        code = _load_code(file_path, pyc_path)
+    except (SyntaxError, ValueError) as e:
+        code = ''.join(traceback.format_exception_only(type(e), e))
+    _write_frame(proto_out, {"ready": True})
+    while True:
+        try:
+            req = _read_frame(proto_in)
+        except EOFError:
+            break
+        _write_frame(proto_out, handle(code, file_path, req))
+
+
+if __name__ == '__main__':
+    main()
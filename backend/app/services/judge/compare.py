@@ -0,0 +1,66 @@
+"""
+输出比较
+normalize_output 规则：整体去除首尾空白，按 str.splitlines 分行，每行去除行尾空白后以 \n 连接。
+outputs_match 按行流式比较，语义与 normalize_output(actual) == expected_norm 相同，
+但不构造规范化后的整份副本与行列表，大输出时内存占用只与单行长度有关。
+"""
+import re
+from typing import Iterator
+
+# 与 str.splitlines 识别的换行符一致
+_LINE_BREAK = re.compile('\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+def iter_normalized_lines(s: str) -> Iterator[str]:
+    """逐行产出 normalize_output(s) 的各行"""
+    started = False
+    blank = 0
+    pos = 0
+    end = len(s)
+    breaks = _LINE_BREAK.finditer(s)
+    while pos < end:
+        m = next(breaks, None)
+        line = s[pos:m.start() if m else end].rstrip()
+        pos = m.end() if m else end
+        if not started:
+            # 开头的空白（可能跨多行）整体去除
+            line = line.lstrip()
+            if not line:
+                continue
+            started = True
+        elif not line:
+            # 中间的空行暂存，后面还有内容时才产出，末尾的空行被丢弃
+            blank += 1
+            continue
+        for _ in range(blank):
+            yield ''
+        blank = 0
+        yield line
+
+
+def _iter_split(s: str, sep: str = '\n') -> Iterator[str]:
+    if not s:
+        return
+    pos = 0
+    while True:
+        idx = s.find(sep, pos)
+        if idx < 0:
+            yield s[pos:]
+            return
+        yield s[pos:idx]
+        pos = idx + len(sep)
+
+
+def normalize_output(s: str) -> str:
+    # 去除行尾空白并统一换行，再剔除前后空白
+    return "\n".join(iter_normalized_lines(s))
+
+
+def outputs_match(actual: str, expected_norm: str) -> bool:
+    """判断 normalize_output(actual) == expected_norm（expected_norm 须已规范化），遇到第一处不同即返回"""
+    sentinel = object()
+    expected_lines = _iter_split(expected_norm)
+    for line in iter_normalized_lines(actual):
+        if next(expected_lines, sentinel) != line:
+            return False
+    return next(expected_lines, sentinel) is sentinel
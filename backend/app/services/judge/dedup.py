@@ -0,0 +1,120 @@
+"""
+提交去重（幂等提交）
+双击提交按钮或前端重试时，同一用户对同一题的相同代码（按规范化代码哈希，且 fail_fast 相同）会在短时间内重复到达。
+第一个请求（leader）正常排队、评测并记录 StudentResult；评测进行中或完成后 JUDGE_SUBMIT_DEDUP_SECONDS 秒内到达的重复请求
+不再排队评测，直接等待并返回同一份结果，attempts 只计一次。
+请求头带 Idempotency-Key 时按（用户, 题目, 该键）去重，不再比较代码。
+
+leader 未得到结果就结束（队列已满、评测出错、客户端断开）时放弃该条目，正在等待的重复请求改由其中一个重新评测。
+去重表保存在 API 进程内存中，只对同一进程收到的请求生效。
+"""
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.services.judge.verdict_cache import code_hash
+
+JUDGE_SUBMIT_DEDUP_SECONDS = float(os.getenv('JUDGE_SUBMIT_DEDUP_SECONDS', '10'))
+
+
+def submit_key(user_id: int, lesson: str, problem: str, code: str, fail_fast: Optional[bool],
+               idempotency_key: Optional[str] = None) -> Tuple:
+    """计算去重键：有 Idempotency-Key 时以它为准，否则按代码哈希"""
+    if idempotency_key:
+        return ('key', user_id, lesson, problem, idempotency_key)
+    return ('code', user_id, lesson, problem, fail_fast, code_hash(code))
+
+
+class SubmitCoalescer:
+    """合并重复提交（运行在事件循环中，非线程安全）"""
+
+    def __init__(self, window: float = JUDGE_SUBMIT_DEDUP_SECONDS):
+        self.window = max(0.0, float(window))
+        # 键 -> (结果 future, 过期时间；评测进行中为 None)
+        self._entries: Dict[Hashable, Tuple[asyncio.Future, Optional[float]]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def _purge(self, now: float):
+        expired = [k for k, (_, expires) in self._entries.items() if expires is not None and expires <= now]
+        for k in expired:
+            del self._entries[k]
+
+    def claim(self, key: Hashable) -> Tuple[bool, asyncio.Future]:
+        """返回 (是否为 leader, 结果 future)；leader 须在结束时调用 resolve 或 abandon"""
+        self._purge(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is not None and not entry[0].cancelled():
+            self.coalesced += 1
+            return False, entry[0]
+        fut = asyncio.get_running_loop().create_future()
+        self._entries[key] = (fut, None)
+        self.leaders += 1
+        return True, fut
+
+    def resolve(self, key: Hashable, fut: asyncio.Future, result: Dict):
+        """leader 得到结果：唤醒等待者，并在去重窗口内继续保留结果"""
+        if not fut.done():
+            fut.set_result(result)
+        if self._entries.get(key, (None,))[0] is fut:
+            if self.window:
+                self._entries[key] = (fut, time.monotonic() + self.window)
+            else:
+                del self._entries[key]
+
+    def abandon(self, key: Hashable, fut: asyncio.Future):
+        """leader 未得到结果就结束；已 resolve 时无操作"""
+        if fut.done():
+            return
+        fut.cancel()
+        self.abandoned += 1
+        if self._entries.get(key, (None,))[0] is fut:
+            del self._entries[key]
+
+    async def wait(self, fut: asyncio.Future) -> Optional[Dict]:
+        """等待 leader 的结果；leader 放弃时返回 None（调用方应重新 claim）"""
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                return None
+            raise
+
+    async def run(self, key: Hashable, judge: Callable[[], Awaitable[Dict]]) -> Tuple[Dict, bool]:
+        """执行 judge 或复用相同请求的结果，返回 (结果, 是否复用)"""
+        while True:
+            leader, fut = self.claim(key)
+            if leader:
+                try:
+                    result = await judge()
+                except BaseException:
+                    self.abandon(key, fut)
+                    raise
+                self.resolve(key, fut, result)
+                return result, False
+            result = await self.wait(fut)
+            if result is not None:
+                return result, True
+
+    def stats(self) -> Dict:
+        return {
+            "window_s": self.window,
+            "in_flight": sum(1 for fut, expires in self._entries.values() if expires is None),
+            "entries": len(self._entries),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+_coalescer: Optional[SubmitCoalescer] = None
+
+
+def get_submit_coalescer() -> SubmitCoalescer:
+    """返回进程内共享的提交去重表"""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = SubmitCoalescer()
+    return _coalescer
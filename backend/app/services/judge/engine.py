@@ -0,0 +1,142 @@
+"""
+评测引擎：把一次提交的多个样例分发到有界的 worker 池中并行执行
+worker 数量默认与机器核数一致，可通过环境变量 JUDGE_WORKERS 配置
+"""
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, List, Optional, Any
+
+from app.services.judge import metrics
+
+
+JUDGE_WORKERS = int(os.getenv('JUDGE_WORKERS', '0') or 0) or (os.cpu_count() or 2)
+
+
+class JudgeEngine:
+    """有界 worker 池。
+
+    每个 worker 只负责等待一个样例子进程结束，真正的计算发生在子进程中，
+    因此 worker 数按核数设置即可让子进程占满 CPU 而不会过度争抢。
+    池在进程内共享，所有提交的样例总并发不会超过 workers。
+    """
+
+    def __init__(self, workers: int = JUDGE_WORKERS):
+        self.workers = max(1, int(workers))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        # 样例级占用统计（只在事件循环线程中修改）：running 为占用 worker 的样例数，pending 为等待 worker 的样例数
+        self.running = 0
+        self.pending = 0
+        self.peak_running = 0
+        self.completed = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='judge')
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """在 worker 池中执行单个阻塞调用（复制当前上下文，分阶段计时因此能归到对应请求）。
+
+        被取消时，尚未开始的调用直接撤销；已在线程中运行的调用无法中断，等它返回后才向上传递取消，
+        调用方（如 amap）因此不会在线程仍被占用时提前释放 worker 名额。
+        """
+        ctx = contextvars.copy_context()
+        future = self.executor.submit(functools.partial(ctx.run, fn, *args))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                waiter = asyncio.wrap_future(future)
+                await asyncio.wait({waiter})
+                if not waiter.cancelled():
+                    # 取走结果中的异常，避免 “exception was never retrieved” 告警
+                    waiter.exception()
+            raise
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphore 绑定事件循环，循环变化（如测试中多次 asyncio.run）时重新创建
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def amap(self, coro_fn: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                   stop_when: Optional[Callable[[Any], bool]] = None,
+                   on_result: Optional[Callable[[Any, Any], None]] = None,
+                   on_stop: Optional[Callable[[], None]] = None) -> List[Any]:
+        """并发执行协程 coro_fn(item)，同时运行的数量不超过 workers，结果顺序与 items 一致。
+
+        给出 stop_when 时，一旦某个结果满足 stop_when(result)，不再启动剩余的项并取消正在运行的项，
+        未完成的项在结果中为 None。on_stop 在取消之前于事件循环中同步调用（如直接终止正在运行的子进程组），
+        被取消的项在其线程真正返回后才释放 worker 名额，返回时所有线程均已结束。
+        给出 on_result 时，每完成一项即按完成顺序调用 on_result(item, result)。
+        """
+        sem = self._get_semaphore()
+        items = list(items)
+        results: List[Any] = [None] * len(items)
+        tasks: List[asyncio.Task] = []
+
+        async def _one(i, item):
+            self.pending += 1
+            wait_start = time.perf_counter()
+            try:
+                await sem.acquire()
+            finally:
+                self.pending -= 1
+            metrics.record('worker_wait', time.perf_counter() - wait_start)
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+            try:
+                results[i] = await coro_fn(item)
+            finally:
+                self.running -= 1
+                self.completed += 1
+                sem.release()
+            if on_result is not None:
+                on_result(item, results[i])
+            if stop_when is not None and stop_when(results[i]):
+                if on_stop is not None:
+                    on_stop()
+                for task in tasks:
+                    if task is not asyncio.current_task():
+                        task.cancel()
+
+        tasks.extend(asyncio.ensure_future(_one(i, item)) for i, item in enumerate(items))
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException) and not isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+        return results
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "pending": self.pending,
+            "peak_running": self.peak_running,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_engine: Optional[JudgeEngine] = None
+
+
+def get_engine() -> JudgeEngine:
+    """返回进程内共享的评测引擎"""
+    global _engine
+    if _engine is None:
+        _engine = JudgeEngine()
+    return _engine
@@ -0,0 +1,223 @@
+"""
+测试数据缓存
+TestSetCache 一次性读入某道题 test/ 下的全部 *.in/*.out，按数字顺序排好，以不可变 bytes 保存，
+并预先算好规范化后的期望输出。之后的运行/提交只需对目录做一次 stat 校验（与评测结果缓存同一指纹），
+文件有任何增删改即重新加载。多道题之间按 LRU 淘汰，总内存上限为 JUDGE_FIXTURE_CACHE_MB。
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.services.judge.compare import normalize_output
+from app.services.judge.verdict_cache import test_dir_fingerprint
+
+JUDGE_FIXTURE_CACHE_MB = float(os.getenv('JUDGE_FIXTURE_CACHE_MB', '128'))
+
+MISSING_OUTPUT = "缺少对应的 .out 文件"
+
+
+def _sort_key(name: str):
+    # 按文件名的数字顺序排序，避免字典序如 '10' < '6' 的问题
+    try:
+        return (0, int(name))
+    except Exception:
+        return (1, name)
+
+
+def _read_text(path: str) -> bytes:
+    """按文本方式读取（统一换行），校验为 UTF-8 后以 bytes 保存"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    return text.replace('\r\n', '\n').replace('\r', '\n').encode('utf-8')
+
+
+@dataclass(frozen=True)
+class TestCase:
+    __test__ = False  # 避免被 pytest 当作测试类收集
+
+    name: str
+    input: bytes = b''
+    expected: Optional[bytes] = None
+    expected_norm: Optional[str] = None
+    # 读取失败或缺少 .out 时的错误信息
+    error: Optional[str] = None
+
+    @property
+    def input_text(self) -> str:
+        return self.input.decode('utf-8')
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.input) + len(self.expected or b'') + len((self.expected_norm or '').encode('utf-8'))
+
+
+@dataclass(frozen=True)
+class TestSet:
+    __test__ = False
+
+    test_dir: str
+    fingerprint: str
+    cases: Tuple[TestCase, ...]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.cases)
+
+    def get(self, name: str) -> Optional[TestCase]:
+        for c in self.cases:
+            if c.name == name:
+                return c
+        return None
+
+
+class ProblemFixture(NamedTuple):
+    """题目的评测数据：index.json 中的条目与测试集。远程 worker 没有题库目录，评测时由 API 进程提供"""
+    meta: Optional[Dict]
+    test_set: Optional[TestSet]
+
+
+def test_set_to_dict(test_set: TestSet) -> Dict:
+    """序列化测试集（远程 worker 按指纹拉取）；规范化后的期望输出由接收方重新计算"""
+    return {
+        "fingerprint": test_set.fingerprint,
+        "cases": [{"name": c.name, "input": c.input.decode('utf-8'),
+                   "expected": c.expected.decode('utf-8') if c.expected is not None else None,
+                   "error": c.error} for c in test_set.cases],
+    }
+
+
+def test_set_from_dict(data: Dict) -> TestSet:
+    cases = []
+    for c in data.get("cases", []):
+        expected = c.get("expected")
+        cases.append(TestCase(
+            name=str(c["name"]),
+            input=(c.get("input") or '').encode('utf-8'),
+            expected=expected.encode('utf-8') if expected is not None else None,
+            expected_norm=normalize_output(expected) if expected is not None else None,
+            error=c.get("error"),
+        ))
+    return TestSet(test_dir='', fingerprint=data["fingerprint"], cases=tuple(cases))
+
+
+def load_test_set(test_dir: str, fingerprint: Optional[str] = None) -> Optional[TestSet]:
+    """从磁盘读取测试集；目录不存在返回 None"""
+    if fingerprint is None:
+        fingerprint = test_dir_fingerprint(test_dir)
+    if fingerprint is None:
+        return None
+    names = sorted((f[:-3] for f in os.listdir(test_dir) if f.endswith('.in')), key=_sort_key)
+    cases = []
+    for name in names:
+        inp_path = os.path.join(test_dir, f"{name}.in")
+        out_path = os.path.join(test_dir, f"{name}.out")
+        try:
+            inp = _read_text(inp_path)
+        except Exception as e:
+            cases.append(TestCase(name=name, error=f"无法读取输入: {e}"))
+            continue
+        if not os.path.exists(out_path):
+            cases.append(TestCase(name=name, input=inp, error=MISSING_OUTPUT))
+            continue
+        try:
+            expected = _read_text(out_path)
+        except Exception as e:
+            cases.append(TestCase(name=name, input=inp, error=f"无法读取期望输出: {e}"))
+            continue
+        cases.append(TestCase(name=name, input=inp, expected=expected,
+                              expected_norm=normalize_output(expected.decode('utf-8'))))
+    return TestSet(test_dir=test_dir, fingerprint=fingerprint, cases=tuple(cases))
+
+
+class TestSetCache:
+    """线程安全的 LRU 测试集缓存，按 test_dir 索引"""
+
+    __test__ = False
+
+    def __init__(self, max_bytes: int = int(JUDGE_FIXTURE_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max(0, int(max_bytes))
+        self.bytes = 0
+        self._data: "OrderedDict[str, TestSet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, test_dir: str) -> Optional[TestSet]:
+        """返回最新的测试集；目录不存在返回 None"""
+        key = os.path.abspath(test_dir)
+        fingerprint = test_dir_fingerprint(key)
+        if fingerprint is None:
+            self.invalidate(key)
+            return None
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is not None and cached.fingerprint == fingerprint:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        test_set = load_test_set(key, fingerprint)
+        self._store(key, test_set)
+        return test_set
+
+    def _store(self, key: str, test_set: TestSet):
+        size = test_set.nbytes
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old.nbytes
+            if size > self.max_bytes:
+                return
+            self._data[key] = test_set
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def find(self, fingerprint: str) -> Optional[TestSet]:
+        """按指纹查找已缓存的测试集（供远程 worker 拉取），不访问磁盘"""
+        with self._lock:
+            for test_set in self._data.values():
+                if test_set.fingerprint == fingerprint:
+                    return test_set
+        return None
+
+    def invalidate(self, test_dir: Optional[str] = None):
+        """清除某个测试目录（或全部）的缓存"""
+        with self._lock:
+            if test_dir is None:
+                self._data.clear()
+                self.bytes = 0
+                return
+            old = self._data.pop(os.path.abspath(test_dir), None)
+            if old is not None:
+                self.bytes -= old.nbytes
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "problems": len(self._data),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[TestSetCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_test_set_cache() -> TestSetCache:
+    """返回进程内共享的测试集缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TestSetCache()
+        return _cache
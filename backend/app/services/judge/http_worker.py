@@ -0,0 +1,162 @@
+"""
+远程评测 worker（参考实现，JUDGE_MODE=remote 时由 API 进程通过 HTTP 分派任务，协议见 remote.py）
+评测机上不需要题库目录：测试集按指纹从 API 拉取并缓存在内存中，题目条目随任务一起发送。
+
+启动（在 backend 目录下）：
+    python -m app.services.judge.http_worker --host 0.0.0.0 --port 9001 --api-url http://api-host:8000 --token ... [--concurrency 4]
+worker 使用与 API 进程相同的评测配置（JUDGE_BACKEND、JUDGE_WORKERS 等）。
+POST /jobs 会执行任意代码：默认只监听 127.0.0.1；未配置令牌时拒绝监听非本机地址，也只接受本机发来的请求。
+"""
+import os
+import sys
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Header, HTTPException, Request
+from pydantic import BaseModel
+
+from app.services.judge import jobs
+from app.services.judge.engine import JUDGE_WORKERS
+from app.services.judge.fixtures import JUDGE_FIXTURE_CACHE_MB, ProblemFixture, TestSet, test_set_from_dict
+from app.services.judge.remote import JUDGE_WORKER_TOKEN, TOKEN_HEADER, auth_headers, is_loopback
+
+JUDGE_API_URL = os.getenv('JUDGE_API_URL', 'http://127.0.0.1:8000').rstrip('/')
+WORKER_CONCURRENCY = int(os.getenv('JUDGE_WORKER_CONCURRENCY', '0') or 0) or JUDGE_WORKERS
+
+
+class FetchedTestSets:
+    """按指纹缓存从 API 拉取的测试集（指纹变化即为新测试集，无需校验），按 LRU 限制内存"""
+
+    def __init__(self, max_bytes: int = int(JUDGE_FIXTURE_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max(0, int(max_bytes))
+        self.bytes = 0
+        self._data: "OrderedDict[str, TestSet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fetches = 0
+
+    def get(self, fingerprint: str) -> Optional[TestSet]:
+        with self._lock:
+            test_set = self._data.get(fingerprint)
+            if test_set is not None:
+                self._data.move_to_end(fingerprint)
+                self.hits += 1
+            return test_set
+
+    def put(self, test_set: TestSet):
+        size = test_set.nbytes
+        with self._lock:
+            self.fetches += 1
+            if size > self.max_bytes or test_set.fingerprint in self._data:
+                return
+            self._data[test_set.fingerprint] = test_set
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"test_sets": len(self._data), "bytes": self.bytes, "hits": self.hits, "fetches": self.fetches}
+
+
+class JobRequest(BaseModel):
+    kind: str
+    payload: Dict
+    fixture: Optional[Dict] = None
+
+
+def create_app(api_url: str = JUDGE_API_URL, token: str = JUDGE_WORKER_TOKEN,
+               concurrency: int = WORKER_CONCURRENCY, worker_id: Optional[str] = None) -> FastAPI:
+    app = FastAPI(title="评测 worker")
+    state = {"active": 0, "completed": 0, "failed": 0}
+    capacity = max(1, int(concurrency))
+    worker_id = worker_id or jobs.default_worker_id()
+    test_sets = FetchedTestSets()
+    http = httpx.AsyncClient(base_url=api_url.rstrip('/'), headers=auth_headers(token), trust_env=False)
+
+    def _authorize(request: Request, value: Optional[str]):
+        if token:
+            if value != token:
+                raise HTTPException(status_code=401, detail="无效的 worker 令牌")
+        elif not request.client or not is_loopback(request.client.host):
+            raise HTTPException(status_code=403, detail="未配置 worker 令牌时只接受本机请求")
+
+    async def _test_set(fingerprint: str) -> TestSet:
+        test_set = test_sets.get(fingerprint)
+        if test_set is None:
+            try:
+                resp = await http.get(f"/api/problems/judge/testsets/{fingerprint}", timeout=30)
+                resp.raise_for_status()
+            except httpx.HTTPError as e:
+                raise HTTPException(status_code=502, detail=f"无法从 API 获取测试集: {e!r}")
+            test_set = test_set_from_dict(resp.json())
+            test_sets.put(test_set)
+        return test_set
+
+    @app.on_event("shutdown")
+    async def _close():
+        await http.aclose()
+
+    @app.get("/health")
+    async def health(request: Request, x_judge_token: Optional[str] = Header(None, alias=TOKEN_HEADER)):
+        _authorize(request, x_judge_token)
+        return {"status": "ok", "worker_id": worker_id, "capacity": capacity, **state,
+                "test_sets": test_sets.stats()}
+
+    @app.post("/jobs")
+    async def run_job(job: JobRequest, request: Request,
+                      x_judge_token: Optional[str] = Header(None, alias=TOKEN_HEADER)):
+        _authorize(request, x_judge_token)
+        if state["active"] >= capacity:
+            # 满载时立即拒绝，由 API 转给其他 worker
+            raise HTTPException(status_code=503, detail="worker 繁忙")
+        state["active"] += 1
+        try:
+            fixture = None
+            if job.fixture is not None:
+                fingerprint = job.fixture.get("fingerprint")
+                fixture = ProblemFixture(job.fixture.get("meta"),
+                                         await _test_set(fingerprint) if fingerprint else None)
+            try:
+                result = await jobs.execute_local(job.kind, job.payload, fixture)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                state["failed"] += 1
+                return {"status": "error", "message": f"评测失败: {e}"}
+            state["completed"] += 1
+            return result
+        finally:
+            state["active"] -= 1
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='远程评测 worker：通过 HTTP 接收并执行评测任务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址；监听非本机地址时必须配置令牌')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--api-url', default=JUDGE_API_URL, help='API 服务地址，用于拉取测试集（默认取 JUDGE_API_URL）')
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help='同时处理的任务数')
+    parser.add_argument('--token', default=JUDGE_WORKER_TOKEN, help='与 API 共用的令牌（默认取 JUDGE_WORKER_TOKEN）')
+    args = parser.parse_args(argv)
+    if not args.token and not is_loopback(args.host):
+        parser.error('监听非本机地址时必须通过 --token 或 JUDGE_WORKER_TOKEN 配置令牌')
+
+    import uvicorn
+    from app.services.judge.runner import shutdown
+
+    app = create_app(args.api_url, args.token, args.concurrency)
+    print(f"评测 worker 已启动：http://{args.host}:{args.port}，API {args.api_url}，并发 {args.concurrency}", file=sys.stderr)
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+    finally:
+        shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+评测任务队列（持久化在本地 SQLite 文件中）
+JUDGE_MODE=queue 时，/run、/submit、/check_tests 不在 API 进程内执行代码，而是把任务写入 jobs 表并等待结果；
+评测由独立的 worker 进程完成（`python -m app.services.judge.worker`），同一台机器上可以启动多个 worker。
+
+队列只支持单机：API 与所有 worker 须在同一台机器上访问本地磁盘中的队列文件。SQLite 的 WAL 模式依赖各进程
+共享同一块内存索引（-shm 文件），在 NFS/SMB 等网络文件系统上无法保证，多台机器共享队列文件可能重复领取、
+丢失任务甚至损坏数据库。需要多台评测机时改用 JUDGE_MODE=remote（HTTP worker，见 remote.py）。
+
+任务状态：queued -> running -> done / failed。worker 定期刷新 heartbeat_at，
+心跳超时的 running 任务会被重新放回队列（worker 崩溃或机器掉线时不丢任务）。
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import threading
+from typing import Dict, List, Optional, NamedTuple
+
+from app.services.judge import metrics
+
+JUDGE_MODE = os.getenv('JUDGE_MODE', 'inline').strip().lower()
+QUEUE_DB = os.getenv('JUDGE_QUEUE_DB', './judge_queue.db')
+# API 端等待单个任务结果的最长时间（秒）
+JOB_TIMEOUT = float(os.getenv('JUDGE_JOB_TIMEOUT', '120') or 120)
+# worker 心跳间隔与判定失联的时长（秒）
+HEARTBEAT_INTERVAL = 2.0
+STALE_AFTER = float(os.getenv('JUDGE_JOB_STALE_SECONDS', '30') or 30)
+# 已完成任务的保留时长（秒），worker 每隔 PURGE_INTERVAL 秒删除更早完成的任务
+JOB_RETENTION = float(os.getenv('JUDGE_JOB_RETENTION_SECONDS', '86400') or 86400)
+PURGE_INTERVAL = 600.0
+# 任务被重新放回队列的次数上限，超过后记为失败，避免一个会让 worker 崩溃的任务反复执行
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS judge_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    result TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_judge_jobs_status ON judge_jobs (status, id);
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: Dict
+    attempts: int
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobStore:
+    """jobs 表的访问封装。每个线程使用独立连接，先读后写的状态变更在 IMMEDIATE 事务中完成"""
+
+    def __init__(self, path: str = QUEUE_DB):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            # WAL 只在同一台机器的进程之间有效，队列文件不能放在网络文件系统上（见模块说明）
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: Dict) -> int:
+        cur = self._conn().execute(
+            "INSERT INTO judge_jobs (kind, payload, created_at) VALUES (?, ?, ?)",
+            (kind, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return cur.lastrowid
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """原子地领取最早的排队任务，没有任务时返回 None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM judge_jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE judge_jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (worker_id, now, now, row[0]),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1)
+
+    def heartbeat(self, job_ids, worker_id: str):
+        if not job_ids:
+            return
+        marks = ','.join('?' * len(job_ids))
+        self._conn().execute(
+            f"UPDATE judge_jobs SET heartbeat_at = ? WHERE worker = ? AND status = 'running' AND id IN ({marks})",
+            (time.time(), worker_id, *job_ids),
+        )
+
+    def finish(self, job_id: int, result: Dict, failed: bool = False):
+        self._conn().execute(
+            "UPDATE judge_jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+            ('failed' if failed else 'done', json.dumps(result, ensure_ascii=False), time.time(), job_id),
+        )
+
+    def abandon(self, job_id: int):
+        """等待方放弃结果时撤销尚未被领取的任务"""
+        self._conn().execute(
+            "UPDATE judge_jobs SET status = 'failed', finished_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT status, result FROM judge_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "result": json.loads(row[1]) if row[1] else None}
+
+    def requeue_stale(self, stale_after: float = STALE_AFTER) -> int:
+        """把心跳超时的 running 任务放回队列，重试次数用尽的记为失败，返回处理的任务数"""
+        conn = self._conn()
+        cutoff = time.time() - stale_after
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            failed = conn.execute(
+                "UPDATE judge_jobs SET status = 'failed', result = ?, finished_at = ? "
+                "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                (json.dumps({"status": "error", "message": "评测进程异常退出"}, ensure_ascii=False),
+                 time.time(), cutoff, MAX_ATTEMPTS),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE judge_jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (cutoff,),
+            ).rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return failed + requeued
+
+    def purge(self, older_than: float) -> int:
+        """删除 older_than 秒之前完成的任务"""
+        return self._conn().execute(
+            "DELETE FROM judge_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - older_than,),
+        ).rowcount
+
+    def stats(self) -> Dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM judge_jobs GROUP BY status").fetchall()
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """返回进程内共享的任务队列"""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != QUEUE_DB:
+            _store = JobStore(QUEUE_DB)
+        return _store
+
+
+async def run_job(kind: str, payload: Dict, timeout: float = None) -> Dict:
+    """提交任务并等待 worker 写回结果（由 API 进程调用）。
+    队列读写都是短小的 SQLite 操作，放在默认线程池中执行，不占用评测引擎的线程"""
+    store = get_job_store()
+    timeout = JOB_TIMEOUT if timeout is None else timeout
+    job_id = await asyncio.to_thread(store.enqueue, kind, payload)
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    try:
+        while True:
+            job = await asyncio.to_thread(store.get, job_id)
+            if job and job["status"] in ('done', 'failed') and job["result"] is not None:
+                return job["result"]
+            if time.monotonic() >= deadline:
+                await asyncio.to_thread(store.abandon, job_id)
+                return {"status": "error", "message": "评测排队超时，请稍后重试"}
+            await asyncio.sleep(delay)
+            # 轮询间隔逐步放宽到 100ms
+            delay = min(delay * 2, 0.1)
+    except asyncio.CancelledError:
+        # 请求被取消（如客户端断开），还没开始评测的任务不再执行
+        await asyncio.to_thread(store.abandon, job_id)
+        raise
+
+
+async def execute_local(kind: str, payload: Dict, fixture=None) -> Dict:
+    """在本进程中执行一个评测任务（worker 与 inline 模式共用）。
+    各阶段耗时计入全局直方图；payload 中 debug 为真时，本次请求的分阶段耗时附在结果的 timings 字段中。
+    fixture（fixtures.ProblemFixture）由远程 worker 传入，代替本地题库中的题目条目与测试集
+    """
+    timer = metrics.StageTimer()
+    token = metrics.activate(timer)
+    try:
+        with metrics.stage('total'):
+            res = await _execute(kind, payload, fixture)
+    finally:
+        metrics.deactivate(token)
+    if payload.get('debug') and isinstance(res, dict):
+        # 结果可能来自结果缓存，复制一份再附加，避免修改缓存中的对象
+        res = {**res, "timings": timer.to_dict()}
+    return res
+
+
+async def _execute(kind: str, payload: Dict, fixture=None) -> Dict:
+    from app.services import problems_service
+    from app.services.judge.engine import get_engine
+    if kind == 'run':
+        return await problems_service.mock_run_code(payload['lesson'], payload['problem'], payload['code'],
+                                                    fixture=fixture)
+    if kind == 'submit':
+        return await problems_service.mock_submit_code(payload['lesson'], payload['problem'], payload['code'],
+                                                       fail_fast=payload.get('fail_fast'),
+                                                       priority=payload.get('priority'), fixture=fixture)
+    if kind == 'check':
+        return await get_engine().run(problems_service.run_code_against_tests, payload['code'], payload['tests'])
+    raise ValueError(f'未知的评测任务类型: {kind}')
+
+
+async def run_remote(kind: str, payload: Dict) -> Optional[Dict]:
+    """交给远程 HTTP worker 执行（见 remote.py），没有可用的 worker 时返回 None"""
+    from app.services.judge.remote import get_remote_pool
+    return await get_remote_pool().judge(kind, payload)
+
+
+async def judge(kind: str, payload: Dict) -> Dict:
+    """路由层的评测入口：inline 模式直接在本进程执行，queue 模式交给 worker 并等待结果，
+    remote 模式交给远程 HTTP worker，所有 worker 都不可用时回退到本进程执行"""
+    if JUDGE_MODE == 'queue':
+        return await run_job(kind, payload)
+    if JUDGE_MODE == 'remote':
+        res = await run_remote(kind, payload)
+        if res is not None:
+            return res
+    return await execute_local(kind, payload)
+
+
+async def iter_submit(lesson: str, problem: str, code: str, fail_fast: Optional[bool] = None,
+                      priority: Optional[List[str]] = None, debug: bool = False):
+    """流式提交：inline 模式逐个样例产出；queue / remote 模式等待 worker 完成后一次性产出全部样例与汇总
+    （remote 模式没有可用的 worker 时按 inline 模式执行）"""
+    from app.services import problems_service
+    payload = {"lesson": lesson, "problem": problem, "code": code, "fail_fast": fail_fast,
+               "priority": priority, "debug": debug}
+    res = None
+    if JUDGE_MODE == 'queue':
+        res = await run_job('submit', payload)
+    elif JUDGE_MODE == 'remote':
+        res = await run_remote('submit', payload)
+    if res is not None:
+        for entry in res.get("testResults", []):
+            yield "case", entry
+        yield "summary", res
+        return
+    timer = metrics.StageTimer()
+    events: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue()
+
+    async def _judge():
+        # 计时器在独立任务中激活（任务运行在复制出的上下文中）：异步生成器运行在调用方的上下文里，
+        # 若在生成器中激活，调用方在两次 yield 之间记录的阶段也会混入本次提交的计时
+        token = metrics.activate(timer)
+        start = time.perf_counter()
+        try:
+            async for event, data in problems_service.iter_submit_code(lesson, problem, code, fail_fast, priority):
+                if event == "summary":
+                    metrics.record('total', time.perf_counter() - start)
+                    if debug:
+                        data = {**data, "timings": timer.to_dict()}
+                events.put_nowait((event, data))
+        finally:
+            metrics.deactivate(token)
+            # 结束标记（出错时同样放入，异常由下面的 await task 抛出）
+            events.put_nowait(None)
+
+    task = asyncio.ensure_future(_judge())
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield item
+        await task
+    finally:
+        # 调用方提前关闭生成器（如客户端断开）时取消评测，并等待其清理完工作目录
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
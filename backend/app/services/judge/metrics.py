@@ -0,0 +1,156 @@
+"""
+评测分阶段计时
+评测路径上的各阶段（读取测试集、创建工作目录、编译、启动进程、执行学生代码、解码输出、比较输出等）
+调用 record / stage 计时，汇总到进程内的直方图（GET /api/problems/judge/metrics），
+同时累加到当前请求的 StageTimer 中，请求带 debug 时随结果返回（见 jobs.execute_local）。
+
+当前请求的 StageTimer 保存在 ContextVar 中：asyncio 任务创建时继承，
+评测引擎向 worker 池提交阻塞调用时复制上下文（见 engine.run），因此线程中执行的阶段也会计入对应请求。
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# 直方图桶上限（毫秒），最后另有 +Inf 桶
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """固定桶直方图，分位数按桶上限估计（不超过观测到的最大值）"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                bound = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        # 与 Prometheus 相同，桶计数为累计值（le 为上限）
+        buckets, seen = {}, 0
+        for bound, n in zip([*BUCKETS_MS, '+Inf'], self.counts):
+            seen += n
+            buckets[str(bound)] = seen
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 3),
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "buckets": buckets,
+        }
+
+
+class JudgeMetrics:
+    """各阶段耗时直方图（进程内共享，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = Histogram()
+            hist.observe(seconds * 1000)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "stages": {name: h.snapshot() for name, h in sorted(self._histograms.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.started_at = time.time()
+
+
+class StageTimer:
+    """单个请求的分阶段耗时：每个阶段累计次数、总耗时与最大耗时（样例级阶段会出现多次）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict] = {}
+
+    def add(self, stage: str, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = {"count": 1, "total_ms": ms, "max_ms": ms}
+            else:
+                entry["count"] += 1
+                entry["total_ms"] += ms
+                entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {name: {"count": e["count"], "total_ms": round(e["total_ms"], 3), "max_ms": round(e["max_ms"], 3)}
+                    for name, e in self.stages.items()}
+
+
+_metrics = JudgeMetrics()
+_current: "contextvars.ContextVar[Optional[StageTimer]]" = contextvars.ContextVar('judge_stage_timer', default=None)
+
+
+def get_judge_metrics() -> JudgeMetrics:
+    """返回进程内共享的阶段耗时统计"""
+    return _metrics
+
+
+def record(stage: str, seconds: float):
+    """记录一次阶段耗时（秒）：计入全局直方图与当前请求的 StageTimer"""
+    _metrics.observe(stage, seconds)
+    timer = _current.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def activate(timer: Optional[StageTimer]):
+    """把 timer 设为当前请求的计时器，返回用于 deactivate 的 token"""
+    return _current.set(timer)
+
+
+def deactivate(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # 异步生成器可能在另一个上下文中被关闭，此时该上下文中的值本就未被修改
+        pass
@@ -0,0 +1,52 @@
+"""
+语法预检
+在评测前于本进程内编译学生代码（只编译、不执行，不继承本模块的 __future__ 特性），
+语法错误直接判为编译错误（CE），不创建工作目录、不占用评测 worker，也不启动任何子进程。
+超过 PRECHECK_MAX_BYTES 的代码跳过预检，留给 Workspace 在 worker 池中编译，避免长时间阻塞事件循环；
+JUDGE_PRECHECK_MAX_KB 设为 0 关闭预检。
+"""
+import os
+import traceback
+from typing import Dict, NamedTuple, Optional
+
+PRECHECK_MAX_BYTES = int(os.getenv('JUDGE_PRECHECK_MAX_KB', '256') or 0) * 1024
+# 报错信息中显示的文件名，与 Workspace 中的源文件同名
+SOURCE_NAME = 'main.py'
+
+
+class CompileError(NamedTuple):
+    line: Optional[int]
+    column: Optional[int]
+    message: str
+    # 与解释器直接运行时打印的内容一致（不含 Traceback 头）
+    detail: str
+
+    def summary(self) -> str:
+        if self.line is None:
+            return f"编译错误：{self.message}"
+        if self.column is None:
+            return f"编译错误：第 {self.line} 行：{self.message}"
+        return f"编译错误：第 {self.line} 行第 {self.column} 列：{self.message}"
+
+    def to_dict(self) -> Dict:
+        return {"line": self.line, "column": self.column, "message": self.message}
+
+
+def check_syntax(code: str) -> Optional[CompileError]:
+    """编译 code，语法正确（或代码过大跳过预检）时返回 None，否则返回 CompileError"""
+    if not PRECHECK_MAX_BYTES or len(code) > PRECHECK_MAX_BYTES:
+        return None
+    try:
+        compile(code, SOURCE_NAME, 'exec', dont_inherit=True)
+    except SyntaxError as e:
+        # 包含 IndentationError / TabError
+        detail = ''.join(traceback.format_exception_only(type(e), e))
+        return CompileError(e.lineno, e.offset, f"{type(e).__name__}: {e.msg}", detail)
+    except ValueError as e:
+        # 源码中含有空字符等无法编译的内容
+        detail = ''.join(traceback.format_exception_only(type(e), e))
+        return CompileError(None, None, f"{type(e).__name__}: {e}", detail)
+    except (RecursionError, MemoryError):
+        # 嵌套过深等情况交给正常流程处理，不在预检中判定
+        return None
+    return None
@@ -0,0 +1,188 @@
+"""
+子进程底层工具（只依赖标准库，zygote 进程也会导入）
+- spawn: posix_spawn 启动独立会话的子进程，标准输入输出重定向到给定描述符；
+  有资源限制时经 /bin/sh 的 ulimit 设置后再 exec，限制在目标程序开始执行前即已生效
+- set_limits: 在当前进程中设置 CPU 时间与内存上限（zygote fork 出的子进程使用）
+- collect: 在截止时间前喂入 stdin 并读取 stdout/stderr（可限制输出大小）
+- wait_exit: 阻塞在 waitid/wait4 上等待子进程退出，截止时间由定时器杀掉进程组，同时取得 CPU 时间与峰值内存
+- kill_group: 杀掉子进程所在的整个进程组
+- terminate_group: 只发送 SIGKILL，用于从其他线程提前终止
+"""
+import os
+import sys
+import time
+import signal
+import shutil
+import selectors
+import threading
+from typing import Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ru_maxrss 在 macOS 上以字节为单位，Linux 上以 KB 为单位
+_RSS_DIVISOR = 1024 if sys.platform == 'darwin' else 1
+
+HAS_SPAWN = hasattr(os, 'posix_spawnp') and hasattr(os, 'wait4') and hasattr(os, 'waitid')
+
+
+def _cpu_seconds(cpu_limit: float) -> int:
+    """RLIMIT_CPU 以秒为单位，向上取整"""
+    return int(cpu_limit) + 1
+
+
+def limited_argv(argv, cpu_limit: Optional[float] = None, memory_limit_kb: Optional[int] = None):
+    """返回先由 /bin/sh 设置资源限制、再 exec 原命令的 argv（没有限制时原样返回）。
+    CPU 超出软限制时内核发送 SIGXCPU，再超出 1 秒发送 SIGKILL；内存通过 RLIMIT_AS（ulimit -v，KB）限制。
+    设置失败（如硬限制已更低）时沿用继承的限制"""
+    if not cpu_limit and not memory_limit_kb:
+        return list(argv)
+    script = []
+    if cpu_limit:
+        seconds = _cpu_seconds(cpu_limit)
+        script += [f"ulimit -H -t {seconds + 1} 2>/dev/null", f"ulimit -S -t {seconds} 2>/dev/null"]
+    if memory_limit_kb:
+        script.append(f"ulimit -v {int(memory_limit_kb)} 2>/dev/null")
+    script.append('exec "$@"')
+    return ['/bin/sh', '-c', '; '.join(script), 'sh', *argv]
+
+
+def spawn(argv, stdin_fd: int, stdout_fd: int, stderr_fd: int, cpu_limit: Optional[float] = None,
+          env=None, memory_limit_kb: Optional[int] = None) -> int:
+    """启动子进程并返回 pid；cpu_limit（秒）、memory_limit_kb 不为空时在 exec 前设置 RLIMIT_CPU / RLIMIT_AS，
+    env 默认继承当前环境"""
+    argv = limited_argv(argv, cpu_limit, memory_limit_kb)
+    path = shutil.which(argv[0]) or argv[0]
+    actions = [
+        (os.POSIX_SPAWN_DUP2, stdin_fd, 0),
+        (os.POSIX_SPAWN_DUP2, stdout_fd, 1),
+        (os.POSIX_SPAWN_DUP2, stderr_fd, 2),
+    ]
+    return os.posix_spawn(path, argv, os.environ if env is None else env, file_actions=actions, setsid=True)
+
+
+def set_limits(cpu_limit: Optional[float] = None, memory_limit_kb: Optional[int] = None):
+    """在当前进程中设置 RLIMIT_CPU（超出软限制发送 SIGXCPU，再超出 1 秒发送 SIGKILL）与 RLIMIT_AS"""
+    if resource is None:
+        return
+    try:
+        if cpu_limit:
+            seconds = _cpu_seconds(cpu_limit)
+            resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+        if memory_limit_kb:
+            limit = int(memory_limit_kb) * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (OSError, ValueError):
+        pass
+
+
+def collect(in_w: int, out_r: int, err_r: int, stdin_bytes: bytes, deadline: float,
+            output_limit: Optional[int] = None) -> Tuple[bytes, bytes, bool, bool]:
+    """在截止时间前完成 stdin 写入与 stdout/stderr 读取，返回 (stdout, stderr, timed_out, output_exceeded)；
+    stdout 或 stderr 累计超过 output_limit 字节时立即停止读取（output_exceeded 为 True），已读部分不超过上限。
+    结束时关闭三个描述符"""
+    sel = selectors.DefaultSelector()
+    out_chunks, err_chunks = [], []
+    sizes = {out_r: 0, err_r: 0}
+    pending = memoryview(stdin_bytes)
+    if pending:
+        os.set_blocking(in_w, False)
+        sel.register(in_w, selectors.EVENT_WRITE)
+    else:
+        os.close(in_w)
+    sel.register(out_r, selectors.EVENT_READ, out_chunks)
+    sel.register(err_r, selectors.EVENT_READ, err_chunks)
+    timed_out = exceeded = False
+    while len(sel.get_map()) > 0 and not exceeded:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in sel.select(remaining):
+            fd = key.fd
+            if fd == in_w:
+                try:
+                    n = os.write(in_w, pending[:65536])
+                    pending = pending[n:]
+                except BlockingIOError:
+                    continue
+                except BrokenPipeError:
+                    pending = pending[:0]
+                if not pending:
+                    sel.unregister(in_w)
+                    os.close(in_w)
+            else:
+                chunk = os.read(fd, 65536)
+                if chunk:
+                    if output_limit is not None and sizes[fd] + len(chunk) > output_limit:
+                        chunk = chunk[:output_limit - sizes[fd]]
+                        exceeded = True
+                    sizes[fd] += len(chunk)
+                    key.data.append(chunk)
+                    if exceeded:
+                        break
+                else:
+                    sel.unregister(fd)
+                    os.close(fd)
+    for key in list(sel.get_map().values()):
+        sel.unregister(key.fd)
+        os.close(key.fd)
+    sel.close()
+    return b''.join(out_chunks), b''.join(err_chunks), timed_out, exceeded
+
+
+def usage_of(rusage) -> Tuple[float, int]:
+    """返回 (CPU 秒数, 峰值内存 KB)"""
+    if rusage is None:
+        return 0.0, 0
+    return rusage.ru_utime + rusage.ru_stime, int(rusage.ru_maxrss / _RSS_DIVISOR)
+
+
+def wait_exit(pid: int, deadline: float):
+    """等待子进程退出并回收，返回 (returncode, rusage, timed_out)。
+    阻塞在 waitid 上（不轮询），截止时间到达时由定时器杀掉进程组，此时 returncode 为 None、timed_out 为 True；
+    waitid 使用 WNOWAIT，确认退出后才回收，定时器不会误杀已回收（pid 可能被复用）的进程"""
+    lock = threading.Lock()
+    state = {"exited": False, "killed": False}
+
+    def _expire():
+        with lock:
+            if not state["exited"]:
+                state["killed"] = True
+                terminate_group(pid)
+
+    timer = threading.Timer(max(0.0, deadline - time.monotonic()), _expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+    finally:
+        with lock:
+            state["exited"] = True
+        timer.cancel()
+    _, status, rusage = os.wait4(pid, 0)
+    if state["killed"]:
+        return None, rusage, True
+    return os.waitstatus_to_exitcode(status), rusage, False
+
+
+def terminate_group(pid: int):
+    """向进程组发送 SIGKILL（不回收，由等待该子进程的一方负责）"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def kill_group(pid: int):
+    """杀掉进程组并回收子进程，返回 rusage（无法取得时为 None）"""
+    terminate_group(pid)
+    try:
+        return os.wait4(pid, 0)[2]
+    except ChildProcessError:
+        return None
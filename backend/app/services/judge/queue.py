@@ -0,0 +1,279 @@
+"""
+评测准入控制
+/run、/submit、/check_tests 进入评测前先在全局队列中取得执行名额：
+- 同时评测的请求数不超过 JUDGE_MAX_ACTIVE
+- 排队等待的请求数不超过 JUDGE_MAX_QUEUE，超出时立即拒绝（路由层返回 429 + Retry-After）
+- 单个用户排队中的请求数不超过 JUDGE_MAX_QUEUE_PER_USER，避免一个人占满队列
+
+公平调度：请求按类别排队——正式提交（submit）、自测运行（run）、教师向导检查（check）。
+有空闲名额时，先按 JUDGE_CLASS_WEIGHTS 的权重在有等待者的类别间做平滑加权轮询（默认 submit=3,run=1,check=1），
+再在该类别内按用户轮询（每个用户各自 FIFO），因此连续提交多次的学生不会让其他学生一直排在后面。
+check 类别另有独立的并发上限 JUDGE_CHECK_MAX_ACTIVE，避免教师批量检查测评集挤占学生评测。
+队列长度、等待时间、拒绝次数（含各类别）通过 stats() 暴露给监控接口
+"""
+import os
+import math
+import time
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, Optional
+
+from app.services.judge import metrics
+from app.services.judge.engine import JUDGE_WORKERS
+
+JUDGE_MAX_ACTIVE = int(os.getenv('JUDGE_MAX_ACTIVE', '0') or 0) or JUDGE_WORKERS * 2
+JUDGE_MAX_QUEUE = int(os.getenv('JUDGE_MAX_QUEUE', '100'))
+# 0 表示不限制单个用户的排队数
+JUDGE_MAX_QUEUE_PER_USER = int(os.getenv('JUDGE_MAX_QUEUE_PER_USER', '10') or 0)
+# 0 表示按 JUDGE_MAX_ACTIVE 的四分之一（至少 1）
+JUDGE_CHECK_MAX_ACTIVE = int(os.getenv('JUDGE_CHECK_MAX_ACTIVE', '0') or 0)
+
+CLASSES = ('submit', 'run', 'check')
+DEFAULT_CLASS_WEIGHTS = {'submit': 3, 'run': 1, 'check': 1}
+
+
+def _parse_weights(spec: str) -> Dict[str, int]:
+    """解析形如 "submit=3,run=1,check=1" 的权重配置，未列出或无效的类别使用默认权重"""
+    weights = dict(DEFAULT_CLASS_WEIGHTS)
+    for item in (spec or '').split(','):
+        name, _, value = item.partition('=')
+        name = name.strip()
+        if name in weights:
+            try:
+                weights[name] = max(1, int(value))
+            except ValueError:
+                pass
+    return weights
+
+
+JUDGE_CLASS_WEIGHTS = _parse_weights(os.getenv('JUDGE_CLASS_WEIGHTS', ''))
+
+
+class JudgeQueueFull(Exception):
+    """队列已满，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'评测队列已满，请 {retry_after} 秒后重试')
+        self.retry_after = retry_after
+
+
+class _ClassQueue:
+    """单个类别的等待队列：每个用户一个 FIFO，用户之间轮询"""
+
+    def __init__(self, weight: int, max_active: int):
+        self.weight = weight
+        self.max_active = max_active
+        self.active = 0
+        self.waiting = 0
+        # 平滑加权轮询的当前值
+        self.current = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.users: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    def push(self, user: Hashable, fut: asyncio.Future):
+        self.users.setdefault(user, deque()).append(fut)
+        self.waiting += 1
+
+    def pop(self):
+        """取出轮到的用户的队首，返回 (user, future)；该用户还有等待者时移到队尾"""
+        user, waiters = next(iter(self.users.items()))
+        fut = waiters.popleft()
+        if waiters:
+            self.users.move_to_end(user)
+        else:
+            del self.users[user]
+        self.waiting -= 1
+        return user, fut
+
+    def remove(self, user: Hashable, fut: asyncio.Future) -> bool:
+        waiters = self.users.get(user)
+        if waiters is None or fut not in waiters:
+            return False
+        waiters.remove(fut)
+        if not waiters:
+            del self.users[user]
+        self.waiting -= 1
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "weight": self.weight,
+            "max_active": self.max_active,
+            "active": self.active,
+            "waiting": self.waiting,
+            "waiting_users": len(self.users),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class JudgeQueue:
+    """按类别加权、按用户轮询的准入队列（运行在事件循环中，非线程安全）"""
+
+    def __init__(self, max_active: int = JUDGE_MAX_ACTIVE, max_waiting: int = JUDGE_MAX_QUEUE,
+                 max_waiting_per_user: int = JUDGE_MAX_QUEUE_PER_USER,
+                 weights: Optional[Dict[str, int]] = None,
+                 check_max_active: int = JUDGE_CHECK_MAX_ACTIVE):
+        self.max_active = max(1, int(max_active))
+        self.max_waiting = max(0, int(max_waiting))
+        self.max_waiting_per_user = max(0, int(max_waiting_per_user))
+        weights = {**JUDGE_CLASS_WEIGHTS, **(weights or {})}
+        caps = {name: self.max_active for name in CLASSES}
+        caps['check'] = min(self.max_active, int(check_max_active) or max(1, self.max_active // 4))
+        self._classes = {name: _ClassQueue(max(1, int(weights[name])), caps[name]) for name in CLASSES}
+        self._active = 0
+        self._waiting = 0
+        # 各用户（跨类别）排队中的请求数
+        self._user_waiting: Dict[Hashable, int] = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._wait_total = 0.0
+        self.max_wait = 0.0
+        # 单次评测耗时的指数滑动平均，用于估算 Retry-After
+        self._service_ewma: Optional[float] = None
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def _class(self, klass: str) -> _ClassQueue:
+        try:
+            return self._classes[klass]
+        except KeyError:
+            raise ValueError(f'未知的评测类别: {klass}') from None
+
+    def retry_after(self) -> int:
+        per_job = self._service_ewma or 1.0
+        rounds = (self.waiting + 1) / self.max_active
+        return max(1, math.ceil(per_job * rounds))
+
+    def _record_wait(self, cls: _ClassQueue, waited: float):
+        self.admitted += 1
+        cls.admitted += 1
+        self._wait_total += waited
+        self.max_wait = max(self.max_wait, waited)
+        metrics.record('admission_wait', waited)
+
+    def _reject(self, cls: _ClassQueue):
+        self.rejected += 1
+        cls.rejected += 1
+        raise JudgeQueueFull(self.retry_after())
+
+    def _forget(self, user: Hashable):
+        """等待者离开队列（被调度或被取消）后更新计数"""
+        self._waiting -= 1
+        left = self._user_waiting.get(user, 0) - 1
+        if left > 0:
+            self._user_waiting[user] = left
+        else:
+            self._user_waiting.pop(user, None)
+
+    def _pick_class(self) -> Optional[_ClassQueue]:
+        """平滑加权轮询：在有等待者且未达类别上限的类别中选出下一个"""
+        eligible = [c for c in self._classes.values() if c.waiting and c.active < c.max_active]
+        if not eligible:
+            return None
+        total = 0
+        for c in eligible:
+            c.current += c.weight
+            total += c.weight
+        chosen = max(eligible, key=lambda c: c.current)
+        chosen.current -= total
+        return chosen
+
+    def _dispatch(self):
+        """把空闲名额分配给轮到的等待者"""
+        while self._active < self.max_active:
+            cls = self._pick_class()
+            if cls is None:
+                return
+            user, fut = cls.pop()
+            self._forget(user)
+            if fut.done():
+                # 已被取消，尚未来得及从队列中移除
+                continue
+            self._active += 1
+            cls.active += 1
+            fut.set_result(None)
+
+    async def acquire(self, klass: str = 'run', user: Optional[Hashable] = None):
+        """取得 klass 类别的评测名额；user 为调用者标识（用户 ID 或客户端地址），None 时不受单用户上限限制"""
+        cls = self._class(klass)
+        if self._active < self.max_active and cls.active < cls.max_active and not cls.waiting:
+            self._active += 1
+            cls.active += 1
+            self._record_wait(cls, 0.0)
+            return
+        if self._waiting >= self.max_waiting:
+            self._reject(cls)
+        if user is not None and self.max_waiting_per_user \
+                and self._user_waiting.get(user, 0) >= self.max_waiting_per_user:
+            self._reject(cls)
+        fut = asyncio.get_running_loop().create_future()
+        cls.push(user, fut)
+        self._waiting += 1
+        self._user_waiting[user] = self._user_waiting.get(user, 0) + 1
+        start = time.monotonic()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 名额已经分配给本请求但请求被取消，交还给其他等待者
+                self.release(klass)
+            elif cls.remove(user, fut):
+                self._forget(user)
+            raise
+        self._record_wait(cls, time.monotonic() - start)
+
+    def release(self, klass: str = 'run'):
+        cls = self._class(klass)
+        self._active -= 1
+        cls.active -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, klass: str = 'run', user: Optional[Hashable] = None):
+        """取得评测名额；队列已满（或该用户排队过多）时抛出 JudgeQueueFull"""
+        await self.acquire(klass, user)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self._service_ewma = elapsed if self._service_ewma is None else 0.8 * self._service_ewma + 0.2 * elapsed
+            self.completed += 1
+            self.release(klass)
+
+    def stats(self) -> Dict:
+        return {
+            "max_active": self.max_active,
+            "max_waiting": self.max_waiting,
+            "max_waiting_per_user": self.max_waiting_per_user,
+            "active": self.active,
+            "waiting": self.waiting,
+            "waiting_users": len(self._user_waiting),
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "classes": {name: c.stats() for name, c in self._classes.items()},
+        }
+
+
+_queue: Optional[JudgeQueue] = None
+
+
+def get_judge_queue() -> JudgeQueue:
+    """返回进程内共享的评测队列"""
+    global _queue
+    if _queue is None:
+        _queue = JudgeQueue()
+    return _queue
@@ -0,0 +1,200 @@
+"""
+远程评测 worker（JUDGE_MODE=remote）
+考试周等高峰期可以临时增加评测机：在每台评测机上启动 HTTP worker（`python -m app.services.judge.http_worker`），
+把地址写入 JUDGE_REMOTE_WORKERS（逗号分隔），API 进程即把 /run、/submit、/check_tests 分派给这些 worker。
+
+协议（JSON over HTTP，配置了 JUDGE_WORKER_TOKEN 时双向请求都带 X-Judge-Token 请求头）：
+- worker 提供 GET /health：返回 worker_id、capacity（同时处理的任务数）、active 等
+- worker 提供 POST /jobs：请求体为 {kind, payload, fixture}，同步返回评测结果（与本地评测的返回值相同）；
+  满载时返回 503。fixture 为 {meta, fingerprint}：index.json 中的题目条目与测试集指纹（check 任务没有 fixture）
+- API 提供 GET /api/problems/judge/testsets/{fingerprint}：worker 本地没有该指纹的测试集时拉取，之后按指纹缓存
+
+分派策略：定期（JUDGE_REMOTE_HEALTH_INTERVAL 秒）检查各 worker 的 /health，在健康的 worker 中选择本进程
+在途任务最少的一个（相同时轮流）；连接失败的 worker 标记为不可用，直到下一次健康检查恢复；
+失败或满载时依次尝试其他 worker，全部不可用时由调用方回退到本进程执行。
+"""
+import os
+import time
+import asyncio
+import ipaddress
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.services.judge import metrics
+
+JUDGE_REMOTE_WORKERS = [u.strip().rstrip('/') for u in os.getenv('JUDGE_REMOTE_WORKERS', '').split(',') if u.strip()]
+JUDGE_WORKER_TOKEN = os.getenv('JUDGE_WORKER_TOKEN', '')
+JUDGE_REMOTE_HEALTH_INTERVAL = float(os.getenv('JUDGE_REMOTE_HEALTH_INTERVAL', '5') or 5)
+# 单个任务的请求超时（秒），与 queue 模式等待结果的时长一致
+JUDGE_REMOTE_TIMEOUT = float(os.getenv('JUDGE_REMOTE_TIMEOUT', '0') or 0) or float(os.getenv('JUDGE_JOB_TIMEOUT', '120') or 120)
+HEALTH_TIMEOUT = 2.0
+TOKEN_HEADER = 'X-Judge-Token'
+
+
+def is_loopback(host: Optional[str]) -> bool:
+    """host 是否为本机地址（127.0.0.0/8、::1 或 localhost）"""
+    if not host:
+        return False
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        return False
+
+
+def auth_headers(token: str = None) -> Dict[str, str]:
+    token = JUDGE_WORKER_TOKEN if token is None else token
+    return {TOKEN_HEADER: token} if token else {}
+
+
+class RemoteWorker:
+    """一个远程 worker 的状态（由 API 进程维护）"""
+
+    def __init__(self, url: str):
+        self.url = url
+        # None 表示尚未检查
+        self.healthy: Optional[bool] = None
+        self.capacity = 1
+        self.worker_id: Optional[str] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failures = 0
+        self.busy = 0
+        self.last_error: Optional[str] = None
+
+    def mark_down(self, error: str):
+        self.healthy = False
+        self.failures += 1
+        self.last_error = error
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "worker_id": self.worker_id,
+            "healthy": self.healthy,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failures": self.failures,
+            "busy": self.busy,
+            "last_error": self.last_error,
+        }
+
+
+class RemotePool:
+    """在一组远程 worker 间做健康检查、负载均衡与故障转移（运行在事件循环中，非线程安全）"""
+
+    def __init__(self, urls: Optional[List[str]] = None, token: Optional[str] = None,
+                 health_interval: float = JUDGE_REMOTE_HEALTH_INTERVAL, timeout: float = JUDGE_REMOTE_TIMEOUT):
+        self.workers = [RemoteWorker(u.rstrip('/')) for u in (JUDGE_REMOTE_WORKERS if urls is None else urls)]
+        self.token = JUDGE_WORKER_TOKEN if token is None else token
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.fallbacks = 0
+        self._checked_at: Optional[float] = None
+        self._health_lock: Optional[asyncio.Lock] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self._rr = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        # 连接池绑定事件循环，循环变化时（如测试中多次 asyncio.run）重新创建
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(headers=auth_headers(self.token), trust_env=False)
+            self._client_loop = loop
+            self._health_lock = asyncio.Lock()
+        return self._client
+
+    async def _check(self, worker: RemoteWorker):
+        try:
+            resp = await self._http().get(f"{worker.url}/health", timeout=HEALTH_TIMEOUT)
+            resp.raise_for_status()
+            info = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            worker.mark_down(f"健康检查失败: {e!r}")
+            return
+        worker.healthy = info.get("status") == "ok"
+        worker.capacity = max(1, int(info.get("capacity") or 1))
+        worker.worker_id = info.get("worker_id")
+
+    async def check_health(self, force: bool = False):
+        """距上次检查超过 health_interval 时（或 force）并发检查所有 worker"""
+        self._http()  # 确保锁与当前事件循环对应
+        async with self._health_lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.health_interval:
+                return
+            await asyncio.gather(*(self._check(w) for w in self.workers))
+            self._checked_at = time.monotonic()
+
+    def _pick(self, tried) -> Optional[RemoteWorker]:
+        candidates = [w for w in self.workers if w.healthy and w not in tried]
+        if not candidates:
+            return None
+        # 按负载率（在途任务 / 容量）选择；min 取第一个最小值，每次轮换起点使负载相同时轮流
+        self._rr = (self._rr + 1) % len(candidates)
+        rotated = candidates[self._rr:] + candidates[:self._rr]
+        return min(rotated, key=lambda w: w.in_flight / w.capacity)
+
+    async def _fixture(self, kind: str, payload: Dict) -> Optional[Dict]:
+        if kind not in ('run', 'submit'):
+            return None
+        from app.services.problems_service import load_problem_fixture
+        fixture = await load_problem_fixture(payload['lesson'], payload['problem'])
+        return {"meta": fixture.meta, "fingerprint": fixture.test_set.fingerprint if fixture.test_set else None}
+
+    async def judge(self, kind: str, payload: Dict) -> Optional[Dict]:
+        """交给一个可用的 worker 执行并返回结果；没有 worker 可用时返回 None"""
+        if not self.workers:
+            return None
+        await self.check_health()
+        with metrics.stage('fixtures'):
+            fixture = await self._fixture(kind, payload)
+        body = {"kind": kind, "payload": payload, "fixture": fixture}
+        tried = set()
+        while True:
+            worker = self._pick(tried)
+            if worker is None:
+                self.fallbacks += 1
+                return None
+            tried.add(worker)
+            worker.in_flight += 1
+            try:
+                with metrics.stage('remote'):
+                    resp = await self._http().post(f"{worker.url}/jobs", json=body, timeout=self.timeout)
+            except httpx.HTTPError as e:
+                # 连接失败或超时：标记为不可用，转给其他 worker
+                worker.mark_down(repr(e))
+                continue
+            finally:
+                worker.in_flight -= 1
+            if resp.status_code == 503:
+                worker.busy += 1
+                continue
+            if resp.status_code != 200:
+                worker.failures += 1
+                worker.last_error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+                continue
+            worker.completed += 1
+            return resp.json()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": [w.stats() for w in self.workers],
+            "healthy": sum(1 for w in self.workers if w.healthy),
+            "fallbacks": self.fallbacks,
+        }
+
+
+_pool: Optional[RemotePool] = None
+
+
+def get_remote_pool() -> RemotePool:
+    """返回进程内共享的远程 worker 池"""
+    global _pool
+    if _pool is None:
+        _pool = RemotePool()
+    return _pool
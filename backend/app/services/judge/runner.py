@@ -0,0 +1,124 @@
+"""
+学生代码执行入口
+把原先 problems_service 中三处重复的 `_run` 闭包收敛到这里：本模块提供冷启动执行与 RunResult，
+run_file 按 JUDGE_BACKEND 交给对应的执行后端（subprocess / asyncio / zygote / batched，见 backends.py）。
+工作目录与字节编译见 workspace.py
+返回值为 RunResult，前四项保持 (returncode, stdout, stderr, timed_out) 约定，
+之后附带墙钟时间、CPU 时间（wait4 取得）与峰值内存
+"""
+import os
+import time
+import subprocess
+from typing import Callable, NamedTuple, Optional
+
+from app.services.judge import metrics, proc
+
+JUDGE_BACKEND = os.getenv('JUDGE_BACKEND', 'subprocess').strip().lower()
+PYTHON_BIN = os.getenv('JUDGE_PYTHON', 'python')
+# 每个样例 stdout/stderr 各自的捕获上限，超出即终止进程并判为输出超限（OLE）
+OUTPUT_LIMIT = int(os.getenv('JUDGE_OUTPUT_LIMIT_KB', '8192') or 8192) * 1024
+
+
+class RunResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool
+    wall_time: float = 0.0   # 秒
+    cpu_time: float = 0.0    # 秒（用户态 + 内核态），无法测量时为 0
+    max_rss: int = 0         # KB，无法测量时为 0
+    output_exceeded: bool = False  # stdout/stderr 超过 OUTPUT_LIMIT 被提前终止
+
+
+def _run_cold_spawn(argv, stdin_data: str, timeout: float, cpu_limit: Optional[float],
+                    on_start: Optional[Callable[[int], None]] = None,
+                    memory_limit_kb: Optional[int] = None) -> RunResult:
+    """POSIX：posix_spawn + wait4，可以拿到子进程自己的资源占用"""
+    start = time.monotonic()
+    deadline = start + timeout
+    in_r, in_w = os.pipe()
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    try:
+        pid = proc.spawn(argv, in_r, out_w, err_w, cpu_limit=cpu_limit, memory_limit_kb=memory_limit_kb)
+    except Exception as e:
+        for fd in (in_w, out_r, err_r):
+            os.close(fd)
+        return RunResult(-2, "", str(e), False)
+    finally:
+        # 子进程一端由子进程持有，父进程这边关闭
+        for fd in (in_r, out_w, err_w):
+            os.close(fd)
+    if on_start is not None:
+        on_start(pid)
+    stdout, stderr, timed_out, exceeded = proc.collect(in_w, out_r, err_r, stdin_data.encode("utf-8"), deadline, OUTPUT_LIMIT)
+    if exceeded:
+        cpu_time, max_rss = proc.usage_of(proc.kill_group(pid))
+        with metrics.stage('decode'):
+            out_text = stdout.decode("utf-8", errors="replace")
+        return RunResult(-1, out_text, "Output limit exceeded", False,
+                         time.monotonic() - start, cpu_time, max_rss, True)
+    if timed_out:
+        returncode, rusage = None, proc.kill_group(pid)
+    else:
+        returncode, rusage, timed_out = proc.wait_exit(pid, deadline)
+    cpu_time, max_rss = proc.usage_of(rusage)
+    if timed_out:
+        return RunResult(-1, "", "Timeout", True, time.monotonic() - start, cpu_time, max_rss)
+    wall_time = time.monotonic() - start
+    with metrics.stage('decode'):
+        out_text, err_text = stdout.decode("utf-8", errors="replace"), stderr.decode("utf-8", errors="replace")
+    return RunResult(returncode, out_text, err_text, False, wall_time, cpu_time, max_rss)
+
+
+def _run_cold(file_path: str, stdin_data: str, timeout: float, pyc_path: Optional[str] = None,
+              cpu_limit: Optional[float] = None, on_start: Optional[Callable[[int], None]] = None,
+              memory_limit_kb: Optional[int] = None) -> RunResult:
+    """冷启动：每次新建解释器进程；有预编译的 .pyc 时直接执行，免去重复编译"""
+    argv = [PYTHON_BIN, pyc_path or file_path]
+    if proc.HAS_SPAWN:
+        return _run_cold_spawn(argv, stdin_data, timeout, cpu_limit, on_start, memory_limit_kb)
+    # 非 POSIX 平台只能测量墙钟时间，输出在进程结束后按上限判定
+    start = time.monotonic()
+    try:
+        completed = subprocess.run(argv, input=stdin_data.encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+
+        with metrics.stage('decode'):
+            stdout = completed.stdout.decode("utf-8", errors="replace")
+            stderr = completed.stderr.decode("utf-8", errors="replace")
+        if max(len(completed.stdout), len(completed.stderr)) > OUTPUT_LIMIT:
+            return RunResult(-1, stdout[:OUTPUT_LIMIT], "Output limit exceeded", False, time.monotonic() - start,
+                             output_exceeded=True)
+        return RunResult(completed.returncode, stdout, stderr, False, time.monotonic() - start)
+    except subprocess.TimeoutExpired:
+        return RunResult(-1, "", "Timeout", True, time.monotonic() - start)
+    except Exception as e:
+        return RunResult(-2, "", str(e), False)
+
+
+def run_file(file_path: str, stdin_data: str, timeout: float = 5, pyc_path: Optional[str] = None,
+             cpu_limit: Optional[float] = None, on_start: Optional[Callable[[int], None]] = None,
+             memory_limit_kb: Optional[int] = None) -> RunResult:
+    """用当前配置的后端执行已写入磁盘的 main.py（pyc_path 为可选的预编译字节码，cpu_limit 为 CPU 秒数上限，
+    memory_limit_kb 为地址空间上限）。on_start(pid) 在子进程启动后调用，pid 同时是其进程组号，可用于提前终止
+    """
+    from app.services.judge.backends import get_backend
+    return get_backend().run(file_path, stdin_data, timeout, pyc_path, cpu_limit, on_start, memory_limit_kb)
+
+
+def run_python(code_src: str, stdin_data: str, timeout: float = 5, prefix: str = "run_") -> RunResult:
+    """一次性执行：创建工作目录、运行一次后删除。多个样例请直接使用 Workspace 复用编译结果"""
+    from app.services.judge.workspace import Workspace
+    try:
+        with Workspace(code_src, prefix=prefix) as ws:
+            return ws.run(stdin_data, timeout)
+    except Exception as e:
+        return RunResult(-2, "", str(e), False)
+
+
+def shutdown():
+    """释放评测后端持有的进程与线程（应用退出时调用）"""
+    from app.services.judge.engine import get_engine
+    from app.services.judge.backends import close_backends
+    get_engine().shutdown()
+    close_backends()
@@ -0,0 +1,143 @@
+"""
+评测结果缓存
+以「代码（统一换行符后）的哈希 + 测试集指纹」为键缓存整份评测结果，学生原样重复提交、教师重复检测同一份
+参考答案时直接返回。测试目录中任何文件的增删改都会改变指纹，旧结果自然失效；
+create_problem / delete_problem 等写操作还会主动清除对应题目的缓存。
+缓存按 LRU 淘汰，条目数上限为 JUDGE_VERDICT_CACHE_SIZE，占用内存（按结果 JSON 长度估算）上限为 JUDGE_VERDICT_CACHE_MB。
+"""
+import os
+import copy
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+JUDGE_VERDICT_CACHE_SIZE = int(os.getenv('JUDGE_VERDICT_CACHE_SIZE', '2048'))
+JUDGE_VERDICT_CACHE_MB = float(os.getenv('JUDGE_VERDICT_CACHE_MB', '64'))
+
+
+def normalize_code(code: str) -> str:
+    """只统一换行符（\r\n、\r -> \n）：Python 读取源码时同样如此处理；
+    行尾空白可能位于多行字符串中、会改变程序输出，不能去掉"""
+    return code.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+
+def test_dir_fingerprint(test_dir: str) -> Optional[str]:
+    """由测试目录下的文件名、大小与修改时间计算指纹；目录不存在返回 None"""
+    try:
+        entries = sorted(os.scandir(test_dir), key=lambda e: e.name)
+    except OSError:
+        return None
+    h = hashlib.sha256(os.path.abspath(test_dir).encode('utf-8'))
+    for e in entries:
+        try:
+            st = e.stat()
+        except OSError:
+            continue
+        h.update(f"{e.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def tests_fingerprint(tests: List[Dict]) -> str:
+    """教师向导传入的内联测试集指纹"""
+    data = json.dumps([[t.get('input', ''), t.get('output', '')] for t in tests], ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(result: Dict) -> bool:
+    """超时或内部错误可能与当时的负载有关，不缓存"""
+    if result.get('status') != 'success' or 'error' in result:
+        return False
+    for entry in result.get('testResults') or []:
+        if 'error' in entry:
+            return False
+    return True
+
+
+class VerdictCache:
+    """线程安全的 LRU 缓存，键为 (scope, kind, code_hash, fingerprint)"""
+
+    def __init__(self, max_entries: int = JUDGE_VERDICT_CACHE_SIZE, max_bytes: int = int(JUDGE_VERDICT_CACHE_MB * 1024 * 1024)):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.bytes = 0
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(scope: str, kind: str, code: str, fingerprint: Optional[str]) -> Optional[tuple]:
+        if fingerprint is None:
+            return None
+        return (scope, kind, code_hash(code), fingerprint)
+
+    def get(self, key: Optional[tuple]) -> Optional[Dict]:
+        if key is None or self.max_entries == 0:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(item[0])
+
+    def put(self, key: Optional[tuple], result: Dict):
+        if key is None or self.max_entries == 0 or not is_cacheable(result):
+            return
+        size = len(json.dumps(result, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        value = copy.deepcopy(result)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (value, size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, scope: str = ''):
+        """清除某道题（lesson/problem）或某个课程（lesson）下的条目，空串表示全部"""
+        with self._lock:
+            stale = [k for k in self._data if not scope or k[0] == scope or k[0].startswith(scope + '/')]
+            for key in stale:
+                self.bytes -= self._data.pop(key)[1]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_cache: Optional[VerdictCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    """返回进程内共享的评测结果缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VerdictCache()
+        return _cache
@@ -0,0 +1,113 @@
+"""
+独立评测 worker（JUDGE_MODE=queue 时使用）
+从 jobs.py 的 SQLite 任务队列中领取 run/submit/check 任务，在本进程执行后写回结果。
+
+启动（在 backend 目录下）：
+    python -m app.services.judge.worker --concurrency 4
+同一台机器上可以启动多个 worker，只要 JUDGE_QUEUE_DB 指向同一个本地队列文件（队列只支持单机，
+多台评测机请使用 JUDGE_MODE=remote 与 http_worker）；
+worker 使用与 API 进程相同的评测配置（JUDGE_BACKEND、JUDGE_WORKERS 等）。
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+from typing import Optional, Set
+
+from app.services.judge import jobs
+from app.services.judge.engine import JUDGE_WORKERS
+
+WORKER_CONCURRENCY = int(os.getenv('JUDGE_WORKER_CONCURRENCY', '0') or 0) or JUDGE_WORKERS
+
+
+class JudgeWorker:
+    """同时处理至多 concurrency 个任务；每个任务内部的样例仍由评测引擎并行执行"""
+
+    def __init__(self, store: Optional[jobs.JobStore] = None, concurrency: int = WORKER_CONCURRENCY,
+                 worker_id: Optional[str] = None, poll_interval: float = 0.05):
+        self.store = store or jobs.get_job_store()
+        self.concurrency = max(1, int(concurrency))
+        self.worker_id = worker_id or jobs.default_worker_id()
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._running: Set[int] = set()
+
+    async def _process(self, job: jobs.Job):
+        self._running.add(job.id)
+        try:
+            try:
+                result = await jobs.execute_local(job.kind, job.payload)
+                failed = False
+            except Exception as e:
+                result, failed = {"status": "error", "message": f"评测失败: {e}"}, True
+            await asyncio.to_thread(self.store.finish, job.id, result, failed)
+            self.processed += 1
+        finally:
+            self._running.discard(job.id)
+
+    async def _slot_loop(self, stop: asyncio.Event):
+        while not stop.is_set():
+            job = await asyncio.to_thread(self.store.claim, self.worker_id)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _maintenance_loop(self, stop: asyncio.Event):
+        """定期刷新心跳，回收失联 worker 遗留的任务，并删除超过保留时长的已完成任务（启动时先清理一次）"""
+        last_purge = None
+        while not stop.is_set():
+            await asyncio.to_thread(self.store.heartbeat, list(self._running), self.worker_id)
+            await asyncio.to_thread(self.store.requeue_stale)
+            if last_purge is None or time.monotonic() - last_purge >= jobs.PURGE_INTERVAL:
+                await asyncio.to_thread(self.store.purge, jobs.JOB_RETENTION)
+                last_purge = time.monotonic()
+            try:
+                await asyncio.wait_for(stop.wait(), jobs.HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """运行直到 stop 被置位；正在处理的任务会先完成再退出"""
+        stop = stop or asyncio.Event()
+        await asyncio.gather(
+            self._maintenance_loop(stop),
+            *(self._slot_loop(stop) for _ in range(self.concurrency)),
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='评测 worker：从任务队列领取并执行评测任务')
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help='同时处理的任务数')
+    parser.add_argument('--db', default=None, help='任务队列文件（默认取 JUDGE_QUEUE_DB）')
+    args = parser.parse_args(argv)
+    if args.db:
+        jobs.QUEUE_DB = args.db
+
+    from app.services.judge.runner import shutdown
+
+    async def _serve():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        worker = JudgeWorker(concurrency=args.concurrency)
+        print(f"评测 worker {worker.worker_id} 已启动，队列 {worker.store.path}，并发 {worker.concurrency}", file=sys.stderr)
+        await worker.run(stop)
+
+    try:
+        asyncio.run(_serve())
+    finally:
+        shutdown()
+
+
+if __name__ == '__main__':
+    main()
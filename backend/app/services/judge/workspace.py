@@ -0,0 +1,159 @@
+"""
+提交级工作目录
+一次提交（或一次运行/检测）只创建一个临时目录，写入一次 main.py 并字节编译一次，
+该提交的所有样例复用同一个 main.pyc；语法错误在编译阶段即被拒绝，不再为每个样例启动进程。
+目录优先建在 tmpfs（/dev/shm）上，可通过 JUDGE_WORKDIR 指定。
+"""
+import os
+import time
+import shutil
+import tempfile
+import threading
+import traceback
+import py_compile
+import subprocess
+import importlib.util
+from typing import Optional
+
+from app.services.judge import metrics, proc, runner
+from app.services.judge.backends import get_backend
+
+
+def _default_root() -> Optional[str]:
+    root = os.getenv('JUDGE_WORKDIR', '')
+    if root:
+        os.makedirs(root, exist_ok=True)
+        return root
+    shm = '/dev/shm'
+    if os.path.isdir(shm) and os.access(shm, os.W_OK | os.X_OK):
+        return shm
+    return None
+
+
+WORKDIR_ROOT = _default_root()
+
+_pyc_compatible: Optional[bool] = None
+
+
+def _interpreter_accepts_pyc() -> bool:
+    """冷启动解释器与本进程的字节码版本一致时才能直接运行本进程编译出的 .pyc"""
+    global _pyc_compatible
+    if _pyc_compatible is None:
+        try:
+            out = subprocess.run(
+                [runner.PYTHON_BIN, '-c', 'import importlib.util;print(importlib.util.MAGIC_NUMBER.hex())'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10,
+            ).stdout.decode().strip()
+            _pyc_compatible = out == importlib.util.MAGIC_NUMBER.hex()
+        except Exception:
+            _pyc_compatible = False
+    return _pyc_compatible
+
+
+class Workspace:
+    """一次提交的执行环境，用完调用 close()（或使用 with 语句）删除目录"""
+
+    def __init__(self, code_src: str, prefix: str = 'submit_', root: Optional[str] = WORKDIR_ROOT):
+        with metrics.stage('mkdtemp'):
+            self.dir = tempfile.mkdtemp(prefix=prefix, dir=root)
+        self.source_path = os.path.join(self.dir, 'main.py')
+        self.pyc_path: Optional[str] = None
+        self.syntax_error: Optional[str] = None
+        # 正在运行的子进程（pid 即进程组号），cancel() 时统一终止
+        self._lock = threading.Lock()
+        self._running = set()
+        self.cancelled = False
+        try:
+            with metrics.stage('write'), open(self.source_path, 'w', encoding='utf-8') as f:
+                f.write(code_src)
+            with metrics.stage('compile'):
+                self._compile()
+        except Exception:
+            self.close()
+            raise
+
+    def _compile(self):
+        pyc_path = os.path.join(self.dir, 'main.pyc')
+        try:
+            py_compile.compile(
+                self.source_path, cfile=pyc_path, dfile=self.source_path, doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+        except py_compile.PyCompileError as e:
+            # 与解释器直接运行时打印的内容保持一致（不含 Traceback 头）
+            exc = e.exc_value
+            self.syntax_error = ''.join(traceback.format_exception_only(type(exc), exc))
+            return
+
+        # 冷启动解释器可能与本进程版本不同，此时退回执行源码
+        if not get_backend().same_interpreter and not _interpreter_accepts_pyc():
+            pyc_path = None
+        self.pyc_path = pyc_path
+
+    def _track(self, pid: int):
+        with self._lock:
+            if not self.cancelled:
+                self._running.add(pid)
+                return
+        # 启动前已被取消，立即终止
+        proc.terminate_group(pid)
+
+    def run(self, stdin_data: str, timeout: float = 5, cpu_limit: Optional[float] = None,
+            memory_limit_kb: Optional[int] = None) -> runner.RunResult:
+        """在当前线程中阻塞执行一次"""
+        if self.syntax_error is not None:
+            return runner.RunResult(1, '', self.syntax_error, False)
+        if self.cancelled:
+            return runner.RunResult(-2, '', '已取消', False)
+        started = []
+        # spawn：调用后端到子进程启动；execute：子进程启动到后端返回（学生代码运行与收集输出）
+        start = time.perf_counter()
+        started_at = []
+
+        def _on_start(pid: int):
+            started_at.append(time.perf_counter())
+            metrics.record('spawn', started_at[0] - start)
+            started.append(pid)
+            self._track(pid)
+
+        try:
+            return runner.run_file(self.source_path, stdin_data, timeout, pyc_path=self.pyc_path,
+                                   cpu_limit=cpu_limit, on_start=_on_start, memory_limit_kb=memory_limit_kb)
+        finally:
+            metrics.record('execute', time.perf_counter() - (started_at[0] if started_at else start))
+            with self._lock:
+                self._running.difference_update(started)
+
+    def cancel(self):
+        """终止本工作目录下正在运行的全部子进程，之后的 run() 不再启动新进程"""
+        with self._lock:
+            self.cancelled = True
+            running, self._running = list(self._running), set()
+        for pid in running:
+            proc.terminate_group(pid)
+
+    async def run_async(self, stdin_data: str, timeout: float = 5, cpu_limit: Optional[float] = None,
+                        memory_limit_kb: Optional[int] = None) -> runner.RunResult:
+        """在事件循环中执行一次：asyncio 后端不占线程，其余后端放到评测 worker 池"""
+        if self.syntax_error is not None:
+            return runner.RunResult(1, '', self.syntax_error, False)
+        backend = get_backend()
+        if backend.is_async:
+            # 原生异步后端不回报子进程启动时刻，整段计入 execute
+            with metrics.stage('execute'):
+                return await backend.run_async(self.source_path, stdin_data, timeout, self.pyc_path, cpu_limit,
+                                               memory_limit_kb=memory_limit_kb)
+        from app.services.judge.engine import get_engine
+        return await get_engine().run(self.run, stdin_data, timeout, cpu_limit, memory_limit_kb)
+
+    def close(self):
+        with metrics.stage('cleanup'):
+            self.cancel()
+            get_backend().release(self.source_path)
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,175 @@
+"""
+zygote 进程池
+维护若干个预热好的 zygote 进程（见 zygote_server.py），每个样例从空闲 zygote fork 出干净的子进程执行，
+避免每个样例都支付解释器启动与 site 导入的开销。池大小默认与 JUDGE_WORKERS 一致。
+"""
+import os
+import sys
+import json
+import queue
+import struct
+import threading
+import subprocess
+from typing import Callable, Optional
+
+from app.services.judge.engine import JUDGE_WORKERS
+from app.services.judge import metrics, runner
+from app.services.judge.runner import RunResult
+
+# zygote 以 `python -m app.services.judge.zygote_server` 启动，需要 backend 目录在 sys.path 中
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+ZYGOTE_POOL_SIZE = int(os.getenv('JUDGE_ZYGOTE_POOL_SIZE', '0') or 0) or JUDGE_WORKERS
+ZYGOTE_PYTHON = os.getenv('JUDGE_PYTHON', sys.executable)
+
+
+class ZygoteError(RuntimeError):
+    pass
+
+
+class Zygote:
+    """单个 zygote 进程的客户端，同一时刻只处理一个请求"""
+
+    def __init__(self, python: str = ZYGOTE_PYTHON):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (BACKEND_ROOT, env.get('PYTHONPATH')) if p)
+        self.proc = subprocess.Popen(
+            [python, '-m', 'app.services.judge.zygote_server'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env,
+        )
+        ready = self._recv()
+        if not ready.get('ready'):
+            self.close()
+            raise ZygoteError('zygote 启动失败')
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _send(self, obj: dict):
+        data = json.dumps(obj).encode('utf-8')
+        self.proc.stdin.write(struct.pack('>I', len(data)) + data)
+        self.proc.stdin.flush()
+
+    def _read_frame(self) -> bytes:
+        header = self.proc.stdout.read(4)
+        if len(header) < 4:
+            raise ZygoteError('zygote 进程已退出')
+        (size,) = struct.unpack('>I', header)
+        return self.proc.stdout.read(size)
+
+    def _recv(self) -> dict:
+        return json.loads(self._read_frame().decode('utf-8'))
+
+    def run(self, file_path: str, stdin_data: str, timeout: float, pyc_path: Optional[str] = None,
+            cpu_limit: Optional[float] = None, on_start: Optional[Callable[[int], None]] = None,
+            memory_limit_kb: Optional[int] = None) -> RunResult:
+        try:
+            self._send({"file": file_path, "pyc": pyc_path, "stdin": stdin_data, "timeout": timeout, "cpu_limit": cpu_limit,
+                        "memory_limit_kb": memory_limit_kb, "output_limit": runner.OUTPUT_LIMIT})
+            resp = self._recv()
+            if 'pid' in resp:
+                if on_start is not None:
+                    on_start(resp['pid'])
+                frame = self._read_frame()
+                # 结果帧中带有样例的完整输出，解码耗时计入 decode 阶段
+                with metrics.stage('decode'):
+                    resp = json.loads(frame.decode('utf-8'))
+        except (OSError, ValueError) as e:
+            raise ZygoteError(f'与 zygote 通信失败: {e}')
+        return RunResult(resp['returncode'], resp['stdout'], resp['stderr'], resp['timed_out'],
+                         resp.get('wall_time', 0.0), resp.get('cpu_time', 0.0), resp.get('max_rss', 0),
+                         resp.get('output_exceeded', False))
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except Exception:
+            self.proc.kill()
+
+
+class ZygotePool:
+    """按需创建、最多 size 个 zygote；借出的 zygote 用完归还，异常的直接丢弃重建"""
+
+    def __init__(self, size: int = ZYGOTE_POOL_SIZE):
+        self.size = max(1, int(size))
+        self._idle: "queue.LifoQueue[Zygote]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _acquire(self) -> Zygote:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return Zygote()
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                raise ZygoteError(f'无法启动 zygote: {e}')
+        return self._idle.get()
+
+    def _discard(self, z: Zygote):
+        z.close()
+        with self._lock:
+            self._created -= 1
+
+    def warm_up(self):
+        """预先启动全部 zygote"""
+        zs = [self._acquire() for _ in range(self.size)]
+        for z in zs:
+            self._idle.put(z)
+
+    def run(self, file_path: str, stdin_data: str, timeout: float, pyc_path: Optional[str] = None,
+            cpu_limit: Optional[float] = None, on_start: Optional[Callable[[int], None]] = None,
+            memory_limit_kb: Optional[int] = None) -> RunResult:
+        z = self._acquire()
+        try:
+            res = z.run(file_path, stdin_data, timeout, pyc_path, cpu_limit, on_start, memory_limit_kb)
+        except ZygoteError:
+            self._discard(z)
+            raise
+        if z.alive:
+            self._idle.put(z)
+        else:
+            self._discard(z)
+        return res
+
+    def close(self):
+        while True:
+            try:
+                z = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(z)
+
+
+_pool: Optional[ZygotePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_zygote_pool() -> ZygotePool:
+    """返回进程内共享的 zygote 池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ZygotePool()
+        return _pool
+
+
+def close_zygote_pool():
+    """关闭共享 zygote 池（应用退出时调用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
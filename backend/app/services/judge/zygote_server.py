@@ -0,0 +1,224 @@
+"""
+zygote 进程主程序（只依赖标准库与 proc.py，由 zygote.py 以 `python -m` 独立启动）
+启动时预先导入常用模块，随后循环读取请求：每个请求 fork 一个干净的子进程执行学生代码，
+父进程（zygote）负责喂入 stdin、收集 stdout/stderr、超时后杀掉整个进程组并回报结果。
+
+协议：stdin/stdout 上的帧，4 字节大端长度 + UTF-8 JSON
+请求 {"file": "/tmp/.../main.py", "pyc": "/tmp/.../main.pyc" 或 null, "stdin": "...", "timeout": 5, "cpu_limit": null,
+      "memory_limit_kb": null, "output_limit": 8388608}
+子进程启动后先回报 {"pid": 1234}（pid 即进程组号，客户端可据此提前终止），随后回报
+响应 {"returncode": 0, "stdout": "...", "stderr": "...", "timed_out": false, "wall_time": 0.01, "cpu_time": 0.01, "max_rss": 9000}
+"""
+import os
+import sys
+import json
+import time
+import struct
+import signal
+import importlib
+
+from app.services.judge import proc
+
+DEFAULT_PRELOAD = (
+    'math,random,re,string,collections,itertools,functools,heapq,bisect,'
+    'decimal,fractions,statistics,datetime,time,copy,json,io,traceback'
+)
+
+
+def _preload():
+    names = os.getenv('JUDGE_ZYGOTE_PRELOAD', DEFAULT_PRELOAD)
+    for name in names.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def _read_exact(fd: int, n: int) -> bytes:
+    buf = b''
+    while len(buf) < n:
+        chunk = os.read(fd, n - len(buf))
+        if not chunk:
+            raise EOFError
+        buf += chunk
+    return buf
+
+
+def _read_frame(fd: int) -> dict:
+    (size,) = struct.unpack('>I', _read_exact(fd, 4))
+    return json.loads(_read_exact(fd, size).decode('utf-8'))
+
+
+def _write_frame(fd: int, obj: dict):
+    data = json.dumps(obj).encode('utf-8')
+    data = struct.pack('>I', len(data)) + data
+    while data:
+        n = os.write(fd, data)
+        data = data[n:]
+
+
+def _exit_code(code) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xFF
+    try:
+        sys.stderr.write(f"{code}\n")
+    except Exception:
+        pass
+    return 1
+
+
+def _load_code(file_path: str, pyc_path):
+    """优先加载预编译的 .pyc（跳过 16 字节头），字节码版本不符时回退到编译源码"""
+    if pyc_path:
+        import marshal
+        import importlib.util
+        try:
+            with open(pyc_path, 'rb') as f:
+                data = f.read()
+            if data[:4] == importlib.util.MAGIC_NUMBER:
+                return marshal.loads(data[16:])
+        except Exception:
+            pass
+    with open(file_path, 'rb') as f:
+        source = f.read()
+    return compile(source, file_path, 'exec')
+
+
+def _child_main(file_path: str, pyc_path, cpu_limit, in_r: int, out_w: int, err_w: int, keep_fds,
+                memory_limit_kb=None):
+    """在 fork 出的子进程中执行学生代码，语义尽量与 `python main.py` 一致；资源限制在加载学生代码之前设置"""
+    rc = 0
+    try:
+        os.setpgid(0, 0)
+        proc.set_limits(cpu_limit, memory_limit_kb)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.dup2(in_r, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        for fd in (in_r, out_w, err_w) + tuple(keep_fds):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        sys.stdin = open(0, 'r', encoding='utf-8', closefd=False)
+        sys.stdout = open(1, 'w', encoding='utf-8', closefd=False)
+        sys.stderr = open(2, 'w', encoding='utf-8', errors='backslashreplace', closefd=False, buffering=1)
+        if 'random' in sys.modules:
+            # fork 会复制随机数状态，重新播种避免每个子进程输出相同的随机序列
+            sys.modules['random'].seed()
+
+        import types
+        import traceback
+        main = types.ModuleType('__main__')
+        main.__file__ = file_path
+        main.__builtins__ = __builtins__
+        sys.modules['__main__'] = main
+        sys.argv = [file_path]
+        sys.path[0] = os.path.dirname(file_path)
+        try:
+            code = _load_code(file_path, pyc_path)
+        except (SyntaxError, ValueError) as e:
+            sys.stderr.write(''.join(traceback.format_exception_only(type(e), e)))
+            code, rc = None, 1
+        try:
+            if code is not None:
+                exec(code, main.__dict__)
+        except SystemExit as e:
+            rc = _exit_code(e.code)
+        except BaseException:
+            etype, value, tb = sys.exc_info()
+            # 跳过本函数所在的栈帧，使 traceback 与直接运行脚本时一致
+            traceback.print_exception(etype, value, tb.tb_next)
+            rc = 1
+        try:
+            sys.stdout.flush()
+        except Exception:
+            rc = rc or 120
+        try:
+            sys.stderr.flush()
+        except Exception:
+            pass
+    except BaseException:
+        rc = 2
+    os._exit(rc)
+
+
+def handle(req: dict, keep_fds, on_start=None) -> dict:
+    start = time.monotonic()
+    deadline = start + float(req.get('timeout', 5))
+    in_r, in_w = os.pipe()
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(in_w)
+        os.close(out_r)
+        os.close(err_r)
+        _child_main(req['file'], req.get('pyc'), req.get('cpu_limit'), in_r, out_w, err_w, keep_fds,
+                    req.get('memory_limit_kb'))
+    os.close(in_r)
+    os.close(out_w)
+    os.close(err_w)
+    try:
+        # 父子进程都设置进程组，避免客户端在子进程 setpgid 之前发出 killpg
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    if on_start is not None:
+        on_start(pid)
+    stdout, stderr, timed_out, exceeded = proc.collect(in_w, out_r, err_r, req.get('stdin', '').encode('utf-8'),
+                                                       deadline, req.get('output_limit'))
+    if exceeded:
+        cpu_time, max_rss = proc.usage_of(proc.kill_group(pid))
+        return {"returncode": -1, "stdout": stdout.decode('utf-8', errors='replace'), "stderr": "Output limit exceeded",
+                "timed_out": False, "wall_time": time.monotonic() - start, "cpu_time": cpu_time, "max_rss": max_rss,
+                "output_exceeded": True}
+    if timed_out:
+        returncode, rusage = None, proc.kill_group(pid)
+    else:
+        returncode, rusage, timed_out = proc.wait_exit(pid, deadline)
+    cpu_time, max_rss = proc.usage_of(rusage)
+    if timed_out:
+        return {"returncode": -1, "stdout": "", "stderr": "Timeout", "timed_out": True,
+                "wall_time": time.monotonic() - start, "cpu_time": cpu_time, "max_rss": max_rss}
+    return {
+        "returncode": returncode,
+        "stdout": stdout.decode('utf-8', errors='replace'),
+        "stderr": stderr.decode('utf-8', errors='replace'),
+        "timed_out": False,
+        "wall_time": time.monotonic() - start,
+        "cpu_time": cpu_time,
+        "max_rss": max_rss,
+    }
+
+
+def main():
+    # 协议使用复制出来的描述符，原 0/1 指向 /dev/null，防止意外输出破坏帧
+    proto_in = os.dup(0)
+    proto_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    _preload()
+    _write_frame(proto_out, {"ready": True})
+    while True:
+        try:
+            req = _read_frame(proto_in)
+        except EOFError:
+            break
+        try:
+            resp = handle(req, (proto_in, proto_out), lambda pid: _write_frame(proto_out, {"pid": pid}))
+        except Exception as e:
+            resp = {"returncode": -2, "stdout": "", "stderr": str(e), "timed_out": False}
+        _write_frame(proto_out, resp)
+
+
+if __name__ == '__main__':
+    main()
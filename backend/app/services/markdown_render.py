@@ -0,0 +1,451 @@
+"""
+题面 / 参考答案的服务端 Markdown 渲染与缓存
+教室里的低配电脑在前端渲染 README.md 较慢，改由服务端渲染为 HTML 片段：
+- 渲染器只覆盖题库实际用到、且能与前端 markdown-it（breaks、linkify、typographer、html 选项）渲染一致的语法：
+  标题、段落（单个换行渲染为 <br>）、粗体/斜体/删除线、行内代码、围栏代码块与缩进代码块、引用、有序/无序列表、
+  表格、分隔线、链接与图片
+- 文档用到子集之外的写法时抛出 UnsupportedMarkdown，由客户端自行渲染：原始 HTML、HTML 实体、公式（$）、
+  会被 linkify 自动识别的裸链接与域名、会被 typographer 替换的引号与符号（--、...、(c) 等）、交错嵌套的强调标记
+- 围栏代码块输出与前端高亮失败时相同的 <pre class="hljs"><code class="language-xx">，服务端不做语法高亮，
+  需要高亮的客户端可对其调用 highlight.js
+- 清理：只输出渲染器自己生成的标签；链接只允许 http/https/mailto 与相对地址，
+  图片另外允许 data:image/*，其他协议（如 javascript:）的链接与图片被去掉
+- 相对路径的图片与链接改写到该题的 /assets/ 路由
+- 渲染结果按（源文件内容、资源地址前缀、渲染器版本）的哈希缓存在 HTTP_CACHE_DIR/html 下，内容变化即换新文件并删除旧文件，
+  目录大小受 HTTP_CACHE_MAX_MB 限制；内存中按源文件的修改时间、大小、inode 记录对应的缓存文件（或不支持的原因），
+  create_problem 等写入题目后清除
+"""
+import os
+import re
+import html
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.utils import http_cache
+
+# 渲染规则变化时递增，使旧的缓存文件失效
+RENDERER_VERSION = "2"
+MARKDOWN_CACHE_SIZE = int(os.getenv('MARKDOWN_CACHE_SIZE', '2048') or 0)
+
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})\s*([^\s`]*)')
+_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+_SETEXT = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+_HR = re.compile(r'^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$')
+_QUOTE = re.compile(r'^ {0,3}> ?(.*)$')
+_LIST_ITEM = re.compile(r'^( {0,3})([-*+]|\d{1,9}[.)])([ \t]+(.*)|[ \t]*$)')
+_TABLE_DELIM = re.compile(r'^ {0,3}\|?[ \t]*:?-+:?[ \t]*(\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$')
+_INDENTED = re.compile(r'^(?: {4}|\t)')
+
+_CODE_SPAN = re.compile(r'(`+)(.+?)(?<!`)\1(?!`)', re.S)
+_ESCAPE = re.compile(r'\\([!"#$%&\'()*+,\-./:;<=>?@\[\\\]^_`{|}~])')
+_AUTOLINK = re.compile(r'<((?:https?://|mailto:)[^\s<>]+)>')
+_LINK_TARGET = r'\(\s*<?([^\s<>()]*(?:\([^\s()]*\)[^\s<>()]*)*)>?(?:\s+"([^"]*)")?\s*\)'
+_IMAGE = re.compile(r'!\[([^\]]*)\]' + _LINK_TARGET)
+_LINK = re.compile(r'\[((?:[^\[\]]|\[[^\]]*\])+)\]' + _LINK_TARGET)
+_HARD_BREAK = re.compile(r'(?: {2,}|\\)\n')
+_EMPHASIS = (
+    (re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*', re.S), 'strong'),
+    (re.compile(r'(?<![\w_])__(?=\S)(.+?)(?<=\S)__(?![\w_])', re.S), 'strong'),
+    (re.compile(r'\*(?=[^\s*])(.+?)(?<=[^\s*])\*', re.S), 'em'),
+    (re.compile(r'(?<![\w_])_(?=[^\s_])(.+?)(?<=[^\s_])_(?![\w_])', re.S), 'em'),
+    (re.compile(r'~~(?=\S)(.+?)(?<=\S)~~', re.S), 'del'),
+)
+_PLACEHOLDER = re.compile(r'\x00(\d+)\x00')
+_TAG = re.compile(r'<(/?)(strong|em|del)>')
+# 行内文本（代码、转义字符、链接地址已替换为占位符）中出现即无法与前端一致渲染的写法
+_UNSUPPORTED = (
+    (re.compile(r'<[A-Za-z/!?]'), "原始 HTML"),
+    (re.compile(r'&(?:#\d+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);'), "HTML 实体"),
+    (re.compile(r'\$'), "公式"),
+    (re.compile(r'https?://|www\.|mailto:|\w@\w', re.I), "裸链接"),
+    (re.compile(r'[A-Za-z0-9-]\.(?:[a-z]{2}|com|net|org|edu|gov|info|biz|pro|web|xxx|aero|asia|coop|museum|name|shop)\b',
+                re.I), "可能被识别为域名的文本"),
+    (re.compile(r'["\']|\+-|\.\.|\?\?\?\?|!!!!|,,|--|\((?:c|tm|r)\)', re.I), "会被替换的引号或符号"),
+    (re.compile(r'\*\*\*|___'), "连续三个强调标记"),
+)
+
+
+class UnsupportedMarkdown(ValueError):
+    """文档用到了服务端渲染器无法与前端一致渲染的写法"""
+_SCHEME = re.compile(r'^([a-z][a-z0-9+.\-]*):')
+_DATA_IMAGE = re.compile(r'^data:image/(?:png|jpe?g|gif|webp);')
+
+
+def _attr(value: str) -> str:
+    return html.escape(value, quote=True)
+
+
+def _safe_url(url: str, asset_base: Optional[str], image: bool = False) -> Optional[str]:
+    """清理链接/图片地址；相对地址改写到题目资源路由，不允许的协议返回 None"""
+    url = url.strip()
+    scheme = _SCHEME.match(re.sub(r'[\x00-\x20]', '', url).lower())
+    if scheme is not None:
+        if scheme.group(1) in ('http', 'https', 'mailto'):
+            return url
+        if image and _DATA_IMAGE.match(url.lower()):
+            return url
+        return None
+    if asset_base and url and not url.startswith(('/', '#', '?')):
+        while url.startswith('./'):
+            url = url[2:]
+        return f"{asset_base.rstrip('/')}/{url}"
+    return url
+
+
+def _check(text: str):
+    for pattern, reason in _UNSUPPORTED:
+        if pattern.search(text):
+            raise UnsupportedMarkdown(reason)
+
+
+def _well_nested(text: str) -> bool:
+    stack = []
+    for m in _TAG.finditer(text):
+        if not m.group(1):
+            stack.append(m.group(2))
+        elif not stack or stack.pop() != m.group(2):
+            return False
+    return not stack
+
+
+class _Inline:
+    """行内渲染：先把代码、转义、链接、图片替换为占位符，转义其余文本后处理强调，最后还原占位符"""
+
+    def __init__(self, asset_base: Optional[str]):
+        self.asset_base = asset_base
+        self.slots: List[str] = []
+
+    def _slot(self, value: str) -> str:
+        self.slots.append(value)
+        return f"\x00{len(self.slots) - 1}\x00"
+
+    def _image(self, m) -> str:
+        _check(m.group(1))
+        src = _safe_url(m.group(2), self.asset_base, image=True)
+        if src is None:
+            return self._slot(_attr(m.group(1)))
+        title = f' title="{_attr(m.group(3))}"' if m.group(3) else ''
+        return self._slot(f'<img src="{_attr(src)}" alt="{_attr(m.group(1))}"{title}>')
+
+    def _link(self, m) -> str:
+        label = self.render(m.group(1))
+        href = _safe_url(m.group(2), self.asset_base)
+        if href is None:
+            return self._slot(label)
+        title = f' title="{_attr(m.group(3))}"' if m.group(3) else ''
+        return self._slot(f'<a href="{_attr(href)}"{title}>{label}</a>')
+
+    def _autolink(self, m) -> str:
+        url = m.group(1)
+        return self._slot(f'<a href="{_attr(url)}">{_attr(url)}</a>')
+
+    def render(self, text: str) -> str:
+        text = _CODE_SPAN.sub(lambda m: self._slot(f"<code>{_attr(m.group(2).strip() or m.group(2))}</code>"), text)
+        text = _ESCAPE.sub(lambda m: self._slot(_attr(m.group(1))), text)
+        text = _AUTOLINK.sub(self._autolink, text)
+        text = _IMAGE.sub(self._image, text)
+        text = _LINK.sub(self._link, text)
+        _check(text)
+        text = _attr(text)
+        for pattern, tag in _EMPHASIS:
+            text = pattern.sub(lambda m, tag=tag: f"<{tag}>{m.group(1)}</{tag}>", text)
+        if not _well_nested(text):
+            # 如 **a *b** c*：markdown-it 按分隔符栈配对，正则逐类替换会产生交错的标签
+            raise UnsupportedMarkdown("交错嵌套的强调标记")
+        text = _HARD_BREAK.sub('<br>\n', text)
+        # 与前端 breaks 选项一致：段落内的换行即为换行
+        text = re.sub(r'(?<!<br>)\n', '<br>\n', text)
+        while _PLACEHOLDER.search(text):
+            text = _PLACEHOLDER.sub(lambda m: self.slots[int(m.group(1))], text)
+        return text
+
+
+def _split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [c.strip().replace('\\|', '|') for c in re.split(r'(?<!\\)\|', line)]
+
+
+def _starts_block(line: str) -> bool:
+    """能打断段落的块开头"""
+    return bool(_FENCE.match(line) or _HEADING.match(line) or _HR.match(line) or _QUOTE.match(line)
+                or (_LIST_ITEM.match(line) and _LIST_ITEM.match(line).group(4)))
+
+
+class _Blocks:
+    def __init__(self, asset_base: Optional[str]):
+        self.asset_base = asset_base
+
+    def inline(self, text: str) -> str:
+        return _Inline(self.asset_base).render(text)
+
+    def render(self, lines: List[str]) -> List[str]:
+        out: List[str] = []
+        i, n = 0, len(lines)
+        while i < n:
+            line = lines[i]
+            if not line.strip():
+                i += 1
+                continue
+            fence = _FENCE.match(line)
+            if fence:
+                marker = fence.group(1)
+                body = []
+                i += 1
+                while i < n and not re.match(rf'^ {{0,3}}{re.escape(marker[0])}{{{len(marker)},}}\s*$', lines[i]):
+                    body.append(lines[i])
+                    i += 1
+                i += 1
+                lang = fence.group(2)
+                cls = f' class="language-{_attr(lang)}"' if lang else ''
+                code = "\n".join(body)
+                out.append(f'<pre class="hljs"><code{cls}>{_attr(code)}{chr(10) if body else ""}</code></pre>')
+                continue
+            heading = _HEADING.match(line)
+            if heading:
+                level = len(heading.group(1))
+                out.append(f"<h{level}>{self.inline(heading.group(2) or '')}</h{level}>")
+                i += 1
+                continue
+            if _HR.match(line):
+                out.append("<hr>")
+                i += 1
+                continue
+            if _QUOTE.match(line):
+                body = []
+                while i < n and _QUOTE.match(lines[i]):
+                    body.append(_QUOTE.match(lines[i]).group(1))
+                    i += 1
+                out.append("<blockquote>\n" + "\n".join(self.render(body)) + "\n</blockquote>")
+                continue
+            if _LIST_ITEM.match(line):
+                i = self._list(lines, i, out)
+                continue
+            if _INDENTED.match(line):
+                body = []
+                while i < n and (_INDENTED.match(lines[i]) or not lines[i].strip()):
+                    body.append(re.sub(r'^(?: {4}|\t)', '', lines[i]))
+                    i += 1
+                while body and not body[-1].strip():
+                    body.pop()
+                out.append(f"<pre><code>{_attr(chr(10).join(body))}\n</code></pre>")
+                continue
+            if ('|' in line and i + 1 < n and _TABLE_DELIM.match(lines[i + 1]) and '|' in lines[i + 1]
+                    and len(_split_row(lines[i + 1])) == len(_split_row(line))):
+                i = self._table(lines, i, out)
+                continue
+            para = [line.strip()]
+            i += 1
+            level = 0
+            while i < n and lines[i].strip():
+                setext = _SETEXT.match(lines[i])
+                if setext:
+                    # 段落下一行为 === / --- 时是标题
+                    level = 1 if setext.group(1)[0] == '=' else 2
+                    i += 1
+                    break
+                if _starts_block(lines[i]):
+                    break
+                para.append(lines[i].strip())
+                i += 1
+            if level:
+                out.append(f"<h{level}>{self.inline(chr(10).join(para))}</h{level}>")
+            else:
+                out.append(f"<p>{self.inline(chr(10).join(para))}</p>")
+        return out
+
+    def _list(self, lines: List[str], i: int, out: List[str]) -> int:
+        first = _LIST_ITEM.match(lines[i])
+        ordered = first.group(2)[-1] in '.)'
+        delim = first.group(2)[-1]
+        items: List[List[str]] = []
+        loose = False
+        n = len(lines)
+        while i < n:
+            m = _LIST_ITEM.match(lines[i])
+            if not m or m.group(2)[-1] != delim:
+                break
+            # 后续行缩进达到列表标记之后的内容列时属于该项
+            indent = len(m.group(1)) + len(m.group(2)) + 1
+            item = [m.group(4) or '']
+            i += 1
+            while i < n:
+                if not lines[i].strip():
+                    j = i
+                    while j < n and not lines[j].strip():
+                        j += 1
+                    if j < n and len(lines[j]) - len(lines[j].lstrip(' ')) >= indent:
+                        item.extend([''] * (j - i))
+                        loose = True
+                        i = j
+                        continue
+                    nxt = _LIST_ITEM.match(lines[j]) if j < n else None
+                    if nxt and nxt.group(2)[-1] == delim:
+                        # 同一列表的项之间有空行：松散列表，项内容包在 <p> 中
+                        loose = True
+                        i = j
+                    break
+                if len(lines[i]) - len(lines[i].lstrip(' ')) >= indent:
+                    item.append(lines[i][indent:])
+                elif not _starts_block(lines[i]) and not _LIST_ITEM.match(lines[i]):
+                    # 段落的延续行（未缩进）
+                    item.append(lines[i].strip())
+                else:
+                    break
+                i += 1
+            items.append(item)
+        tag = 'ol' if ordered else 'ul'
+        start = int(first.group(2)[:-1]) if ordered else 1
+        attrs = f' start="{start}"' if ordered and start != 1 else ''
+        rendered = []
+        for item in items:
+            blocks = self.render(item)
+            if not loose and blocks and blocks[0].startswith('<p>'):
+                blocks[0] = blocks[0][3:-4]
+            rendered.append(f"<li>{chr(10).join(blocks)}</li>")
+        out.append(f"<{tag}{attrs}>\n" + "\n".join(rendered) + f"\n</{tag}>")
+        return i
+
+    def _table(self, lines: List[str], i: int, out: List[str]) -> int:
+        header = _split_row(lines[i])
+        aligns = []
+        for cell in _split_row(lines[i + 1]):
+            left, right = cell.startswith(':'), cell.endswith(':')
+            aligns.append('center' if left and right else 'right' if right else 'left' if left else None)
+        i += 2
+
+        def _cells(row, tag):
+            cells = []
+            for k, align in enumerate(aligns):
+                text = row[k] if k < len(row) else ''
+                style = f' style="text-align:{align}"' if align else ''
+                cells.append(f"<{tag}{style}>{self.inline(text)}</{tag}>")
+            return "<tr>" + "".join(cells) + "</tr>"
+
+        rows = []
+        while i < len(lines) and lines[i].strip() and '|' in lines[i]:
+            rows.append(_cells(_split_row(lines[i]), 'td'))
+            i += 1
+        body = f"\n<tbody>\n" + "\n".join(rows) + "\n</tbody>" if rows else ''
+        out.append(f"<table>\n<thead>\n{_cells(header, 'th')}\n</thead>{body}\n</table>")
+        return i
+
+
+def render_markdown(text: str, asset_base: Optional[str] = None) -> str:
+    """把 Markdown 渲染为清理过的 HTML 片段；asset_base 为相对路径图片/链接的改写前缀。
+    用到子集之外的写法时抛出 UnsupportedMarkdown"""
+    text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '\ufffd')
+    lines = [line.rstrip('\n') for line in text.split('\n')]
+    return "\n".join(_Blocks(asset_base).render(lines)) + "\n"
+
+
+class MarkdownRenderCache:
+    """Markdown 渲染结果的磁盘缓存（按内容哈希命名），内存中按源文件记录最近一次对应的缓存文件（线程安全）。
+    源文件变化或记录被淘汰时删除不再被引用的缓存文件；不支持服务端渲染的文档只在内存中记录原因"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = MARKDOWN_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_entries = max(1, int(max_entries))
+        # (源文件, 资源地址前缀) -> (源文件签名, 缓存文件或 None, 不支持的原因或 None)
+        self._data: "OrderedDict[Tuple[str, str], Tuple[tuple, Optional[str], Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+        self.unsupported = 0
+
+    def _dir(self) -> str:
+        return self.cache_dir or os.path.join(http_cache.HTTP_CACHE_DIR, "html")
+
+    def get(self, source_path: str, asset_base: str = "") -> str:
+        """返回 source_path 渲染结果的缓存文件路径，没有或已过期时渲染并写入；
+        文档不支持服务端渲染时抛出 UnsupportedMarkdown"""
+        st = os.stat(source_path)
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        key = (source_path, asset_base)
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is not None and cached[0] == signature and (cached[1] is None or os.path.exists(cached[1])):
+                self._data.move_to_end(key)
+                self.hits += 1
+                if cached[1] is None:
+                    raise UnsupportedMarkdown(cached[2])
+                target = cached[1]
+            else:
+                target = None
+        if target is not None:
+            http_cache.touch(target)
+            return target
+        with open(source_path, 'rb') as f:
+            source = f.read()
+        digest = hashlib.sha256(f"{RENDERER_VERSION}\0{asset_base}\0".encode('utf-8') + source).hexdigest()[:32]
+        target = os.path.join(self._dir(), f"{digest}.html")
+        if os.path.exists(target):
+            http_cache.touch(target)
+        else:
+            try:
+                rendered = render_markdown(source.decode('utf-8', errors='replace'), asset_base or None).encode('utf-8')
+            except UnsupportedMarkdown as e:
+                self._remember(key, (signature, None, str(e)))
+                with self._lock:
+                    self.unsupported += 1
+                raise
+            os.makedirs(self._dir(), exist_ok=True)
+            http_cache.atomic_write_bytes(target, rendered)
+            http_cache.get_cache_budget().record(self._dir(), len(rendered))
+            with self._lock:
+                self.renders += 1
+        self._remember(key, (signature, target, None))
+        return target
+
+    def _remember(self, key, value):
+        """记录 key 对应的结果，删除被替换或被淘汰、且不再被其他记录引用的缓存文件"""
+        with self._lock:
+            old = self._data.pop(key, None)
+            self._data[key] = value
+            dropped = [old[1]] if old is not None and old[1] and old[1] != value[1] else []
+            while len(self._data) > self.max_entries:
+                dropped.append(self._data.popitem(last=False)[1][1])
+            in_use = {v[1] for v in self._data.values()}
+            stale = [t for t in dropped if t and t not in in_use]
+        for target in stale:
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+
+    def invalidate(self, prefix: Optional[str] = None):
+        """清除 prefix 目录（如某道题的目录）下源文件的记录并删除对应的缓存文件；prefix 为 None 时全部清除"""
+        if prefix is not None:
+            prefix = os.path.join(os.path.abspath(prefix), '')
+        with self._lock:
+            keys = [k for k in self._data if prefix is None or os.path.abspath(k[0]).startswith(prefix)]
+            targets = [self._data.pop(k)[1] for k in keys]
+            in_use = {v[1] for v in self._data.values()}
+        for target in targets:
+            if not target or target in in_use:
+                continue
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "renders": self.renders,
+                    "unsupported": self.unsupported}
+
+
+_cache: Optional[MarkdownRenderCache] = None
+
+
+def get_markdown_cache() -> MarkdownRenderCache:
+    """返回进程内共享的 Markdown 渲染缓存"""
+    global _cache
+    if _cache is None:
+        _cache = MarkdownRenderCache()
+    return _cache
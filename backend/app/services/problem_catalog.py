@@ -0,0 +1,341 @@
+"""
+题库目录（ProblemCatalog）
+进程内只解析一次 index.json 与 courses.json，并建立按 path、按课程、按 (lesson, problem) 的索引；
+每次访问只对这几个文件做一次 stat，修改时间、大小或 inode 变化时才重新解析，
+解析完成后整体替换快照（读者拿到的快照始终完整一致）。题库写操作完成后也会主动调用 invalidate()。
+
+写入：创建/删除题目与课程不再整体重写 index.json / courses.json，而是在持有锁（进程内线程锁 +
+题库目录下 .catalog.lock 文件锁，多个 API 进程之间互斥）时向 .catalog.journal 追加一行变更记录；
+读取时在两个文件的内容上按顺序重放日志。日志达到 PROBLEM_JOURNAL_COMPACT_EVERY 条时合并：
+先写临时文件再 rename 替换 index.json / courses.json，最后删除日志。所有变更按 path / id 幂等，
+合并中途崩溃（文件已替换、日志未删除）时重复重放也不会产生重复条目。
+应用启动与关闭时（compact_catalogs）也会合并，正常停机后两个文件即是完整的题库目录。
+
+PROBLEM_CATALOG_BACKEND=db 时改用数据库中的目录表（problem_catalog_db.DbProblemCatalog，接口相同）。
+
+快照中的列表与字典由所有请求共享，调用方只读不写。
+"""
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+# 与 problems_service.DATA_DIR 相同
+DEFAULT_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/problems"))
+# file：index.json / courses.json（默认）；db：数据库中的目录表，见 problem_catalog_db
+PROBLEM_CATALOG_BACKEND = os.getenv('PROBLEM_CATALOG_BACKEND', 'file').strip().lower()
+PROBLEM_JOURNAL_COMPACT_EVERY = int(os.getenv('PROBLEM_JOURNAL_COMPACT_EVERY', '50') or 0)
+LOCK_NAME = '.catalog.lock'
+JOURNAL_NAME = '.catalog.journal'
+
+
+class CatalogSnapshot(NamedTuple):
+    # index.json 原始内容，文件不存在或解析失败时为 None
+    index: Optional[List[Dict]]
+    # courses.json 中的课程列表（[{id, name}]），文件不存在或格式不正确时为 None
+    courses: Optional[List[Dict]]
+    by_path: Dict[str, Dict]
+    # 课程 id（path 的第一段）-> 该课程的条目，保持 index.json 中的顺序
+    by_course: Dict[str, List[Dict]]
+    # (str(lesson), str(problem)) -> 条目，lesson / problem 为 index.json 中的字段
+    by_key: Dict[Tuple[str, str], Dict]
+    # 按首次出现顺序排列的课程 id
+    course_ids: Tuple[str, ...]
+    # 尚未合并的变更日志条数
+    journal_entries: int = 0
+
+
+def _file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _read_journal(path: str) -> List[Dict]:
+    """读取变更日志；无法解析的行（如写入中途崩溃留下的半行）跳过"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    ops = []
+    for line in lines:
+        try:
+            op = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(op, dict):
+            ops.append(op)
+    return ops
+
+
+def apply_ops(index, courses, ops: List[Dict]):
+    """在 index / courses 的原始内容上按顺序重放变更，返回新的 (index, courses)；不修改传入的对象"""
+    for op in ops:
+        kind = op.get("op")
+        if kind == "put_problem":
+            entry = op["entry"]
+            items = list(index) if isinstance(index, list) else []
+            for i, it in enumerate(items):
+                if isinstance(it, dict) and it.get("path") == entry.get("path"):
+                    items[i] = entry
+                    break
+            else:
+                items.append(entry)
+            index = items
+        elif kind == "remove_problem" and isinstance(index, list):
+            index = [it for it in index if not (isinstance(it, dict) and it.get("path") == op["path"])]
+        elif kind == "remove_course_problems" and isinstance(index, list):
+            prefix = f"{op['course']}/"
+            index = [it for it in index
+                     if not (isinstance(it, dict) and isinstance(it.get("path"), str) and it["path"].startswith(prefix))]
+        elif kind == "put_course":
+            # 同 id 的课程原位替换，不改变课程顺序
+            course = op["course"]
+            items = list(courses) if isinstance(courses, list) else []
+            for i, c in enumerate(items):
+                if isinstance(c, dict) and c.get("id") == course.get("id"):
+                    items[i] = course
+                    break
+            else:
+                items.append(course)
+            courses = items
+        elif kind == "remove_course" and isinstance(courses, list):
+            courses = [c for c in courses if not (isinstance(c, dict) and c.get("id") == op["id"])]
+    return index, courses
+
+
+def atomic_write_json(path: str, data):
+    """先写同目录下的临时文件再 rename 替换，读者不会看到写了一半的文件"""
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """跨进程互斥：POSIX 使用 flock，Windows 使用 msvcrt.locking"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 重试约 10 秒后抛出 OSError，此时继续等待
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _valid_courses(data) -> Optional[List[Dict]]:
+    if not isinstance(data, list):
+        return None
+    for it in data:
+        if not isinstance(it, dict) or 'id' not in it or 'name' not in it:
+            return None
+    return data
+
+
+def build_snapshot(index: Optional[List[Dict]], courses: Optional[List[Dict]], journal_entries: int = 0) -> CatalogSnapshot:
+    by_path: Dict[str, Dict] = {}
+    by_course: Dict[str, List[Dict]] = {}
+    by_key: Dict[Tuple[str, str], Dict] = {}
+    for item in index or []:
+        if not isinstance(item, dict):
+            continue
+        path = item.get("path")
+        if isinstance(path, str) and path:
+            # 与线性查找相同，path 重复时取第一条
+            by_path.setdefault(path, item)
+            by_course.setdefault(path.split("/")[0], []).append(item)
+        lesson, problem = item.get("lesson"), item.get("problem")
+        if lesson and problem:
+            by_key[(str(lesson), str(problem))] = item
+    return CatalogSnapshot(index, _valid_courses(courses), by_path, by_course, by_key, tuple(by_course),
+                           journal_entries)
+
+
+class ProblemCatalog:
+    """某个题库目录的 index.json / courses.json 内存索引与写入入口（线程安全）"""
+
+    def __init__(self, data_dir: str, compact_every: int = PROBLEM_JOURNAL_COMPACT_EVERY):
+        self.data_dir = data_dir
+        self.index_path = os.path.join(data_dir, "index.json")
+        self.courses_path = os.path.join(data_dir, "courses.json")
+        self.journal_path = os.path.join(data_dir, JOURNAL_NAME)
+        self.lock_path = os.path.join(data_dir, LOCK_NAME)
+        self.compact_every = max(0, int(compact_every))
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._lock_depth = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._signature = None
+        self.reloads = 0
+        self.compactions = 0
+
+    def _signature_now(self):
+        return (_file_signature(self.index_path), _file_signature(self.courses_path),
+                _file_signature(self.journal_path))
+
+    def _load(self):
+        """读取两个文件并重放日志，返回 (index, courses, 日志条数)"""
+        ops = _read_journal(self.journal_path)
+        index, courses = apply_ops(_read_json(self.index_path), _read_json(self.courses_path), ops)
+        return index, courses, len(ops)
+
+    def snapshot(self) -> CatalogSnapshot:
+        """返回最新的快照，文件有变化时重新加载"""
+        signature = self._signature_now()
+        snap = self._snapshot
+        if snap is not None and signature == self._signature:
+            return snap
+        with self._lock:
+            if self._snapshot is not None and signature == self._signature:
+                return self._snapshot
+            snap = build_snapshot(*self._load())
+            # 先替换快照再更新签名，并发读者不会拿到与签名不符的旧快照
+            self._snapshot = snap
+            self._signature = signature
+            self.reloads += 1
+            return snap
+
+    def invalidate(self):
+        """外部直接修改 index.json / courses.json 后可调用，下次访问时重新加载"""
+        with self._lock:
+            self._signature = None
+
+    def courses_corrupt(self) -> bool:
+        """courses.json 存在但无法解析或格式不正确：此时拒绝写入课程，避免覆盖人工编辑中的文件"""
+        return self.snapshot().courses is None and os.path.exists(self.courses_path)
+
+    def entry(self, path: str) -> Optional[Dict]:
+        return self.snapshot().by_path.get(path)
+
+    def course_entries(self, course_id: str) -> List[Dict]:
+        return self.snapshot().by_course.get(course_id, [])
+
+    def entry_by_key(self, lesson, problem) -> Optional[Dict]:
+        """按 index.json 中的 lesson / problem 字段查条目"""
+        return self.snapshot().by_key.get((str(lesson), str(problem)))
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """写锁：同一进程内的线程与共享题库目录的其他进程之间互斥，可嵌套；
+        持有期间 snapshot() 反映所有已提交的写入"""
+        with self._write_lock:
+            if self._lock_depth:
+                # 同一线程再次进入：文件锁已持有（对同一文件再次 flock 会阻塞自己）
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            os.makedirs(self.data_dir, exist_ok=True)
+            with _file_lock(self.lock_path):
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+
+    def append(self, *ops: Dict):
+        """在写锁内追加变更记录，日志过长时合并"""
+        with self.locked():
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for op in ops:
+                    f.write(json.dumps(op, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.invalidate()
+            if self.compact_every and self.snapshot().journal_entries >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """把日志合并进 index.json / courses.json 并删除日志"""
+        with self.locked():
+            index, courses, entries = self._load()
+            if not entries:
+                return
+            if index is not None:
+                atomic_write_json(self.index_path, index)
+            if courses is not None:
+                atomic_write_json(self.courses_path, courses)
+            os.remove(self.journal_path)
+            self.invalidate()
+            self.compactions += 1
+
+
+_catalogs: Dict[str, ProblemCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_problem_catalog(data_dir: Optional[str] = None) -> ProblemCatalog:
+    """返回题库目录 data_dir（默认 backend/data/problems）对应的进程内共享目录"""
+    key = os.path.abspath(data_dir or DEFAULT_DATA_DIR)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                if PROBLEM_CATALOG_BACKEND == 'db':
+                    from app.services.problem_catalog_db import DbProblemCatalog
+                    catalog = DbProblemCatalog(key)
+                else:
+                    catalog = ProblemCatalog(key)
+                _catalogs[key] = catalog
+    return catalog
+
+
+def compact_catalogs():
+    """合并本进程打开过的所有题库目录的变更日志（应用启动与关闭时调用），失败时保留日志"""
+    with _catalogs_lock:
+        catalogs = list(_catalogs.values())
+    for catalog in catalogs:
+        try:
+            catalog.compact()
+        except Exception as e:
+            print(f"合并题库变更日志失败（{catalog.data_dir}）: {e}")
@@ -0,0 +1,325 @@
+"""
+数据库题库目录（PROBLEM_CATALOG_BACKEND=db）
+题库达到数千道题时，按课程列题目、按 path 或 (lesson, problem) 查条目不再依赖整份 index.json：课程、题目条目与
+测试集元信息存放在带索引的表中（app/models/problem_catalog.py），entry / course_entries / entry_by_key 直接走索引查询，
+查询结果按目录版本号缓存少量条目（版本号变化时整体清空）。
+index.json / courses.json 仍是交换格式：
+
+    python -m app.services.problem_catalog_db import [--data-dir ...]   # 文件 -> 数据库（整体替换）
+    python -m app.services.problem_catalog_db export [--data-dir ...]   # 数据库 -> 文件
+
+首次使用时数据库中还没有目录，会自动从题库目录导入一次。写入与文件目录使用相同的变更记录（apply_ops 的 op），
+在同一把写锁内直接更新表并把版本号加一；各进程至多每 PROBLEM_CATALOG_DB_CHECK_SECONDS 秒查询一次版本号，
+据此判断查询缓存与内存快照（load_index 等整表读取）是否过期，本进程写入后立即失效。
+测试集元信息在写入题目时统计；直接修改题目的 test 目录后需要重新 import。
+题目目录（题面、测试文件）仍在题库目录中，数据库只保存目录信息；一个数据库只对应一个题库目录。
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.problem_catalog import CatalogCourse, CatalogMeta, CatalogProblem, CatalogTestSet
+from app.services.judge.verdict_cache import test_dir_fingerprint
+from app.services.problem_catalog import DEFAULT_DATA_DIR, ProblemCatalog, atomic_write_json
+from app.utils.database import Base
+
+CATALOG_TABLES = [m.__table__ for m in (CatalogCourse, CatalogProblem, CatalogTestSet, CatalogMeta)]
+VERSION_KEY = 'version'
+# 两次查询版本号的最短间隔（秒），其他进程的写入至多延迟这么久可见；0 表示每次访问都查询
+PROBLEM_CATALOG_DB_CHECK_SECONDS = float(os.getenv('PROBLEM_CATALOG_DB_CHECK_SECONDS', '2') or 0)
+# 每个进程缓存的查询结果数
+QUERY_CACHE_SIZE = 512
+
+
+def _test_set_meta(data_dir: str, path: str) -> Optional[Dict]:
+    """统计题目测试目录的指纹、样例数与总大小；目录不存在返回 None"""
+    test_dir = os.path.join(data_dir, path, 'test')
+    fingerprint = test_dir_fingerprint(test_dir)
+    if fingerprint is None:
+        return None
+    case_count = size = 0
+    for e in os.scandir(test_dir):
+        try:
+            size += e.stat().st_size
+        except OSError:
+            continue
+        if e.name.endswith('.in'):
+            case_count += 1
+    return {"fingerprint": fingerprint, "case_count": case_count, "bytes": size}
+
+
+def _problem_row(entry: Dict, position: int) -> CatalogProblem:
+    lesson, problem = entry.get("lesson"), entry.get("problem")
+    return CatalogProblem(
+        path=entry["path"],
+        course_id=entry["path"].split("/")[0],
+        lesson=str(lesson) if lesson else None,
+        problem=str(problem) if problem else None,
+        title=entry.get("title"),
+        has_test=entry.get("has_test"),
+        position=position,
+        data=entry,
+    )
+
+
+def _next_position(db: Session, model) -> int:
+    return (db.scalar(select(func.max(model.position))) or 0) + 1
+
+
+class DbProblemCatalog(ProblemCatalog):
+    """数据库中的题库目录，接口与 ProblemCatalog 相同（线程安全）"""
+
+    def __init__(self, data_dir: str, engine=None, check_interval: float = PROBLEM_CATALOG_DB_CHECK_SECONDS):
+        super().__init__(data_dir, compact_every=0)
+        self.check_interval = max(0.0, float(check_interval))
+        self._known_version = None
+        self._checked_at = 0.0
+        self._query_lock = threading.Lock()
+        self._queries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._queries_version = None
+        self.queries = 0
+        self.query_hits = 0
+        if engine is None:
+            from app.utils.database import engine
+        Base.metadata.create_all(bind=engine, tables=CATALOG_TABLES)
+        self._sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self._imported = False
+
+    @contextmanager
+    def _session(self) -> Iterator[Session]:
+        db = self._sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _version(self) -> Optional[int]:
+        with self._session() as db:
+            meta = db.get(CatalogMeta, VERSION_KEY)
+            return meta.value if meta is not None else None
+
+    def _signature_now(self):
+        """目录版本号；距上次查询不足 check_interval 秒时沿用上次的结果，不访问数据库"""
+        now = time.monotonic()
+        version = self._known_version
+        if version is not None and now - self._checked_at < self.check_interval:
+            return version
+        version = self._version()
+        if version is None:
+            # 数据库中还没有目录：从题库目录导入一次
+            with self.locked():
+                if self._version() is None:
+                    import_catalog(self.data_dir, self._sessions)
+            version = self._version()
+        self._imported = True
+        self._known_version, self._checked_at = version, now
+        return version
+
+    def invalidate(self):
+        """本进程写入后调用：下次访问时重新查询版本号"""
+        super().invalidate()
+        self._known_version = None
+
+    def _ensure_imported(self):
+        if not self._imported:
+            self._signature_now()
+
+    def _load(self):
+        with self._session() as db:
+            index = list(db.scalars(select(CatalogProblem.data).order_by(CatalogProblem.position)))
+            courses = [{"id": c.id, "name": c.name}
+                       for c in db.scalars(select(CatalogCourse).order_by(CatalogCourse.position))]
+        return index, courses or None, 0
+
+    def _query(self, key: tuple, fn: Callable[[Session], Any]) -> Any:
+        """执行索引查询 fn(db)，结果按目录版本号缓存（返回的对象由调用方共享，只读不写）"""
+        version = self._signature_now()
+        with self._query_lock:
+            if self._queries_version != version:
+                self._queries.clear()
+                self._queries_version = version
+            elif key in self._queries:
+                self._queries.move_to_end(key)
+                self.query_hits += 1
+                return self._queries[key]
+        with self._session() as db:
+            value = fn(db)
+        with self._query_lock:
+            self.queries += 1
+            if self._queries_version == version:
+                self._queries[key] = value
+                while len(self._queries) > QUERY_CACHE_SIZE:
+                    self._queries.popitem(last=False)
+        return value
+
+    def entry(self, path: str) -> Optional[Dict]:
+        return self._query(('path', path), lambda db: db.scalar(
+            select(CatalogProblem.data).where(CatalogProblem.path == path)))
+
+    def course_entries(self, course_id: str) -> List[Dict]:
+        return self._query(('course', course_id), lambda db: list(db.scalars(
+            select(CatalogProblem.data)
+            .where(CatalogProblem.course_id == course_id)
+            .order_by(CatalogProblem.position))))
+
+    def entry_by_key(self, lesson, problem) -> Optional[Dict]:
+        # 与快照的 by_key 相同，(lesson, problem) 重复时取最后一条
+        return self._query(('key', str(lesson), str(problem)), lambda db: db.scalar(
+            select(CatalogProblem.data)
+            .where(CatalogProblem.lesson == str(lesson), CatalogProblem.problem == str(problem))
+            .order_by(CatalogProblem.position.desc())
+            .limit(1)))
+
+    def test_set_meta(self, path: str) -> Optional[Dict]:
+        """题目测试集的元信息（指纹、样例数、总大小），没有测试目录时为 None"""
+        def _get(db: Session):
+            row = db.get(CatalogTestSet, path)
+            if row is None:
+                return None
+            return {"fingerprint": row.fingerprint, "case_count": row.case_count, "bytes": row.bytes}
+        return self._query(('test_set', path), _get)
+
+    def courses_corrupt(self) -> bool:
+        """课程保存在数据库中，不读取 courses.json"""
+        return False
+
+    def _apply(self, db: Session, op: Dict):
+        kind = op.get("op")
+        if kind == "put_problem":
+            entry = op["entry"]
+            path = entry["path"]
+            row = db.scalar(select(CatalogProblem).where(CatalogProblem.path == path))
+            position = row.position if row is not None else _next_position(db, CatalogProblem)
+            if row is not None:
+                db.delete(row)
+                db.flush()
+            db.add(_problem_row(entry, position))
+            db.execute(delete(CatalogTestSet).where(CatalogTestSet.path == path))
+            meta = _test_set_meta(self.data_dir, path)
+            if meta is not None:
+                db.add(CatalogTestSet(path=path, **meta))
+        elif kind == "remove_problem":
+            db.execute(delete(CatalogProblem).where(CatalogProblem.path == op["path"]))
+            db.execute(delete(CatalogTestSet).where(CatalogTestSet.path == op["path"]))
+        elif kind == "remove_course_problems":
+            db.execute(delete(CatalogProblem).where(CatalogProblem.course_id == op["course"]))
+            db.execute(delete(CatalogTestSet).where(CatalogTestSet.path.startswith(f"{op['course']}/", autoescape=True)))
+        elif kind == "put_course":
+            # 与文件目录相同：同 id 的课程原位替换，否则追加到末尾
+            course = op["course"]
+            row = db.get(CatalogCourse, course["id"])
+            if row is not None:
+                row.name = course["name"]
+            else:
+                db.add(CatalogCourse(id=course["id"], name=course["name"], position=_next_position(db, CatalogCourse)))
+        elif kind == "remove_course":
+            db.execute(delete(CatalogCourse).where(CatalogCourse.id == op["id"]))
+        db.flush()
+
+    def append(self, *ops: Dict):
+        """在写锁内（一个事务中）执行变更并把版本号加一"""
+        with self.locked():
+            self._ensure_imported()
+            with self._session() as db:
+                for op in ops:
+                    self._apply(db, op)
+                _bump_version(db)
+                db.commit()
+            self.invalidate()
+
+    def compact(self):
+        """数据库目录没有变更日志，无需合并"""
+
+
+def _bump_version(db: Session):
+    meta = db.get(CatalogMeta, VERSION_KEY)
+    if meta is None:
+        db.add(CatalogMeta(key=VERSION_KEY, value=1))
+    else:
+        meta.value += 1
+
+
+def import_catalog(data_dir: str, sessions) -> Dict:
+    """把题库目录的 index.json / courses.json（含未合并的变更日志）整体导入数据库，返回导入数量"""
+    index, courses, _ = ProblemCatalog(data_dir)._load()
+    counts = {"courses": 0, "problems": 0, "test_sets": 0, "skipped": 0}
+    db = sessions()
+    try:
+        for model in (CatalogProblem, CatalogTestSet, CatalogCourse):
+            db.execute(delete(model))
+        seen = set()
+        for item in index if isinstance(index, list) else []:
+            path = item.get("path") if isinstance(item, dict) else None
+            # 没有 path 或 path 重复（与文件目录相同，取第一条）的条目无法按 path 查找，不导入
+            if not isinstance(path, str) or not path or path in seen:
+                counts["skipped"] += 1
+                continue
+            seen.add(path)
+            counts["problems"] += 1
+            db.add(_problem_row(item, counts["problems"]))
+            meta = _test_set_meta(data_dir, path)
+            if meta is not None:
+                counts["test_sets"] += 1
+                db.add(CatalogTestSet(path=path, **meta))
+        if isinstance(courses, list):
+            for c in courses:
+                if isinstance(c, dict) and 'id' in c and 'name' in c:
+                    counts["courses"] += 1
+                    db.add(CatalogCourse(id=c["id"], name=c["name"], position=counts["courses"]))
+        _bump_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return counts
+
+
+def export_catalog(data_dir: str, sessions) -> Dict:
+    """把数据库中的目录写回 index.json / courses.json（原子替换），并删除已被取代的变更日志"""
+    db = sessions()
+    try:
+        index = list(db.scalars(select(CatalogProblem.data).order_by(CatalogProblem.position)))
+        courses = [{"id": c.id, "name": c.name}
+                   for c in db.scalars(select(CatalogCourse).order_by(CatalogCourse.position))]
+    finally:
+        db.close()
+    catalog = ProblemCatalog(data_dir)
+    with catalog.locked():
+        atomic_write_json(catalog.index_path, index)
+        if courses:
+            atomic_write_json(catalog.courses_path, courses)
+        if os.path.exists(catalog.journal_path):
+            os.remove(catalog.journal_path)
+    return {"courses": len(courses), "problems": len(index)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='题库目录在 index.json / courses.json 与数据库之间导入导出')
+    parser.add_argument('action', choices=['import', 'export'], help='import：文件 -> 数据库；export：数据库 -> 文件')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='题库目录（默认 backend/data/problems）')
+    args = parser.parse_args(argv)
+
+    from app.utils.database import engine
+    Base.metadata.create_all(bind=engine, tables=CATALOG_TABLES)
+    sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    if args.action == 'import':
+        counts = import_catalog(args.data_dir, sessions)
+        print(f"已导入 {counts['courses']} 门课程、{counts['problems']} 道题、{counts['test_sets']} 个测试集"
+              f"（跳过 {counts['skipped']} 条）", file=sys.stderr)
+    else:
+        counts = export_catalog(args.data_dir, sessions)
+        print(f"已导出 {counts['courses']} 门课程、{counts['problems']} 道题到 {args.data_dir}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,28 +3,50 @@
 放置和解析 `backend/data/problems` 下的数据、index.json 以及模拟的运行/提交逻辑
 """
 import os
-import json
-import tempfile
 import shutil
-import subprocess
 import asyncio
-from typing import List, Dict, Optional
+import signal
+from typing import AsyncIterator, List, Dict, NamedTuple, Optional, Tuple
+
+from app.services.judge import metrics
+from app.services.problem_catalog import CatalogSnapshot, ProblemCatalog, get_problem_catalog
+from app.services.judge.engine import get_engine
+from app.services.judge.workspace import Workspace
+from app.services.judge.runner import RunResult
+from app.services.judge.verdict_cache import get_verdict_cache, tests_fingerprint
+from app.services.judge.fixtures import get_test_set_cache, MISSING_OUTPUT, ProblemFixture
+from app.services.judge.compare import normalize_output as _normalize_output, outputs_match
+from app.services.judge.precheck import CompileError, check_syntax
+from app.services.markdown_render import get_markdown_cache
 
 BASE_DIR = os.path.dirname(__file__)
 # 从 services 目录出发，回到 backend/data/problems
 DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "../../data/problems"))
 
 
+def _catalog() -> ProblemCatalog:
+    return get_problem_catalog(DATA_DIR)
+
+
 def load_index() -> Optional[List[Dict]]:
-    """加载 index.json，失败返回 None"""
-    index_path = os.path.join(DATA_DIR, "index.json")
-    if not os.path.exists(index_path):
-        return None
-    try:
-        with open(index_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return None
+    """加载 index.json（经题库目录缓存），失败返回 None；返回的条目为共享对象，不要修改"""
+    index = _catalog().snapshot().index
+    return list(index) if index is not None else None
+
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """题库目录的当前快照（只读），快照对象在目录变化前保持不变，可用作派生数据的缓存键"""
+    return _catalog().snapshot()
+
+
+def get_index_by_key() -> Dict[Tuple[str, str], Dict]:
+    """按 (str(lesson), str(problem))（index.json 中的字段）索引的题目条目，只读"""
+    return _catalog().snapshot().by_key
+
+
+def find_index_entry_by_key(lesson, problem) -> Optional[Dict]:
+    """按 index.json 中的 lesson / problem 字段查题目条目（数据库目录走索引），只读"""
+    return _catalog().entry_by_key(lesson, problem)
 
 
 def get_courses() -> List[str]:
@@ -32,38 +54,12 @@ def get_courses() -> List[str]:
     优先读取 `courses.json`（若存在），格式为 [{id,name}]；
     否则从 `index.json` 或目录扫描中自动推断。
     """
-    # 优先读取 courses.json（便于集中管理课程名称）
-    courses_file = os.path.join(DATA_DIR, "courses.json")
-    if os.path.exists(courses_file):
-        try:
-            with open(courses_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # 简单验证
-                if isinstance(data, list):
-                    good = True
-                    for it in data:
-                        if not isinstance(it, dict) or 'id' not in it or 'name' not in it:
-                            good = False
-                            break
-                    if good:
-                        return data
-        except Exception:
-            # 若解析失败，继续回退逻辑
-            pass
+    snapshot = _catalog().snapshot()
+    # 优先使用 courses.json（便于集中管理课程名称），格式不正确时继续回退逻辑
+    if snapshot.courses is not None:
+        return list(snapshot.courses)
 
-    data = load_index()
-    courses_set = []  # 保持列表以保证顺序
-    seen = set()
-    if data:
-        for item in data:
-            path = item.get("path") if isinstance(item, dict) else None
-            if path:
-                parts = path.split("/")
-                if parts:
-                    cid = parts[0]
-                    if cid not in seen:
-                        seen.add(cid)
-                        courses_set.append(cid)
+    courses_set = list(snapshot.course_ids)  # 保持 index.json 中的顺序
 
     if not courses_set:
         # 目录扫描回退，按目录名排序
@@ -94,22 +90,19 @@ def get_courses() -> List[str]:
 
 def get_course_problems(course_id: str) -> List[Dict]:
     """返回指定课程下的题目列表。优先从 index.json 中获取 title/path/problem 字段；否则目录扫描返回子目录名。"""
-    data = load_index()
     problems = []
-    if data:
-        for item in data:
-            path = item.get("path") if isinstance(item, dict) else None
-            if path and path.startswith(f"{course_id}/"):
-                # 尝试解析 problem 名称
-                parts = path.split("/")
-                prob = parts[1] if len(parts) > 1 else None
-                problems.append({
-                    "problem": prob,
-                    "title": item.get("title"),
-                    "path": path
-                })
-        if problems:
-            return problems
+    for item in _catalog().course_entries(course_id):
+        path = item["path"]
+        # 尝试解析 problem 名称
+        parts = path.split("/")
+        prob = parts[1] if len(parts) > 1 else None
+        problems.append({
+            "problem": prob,
+            "title": item.get("title"),
+            "path": path
+        })
+    if problems:
+        return problems
 
     # 回退到目录扫描
     course_path = os.path.join(DATA_DIR, course_id)
@@ -121,6 +114,32 @@ def get_course_problems(course_id: str) -> List[Dict]:
     return problems
 
 
+def _invalidate_judge_caches(lesson: str, problem: Optional[str] = None):
+    """题目或课程被写入/删除后，清除测试集缓存、评测结果缓存与题面渲染缓存"""
+    if problem is None:
+        get_test_set_cache().invalidate()
+        get_verdict_cache().invalidate(lesson)
+        get_markdown_cache().invalidate(os.path.join(DATA_DIR, lesson))
+        return
+    get_markdown_cache().invalidate(os.path.join(DATA_DIR, lesson, problem))
+    get_test_set_cache().invalidate(os.path.join(DATA_DIR, lesson, problem, "test"))
+    get_verdict_cache().invalidate(f"{lesson}/{problem}")
+
+
+def _next_problem_number(lesson: str, lesson_dir: str, catalog: ProblemCatalog) -> int:
+    """下一个题目编号：课程目录下已有的 problem_xx 目录与 index.json 中该课程条目的最大编号加一"""
+    names = [name for name in os.listdir(lesson_dir)
+             if os.path.isdir(os.path.join(lesson_dir, name)) and name.startswith('problem_')]
+    names += [item["path"].split("/")[1] for item in catalog.course_entries(lesson) if item["path"].count("/") >= 1]
+    nums = []
+    for n in names:
+        try:
+            nums.append(int(n.split('_')[-1]))
+        except Exception:
+            pass
+    return max(nums) + 1 if nums else 1
+
+
 def create_problem(lesson: str, title: str, description: str = '', solution: str = '', tests: Optional[List[Dict]] = None, resources: Optional[List[Dict]] = None, has_test: bool = True) -> Dict:
     """在指定 lesson 下创建一个新的 problem_xx 目录，写入 README.md, solution.md, test/ 文件，并更新 index.json。
     tests: 可选列表，每项为 {'input': '...', 'output': '...'}
@@ -133,22 +152,20 @@ def create_problem(lesson: str, title: str, description: str = '', solution: str
     except Exception as e:
         return {"status": "error", "message": f"无法创建课程目录: {e}"}
 
-    # 找到下一个可用的 problem 编号（以两位数字格式）
-    existing = [name for name in os.listdir(lesson_dir) if os.path.isdir(os.path.join(lesson_dir, name)) and name.startswith('problem_')]
-    nums = []
-    for n in existing:
-        try:
-            nums.append(int(n.split('_')[-1]))
-        except Exception:
-            pass
-    next_num = max(nums) + 1 if nums else 1
-    prob_dirname = f"problem_{next_num:02d}"
-    prob_path = os.path.join(lesson_dir, prob_dirname)
-
+    # 在写锁内分配下一个可用的 problem 编号（以两位数字格式）并创建目录，
+    # 同时创建题目的多个请求（或多个进程）不会拿到同一个编号
+    catalog = _catalog()
     try:
-        os.makedirs(prob_path, exist_ok=False)
-    except FileExistsError:
-        return {"status": "error", "message": "题目目录已存在"}
+        with catalog.locked():
+            next_num = _next_problem_number(lesson, lesson_dir, catalog)
+            while True:
+                prob_dirname = f"problem_{next_num:02d}"
+                prob_path = os.path.join(lesson_dir, prob_dirname)
+                try:
+                    os.makedirs(prob_path, exist_ok=False)
+                    break
+                except FileExistsError:
+                    next_num += 1
     except Exception as e:
         return {"status": "error", "message": f"无法创建题目目录: {e}"}
 
@@ -198,13 +215,8 @@ def create_problem(lesson: str, title: str, description: str = '', solution: str
         except Exception as e:
             return {"status": "error", "message": f"无法写入资源文件: {e}"}
 
-    # 更新 index.json
-    index_path = os.path.join(DATA_DIR, 'index.json')
+    # 更新 index.json（追加变更记录，见 problem_catalog）
     try:
-        index = []
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index = json.load(f) or []
         # 尝试从 lesson 名中解析数字
         lesson_num = None
         try:
@@ -219,12 +231,12 @@ def create_problem(lesson: str, title: str, description: str = '', solution: str
             "path": f"{lesson}/{prob_dirname}",
             "has_test": bool(has_test)
         }
-        index.append(entry)
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+        catalog.append({"op": "put_problem", "entry": entry})
     except Exception as e:
         return {"status": "error", "message": f"无法更新 index.json: {e}"}
 
+    # 同名目录可能曾被删除后重建，清除旧的评测缓存
+    _invalidate_judge_caches(lesson, prob_dirname)
     return {"status": "success", "lesson": lesson, "problem": prob_dirname, "path": entry['path'], "title": title}
 
 
@@ -240,35 +252,28 @@ def delete_problem(lesson: str, problem: str) -> Dict:
         return {"status": "error", "message": f"无法删除题目目录: {e}"}
 
     # 更新 index.json：删除 path 匹配的条目
-    index_path = os.path.join(DATA_DIR, 'index.json')
     try:
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index = json.load(f) or []
-            new_index = [it for it in index if not (isinstance(it, dict) and it.get('path') == f"{lesson}/{problem}")]
-            with open(index_path, 'w', encoding='utf-8') as f:
-                json.dump(new_index, f, ensure_ascii=False, indent=2)
+        _catalog().append({"op": "remove_problem", "path": f"{lesson}/{problem}"})
     except Exception as e:
         return {"status": "error", "message": f"无法更新 index.json: {e}"}
 
+    _invalidate_judge_caches(lesson, problem)
     return {"status": "success", "message": "已删除"}
 
 
 def create_course(course_id: str, name: str) -> Dict:
     """创建课程（在 courses.json 中添加条目并创建目录）。"""
-    courses_file = os.path.join(DATA_DIR, 'courses.json')
+    catalog = _catalog()
     try:
-        courses = []
-        if os.path.exists(courses_file):
-            with open(courses_file, 'r', encoding='utf-8') as f:
-                courses = json.load(f) or []
-        # 检查重复 id
-        for c in courses:
-            if c.get('id') == course_id:
-                return {"status": "error", "message": "课程 id 已存在"}
-        courses.append({"id": course_id, "name": name})
-        with open(courses_file, 'w', encoding='utf-8') as f:
-            json.dump(courses, f, ensure_ascii=False, indent=2)
+        with catalog.locked():
+            # courses.json 无法解析时无法检查重复 id，拒绝写入
+            if catalog.courses_corrupt():
+                return {"status": "error", "message": "无法创建课程: courses.json 格式不正确"}
+            # 检查重复 id（在写锁内读取最新内容）
+            for c in catalog.snapshot().courses or []:
+                if c.get('id') == course_id:
+                    return {"status": "error", "message": "课程 id 已存在"}
+            catalog.append({"op": "put_course", "course": {"id": course_id, "name": name}})
         # 创建目录
         os.makedirs(os.path.join(DATA_DIR, course_id), exist_ok=True)
         return {"status": "success", "id": course_id, "name": name}
@@ -278,27 +283,15 @@ def create_course(course_id: str, name: str) -> Dict:
 
 def delete_course(course_id: str) -> Dict:
     """删除课程：从 courses.json 移除并删除课程目录及其题目，同时从 index.json 中删除相关条目。"""
-    courses_file = os.path.join(DATA_DIR, 'courses.json')
     try:
         # 删除目录
         course_path = os.path.join(DATA_DIR, course_id)
         if os.path.exists(course_path):
             shutil.rmtree(course_path)
-        # 更新 courses.json
-        if os.path.exists(courses_file):
-            with open(courses_file, 'r', encoding='utf-8') as f:
-                courses = json.load(f) or []
-            new_courses = [c for c in courses if c.get('id') != course_id]
-            with open(courses_file, 'w', encoding='utf-8') as f:
-                json.dump(new_courses, f, ensure_ascii=False, indent=2)
-        # 更新 index.json：删除 path 以 course_id/ 开头的条目
-        index_path = os.path.join(DATA_DIR, 'index.json')
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index = json.load(f) or []
-            new_index = [it for it in index if not (isinstance(it, dict) and isinstance(it.get('path'), str) and it.get('path').startswith(f"{course_id}/"))]
-            with open(index_path, 'w', encoding='utf-8') as f:
-                json.dump(new_index, f, ensure_ascii=False, indent=2)
+        # 更新 courses.json 与 index.json（删除 path 以 course_id/ 开头的条目），两条变更一次写入
+        _catalog().append({"op": "remove_course", "id": course_id},
+                          {"op": "remove_course_problems", "course": course_id})
+        _invalidate_judge_caches(course_id)
         return {"status": "success", "message": "已删除课程及其题目"}
     except Exception as e:
         return {"status": "error", "message": f"删除课程失败: {e}"}
@@ -314,74 +307,124 @@ def get_problem_solution_path(lesson: str, problem: str) -> Optional[str]:
     return sol_path if os.path.exists(sol_path) else None
 
 
-async def mock_run_code(lesson: str, problem: str,code: str) -> Dict:
+def get_problem_asset_path(lesson: str, problem: str, filepath: str) -> Optional[str]:
+    """题目目录下的资源文件路径；不存在或位于题目目录之外（如 ../）时返回 None"""
+    prob_dir = os.path.realpath(os.path.join(DATA_DIR, lesson, problem))
+    asset_path = os.path.realpath(os.path.join(prob_dir, filepath))
+    if os.path.commonpath([prob_dir, asset_path]) != prob_dir or not os.path.isfile(asset_path):
+        return None
+    return asset_path
+
+
+DEFAULT_TIMEOUT = 5
+# 超出 RLIMIT_CPU 时进程先收到 SIGXCPU，仍不退出则被 SIGKILL
+_CPU_LIMIT_SIGNALS = tuple(-getattr(signal, name) for name in ("SIGXCPU", "SIGKILL") if hasattr(signal, name))
+
+
+class JudgeLimits(NamedTuple):
+    """题目的可选资源限制，来自 index.json 的 time_limit（CPU 秒）与 memory_limit（MB）"""
+    time_limit: Optional[float] = None
+    memory_limit_kb: Optional[int] = None
+
+    @property
+    def wall_timeout(self) -> float:
+        # 墙钟超时需给 CPU 限制留出余量（IO 等待、进程启动）
+        if self.time_limit:
+            return max(DEFAULT_TIMEOUT, self.time_limit * 2 + 1)
+        return DEFAULT_TIMEOUT
+
+    @property
+    def cache_tag(self) -> str:
+        # 限制不同则判定可能不同，需区分评测结果缓存
+        if self.time_limit is None and self.memory_limit_kb is None:
+            return ""
+        return f":t{self.time_limit}:m{self.memory_limit_kb}"
+
+
+def _find_index_entry(target_path: str) -> Optional[Dict]:
+    """在 index.json 中查找 path 匹配的条目"""
+    return _catalog().entry(target_path)
+
+
+def _problem_limits(entry: Optional[Dict]) -> JudgeLimits:
+    if not entry:
+        return JudgeLimits()
+    time_limit = memory_limit_kb = None
+    try:
+        if entry.get("time_limit"):
+            time_limit = float(entry["time_limit"])
+    except (TypeError, ValueError):
+        pass
+    try:
+        if entry.get("memory_limit"):
+            memory_limit_kb = int(float(entry["memory_limit"]) * 1024)
+    except (TypeError, ValueError):
+        pass
+    return JudgeLimits(time_limit, memory_limit_kb)
+
+
+async def _load_test_set(lesson: str, problem: str):
+    """从本地题库（经测试集缓存）读取题目的测试集，目录不存在返回 None"""
+    return await get_engine().run(get_test_set_cache().get, os.path.join(DATA_DIR, lesson, problem, "test"))
+
+
+async def load_problem_fixture(lesson: str, problem: str) -> ProblemFixture:
+    """读取题目条目与测试集，分派给远程 worker 时随任务发送（测试集只发送指纹，worker 按需拉取）"""
+    entry_meta = _find_index_entry(f"{lesson}/{problem}")
+    if entry_meta and entry_meta.get("has_test") is False:
+        return ProblemFixture(entry_meta, None)
+    return ProblemFixture(entry_meta, await _load_test_set(lesson, problem))
+
+
+async def mock_run_code(lesson: str, problem: str,code: str, fixture: Optional[ProblemFixture] = None) -> Dict:
     """运行单个样例（1.in / 1.out）。
     如果 index.json 中记录该题 `has_test` 为 False，则直接通过。
     否则查找 `DATA_DIR/{lesson}/{problem}/test/1.in` 与 `1.out`，执行用户代码并比较输出。
+    fixture 不为空时（远程 worker）使用其中的题目条目与测试集，不读取本地题库。
     返回字典包含结果、输出与可能的错误信息。
     """
     # 查找 index.json 中对应条目，检查 has_test 字段
-    index = load_index()
     target_path = f"{lesson}/{problem}"
-    has_test = True
-    if index:
-        for item in index:
-            if isinstance(item, dict) and item.get("path") == target_path:
-                # 如果明确标注为 False，表示无需测试
-                if item.get("has_test") is False:
-                    has_test = False
-                break
+    entry_meta = fixture.meta if fixture is not None else _find_index_entry(target_path)
+    # 如果明确标注为 False，表示无需测试
+    has_test = not (entry_meta and entry_meta.get("has_test") is False)
+    limits = _problem_limits(entry_meta)
 
     if not has_test:
         return {"status": "success", "passed": True, "result": "此题无需测试", "message": "无需测试，直接通过"}
 
-    # 定位样例文件
-    test_dir = os.path.join(DATA_DIR, lesson, problem, "test")
-    in_path = os.path.join(test_dir, "1.in")
-    out_path = os.path.join(test_dir, "1.out")
-    if not os.path.exists(in_path) or not os.path.exists(out_path):
-        return {"status": "error", "message": "样例文件 1.in/1.out 未找到"}
-
-    try:
-        with open(in_path, "r", encoding="utf-8") as f:
-            input_data = f.read()
-    except Exception as e:
-        return {"status": "error", "message": f"无法读取输入样例: {e}"}
-
+    # 定位样例文件（测试集读入内存后缓存，文件变化时自动重新加载）
     try:
-        with open(out_path, "r", encoding="utf-8") as f:
-            expected = f.read()
+        with metrics.stage('fixtures'):
+            test_set = fixture.test_set if fixture is not None else await _load_test_set(lesson, problem)
     except Exception as e:
-        return {"status": "error", "message": f"无法读取输出样例: {e}"}
-
-    # 在线程中运行阻塞的子进程执行代码
-    def _run(code_src: str, stdin_data: str, timeout: int = 5):
-        workdir = tempfile.mkdtemp(prefix="run_")
-        try:
-            file_path = os.path.join(workdir, "main.py")
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(code_src)
-
-            proc = subprocess.run([
-                "python", file_path
-            ], input=stdin_data.encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-
-            stdout = proc.stdout.decode("utf-8", errors="replace")
-            stderr = proc.stderr.decode("utf-8", errors="replace")
-            return proc.returncode, stdout, stderr, False
-        except subprocess.TimeoutExpired:
-            return -1, "", "Timeout", True
-        except Exception as e:
-            return -2, "", str(e), False
-        finally:
-            try:
-                shutil.rmtree(workdir)
-            except Exception:
-                pass
-
-    def _call_and_format():
-        run_res = _run(code, input_data)
-        formatted = _format_run_result(run_res, expected)
+        return {"status": "error", "message": f"无法读取样例: {e}"}
+    sample = test_set.get("1") if test_set else None
+    if sample is None or sample.error == MISSING_OUTPUT:
+        return {"status": "error", "message": "样例文件 1.in/1.out 未找到"}
+    if sample.error:
+        return {"status": "error", "message": f"无法读取样例: {sample.error}"}
+    input_data = sample.input_text
+
+    # 语法错误在本进程内即可判定，不再创建工作目录与子进程
+    with metrics.stage('precheck'):
+        compile_error = check_syntax(code)
+    if compile_error is not None:
+        entry = _compile_error_entry(None, input_data, sample.expected_norm, compile_error)
+        return {"status": "success", "output": "", "result": compile_error.summary(), "testResults": [entry],
+                "stderr": compile_error.detail, "error": entry["error"], "compile_error": compile_error.to_dict()}
+
+    # 相同代码在测试集未变化时直接返回缓存的结果
+    cache = get_verdict_cache()
+    with metrics.stage('verdict_cache'):
+        cache_key = cache.make_key(target_path, "run" + limits.cache_tag, code, test_set.fingerprint)
+        cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def _format(run_res):
+        with metrics.stage('compare'):
+            formatted = _format_run_result(run_res, expected_norm=sample.expected_norm, limits=limits)
         # 构建符合前端期望的返回格式
         actual = formatted.get('output', '')
         exp = formatted.get('expected', '')
@@ -392,6 +435,7 @@ async def mock_run_code(lesson: str, problem: str,code: str) -> Dict:
             "expected": exp,
             "actual": actual
         }
+        _copy_measurements(formatted, entry)
         if passed:
             result= "样例通过"
         else:
@@ -403,203 +447,330 @@ async def mock_run_code(lesson: str, problem: str,code: str) -> Dict:
             resp['error'] = formatted['error']
         return resp
 
-    return await asyncio.to_thread(_call_and_format)
+    # 工作目录的创建与清理在 worker 池中完成，执行本身由当前后端决定是否占用线程
+    try:
+        workspace = await get_engine().run(Workspace, code, "run_")
+    except Exception as e:
+        run_res = RunResult(-2, "", str(e), False)
+    else:
+        try:
+            run_res = await workspace.run_async(input_data, limits.wall_timeout, limits.time_limit, limits.memory_limit_kb)
+        finally:
+            await get_engine().run(workspace.close)
+    resp = _format(run_res)
+    cache.put(cache_key, resp)
+    return resp
+
 
+MEASUREMENT_KEYS = ("verdict", "time_ms", "cpu_ms", "memory_kb")
+OLE_PREVIEW_CHARS = 4096
 
-def _normalize_output(s: str) -> str:
-    # 去除行尾空白并统一换行，再剔除前后空白
-    lines = [line.rstrip() for line in s.strip().splitlines()]
-    return "\n".join(lines).strip()
 
+def _copy_measurements(src: Dict, dst: Dict):
+    """把判定结果与资源占用从 _format_run_result 的结果复制到 testResults 条目"""
+    for key in MEASUREMENT_KEYS:
+        if key in src:
+            dst[key] = src[key]
 
-def _format_run_result(run_res, expected_raw: str) -> Dict:
-    returncode, stdout, stderr, timed_out = run_res
-    expected = _normalize_output(expected_raw)
-    out_norm = _normalize_output(stdout)
-    
-    passed = out_norm == expected
+
+def _format_run_result(run_res, expected_raw: str = '', expected_norm: Optional[str] = None,
+                       limits: Optional[JudgeLimits] = None) -> Dict:
+    returncode, stdout, stderr, timed_out = run_res[:4]
+    # 测试集缓存中已预先规范化期望输出时直接复用
+    expected = expected_norm if expected_norm is not None else _normalize_output(expected_raw)
+    # 逐行比较，不构造规范化后的输出副本
+    passed = outputs_match(stdout, expected)
     if passed:
         output_message = "样例通过"
     else:
         output_message = "样例未通过"
+    measured = {}
+    if isinstance(run_res, RunResult):
+        measured = {
+            "time_ms": round(run_res.wall_time * 1000, 1),
+            "cpu_ms": round(run_res.cpu_time * 1000, 1),
+            "memory_kb": run_res.max_rss,
+        }
     if timed_out:
-        return {"status": "timeout", "passed": False, "output": stdout, "expected": expected, "error": "执行超时"}
+        return {"status": "timeout", "passed": False, "output": stdout, "expected": expected, "error": "执行超时", "verdict": "TLE", **measured}
+    if isinstance(run_res, RunResult) and run_res.output_exceeded:
+        # 只回传开头一部分输出，避免超限输出进入响应体
+        return {"status": "error", "passed": False, "output": stdout[:OLE_PREVIEW_CHARS], "expected": expected,
+                "error": "输出超出限制", "verdict": "OLE", **measured}
     if returncode == -2:
         return {"status": "error", "passed": False, "output": stdout, "expected": expected, "error": stderr}
 
-    
-    result = {"status": "success", "passed": passed, "output": stdout, "expected": expected}
+    limits = limits or JudgeLimits()
+    if limits.time_limit and (measured.get("cpu_ms", 0) > limits.time_limit * 1000 or returncode in _CPU_LIMIT_SIGNALS):
+        return {"status": "timeout", "passed": False, "output": stdout, "expected": expected, "error": "超出时间限制", "verdict": "TLE", **measured}
+    # 内存上限在执行前以 RLIMIT_AS 生效，超限的分配抛出 MemoryError；posix_spawn 启动的子进程的 ru_maxrss
+    # 会计入父进程（API 进程）在 exec 前的峰值，不能用测得的内存判定
+    if limits.memory_limit_kb and stderr.rstrip().endswith("MemoryError"):
+        return {"status": "error", "passed": False, "output": stdout, "expected": expected, "error": "超出内存限制", "verdict": "MLE", **measured}
+
+    if returncode != 0:
+        # 非零退出即运行错误，即使输出与期望一致（期望输出为空的样例上任何崩溃都会“匹配”）
+        passed, verdict = False, "RE"
+    else:
+        verdict = "AC" if passed else "WA"
+    result = {"status": "success", "passed": passed, "output": stdout, "expected": expected, "verdict": verdict, **measured}
+    if verdict == "RE":
+        result["error"] = f"程序异常退出（退出码 {returncode}）"
     if stderr:
         result["stderr"] = stderr
     return result
 
 
-async def mock_submit_code(lesson: str, problem: str, code: str) -> Dict:
+def _summarize_measurements(entries: List[Dict]) -> Dict:
+    """汇总一次提交的最大/总耗时与峰值内存"""
+    times = [e["time_ms"] for e in entries if "time_ms" in e]
+    if not times:
+        return {}
+    return {
+        "max_time_ms": max(times),
+        "total_time_ms": round(sum(times), 1),
+        "max_cpu_ms": max(e.get("cpu_ms", 0) for e in entries),
+        "max_memory_kb": max(e.get("memory_kb", 0) for e in entries),
+    }
+
+
+async def mock_submit_code(lesson: str, problem: str, code: str, fail_fast: Optional[bool] = None,
+                           priority: Optional[List[str]] = None, fixture: Optional[ProblemFixture] = None) -> Dict:
     """提交：运行题目下的所有样例（按 test 下的 *.in/*.out 成对检测）。
     返回每个样例的结果与汇总通过数。
+    fail_fast 为 True 时遇到第一个未通过（含超时）的样例即停止，取消仍在运行的样例，其余样例记为 skipped；
+    为 None 时取 index.json 中该题的 fail_fast 字段（默认 False）。
+    priority 为优先执行的样例名列表（见 case_history_service），只影响执行顺序，结果仍按样例编号排列。
+    fixture 含义同 mock_run_code。
+    """
+    res = {}
+    async for event, payload in iter_submit_code(lesson, problem, code, fail_fast, priority, fixture):
+        if event == "summary":
+            res = payload
+    return res
+
+
+def _compile_error_entry(name: Optional[str], input_data: str, expected: str, ce: CompileError) -> Dict:
+    """语法预检失败时的 testResults 条目，所有样例相同"""
+    entry = {"passed": False, "input": input_data, "expected": expected, "actual": "", "verdict": "CE",
+             "stderr": ce.detail, "error": ce.summary(), "compile_error": ce.to_dict()}
+    if name is not None:
+        entry = {"test": name, **entry}
+    return entry
+
+
+def _compile_error_summary(testResults: List[Dict], ce: CompileError) -> Dict:
+    return {"status": "success", "total": len(testResults), "passed": 0, "result": ce.summary(),
+            "compile_error": ce.to_dict(), "testResults": testResults}
+
+
+def _submit_entry(case, res: Optional[Dict]) -> Dict:
+    """把单个样例的评测结果转换为 testResults 条目；res 为 None 表示 fail-fast 停止后未执行"""
+    if case.error is not None:
+        # 缺少 .out 或读取失败的样例直接记为失败
+        return {"test": case.name, "passed": False, "input": "", "expected": "", "actual": "", "error": case.error}
+    if res is None:
+        return {"test": case.name, "passed": False, "input": case.input_text, "expected": case.expected_norm,
+                "actual": "", "verdict": "skipped", "skipped": True}
+    entry = {"test": case.name, "passed": res.get('passed', False), "input": case.input_text,
+             "expected": res.get('expected', ''), "actual": res.get('output', '')}
+    _copy_measurements(res, entry)
+    if 'stderr' in res:
+        entry['stderr'] = res['stderr']
+    if 'error' in res:
+        entry['error'] = res['error']
+    return entry
+
+
+async def iter_submit_code(lesson: str, problem: str, code: str, fail_fast: Optional[bool] = None,
+                           priority: Optional[List[str]] = None,
+                           fixture: Optional[ProblemFixture] = None) -> AsyncIterator[Tuple[str, Dict]]:
+    """mock_submit_code 的流式版本：每个样例完成后立即产出 ("case", 条目)（按完成顺序），
+    最后产出 ("summary", 汇总结果)，汇总结果与 mock_submit_code 的返回值相同。
     """
-    # 检查 index.json 是否标注无需测试
-    index = load_index()
+    # 检查 index.json 是否标注无需测试，并读取可选的时间/内存限制
     target_path = f"{lesson}/{problem}"
-    has_test = True
-    if index:
-        for item in index:
-            if isinstance(item, dict) and item.get("path") == target_path:
-                if item.get("has_test") is False:
-                    has_test = False
-                break
+    entry_meta = fixture.meta if fixture is not None else _find_index_entry(target_path)
+    has_test = not (entry_meta and entry_meta.get("has_test") is False)
+    limits = _problem_limits(entry_meta)
+    if fail_fast is None:
+        fail_fast = bool(entry_meta and entry_meta.get("fail_fast"))
 
     if not has_test:
-        return {"status": "success", "total": 0, "passed": 0, "result": "此题无需测试", "message": "无需测试，直接通过"}
-
-    test_dir = os.path.join(DATA_DIR, lesson, problem, "test")
-    if not os.path.exists(test_dir):
-        return {"status": "error", "message": "测试目录未找到"}
+        yield "summary", {"status": "success", "total": 0, "passed": 0, "result": "此题无需测试", "message": "无需测试，直接通过"}
+        return
 
-    # 收集所有 *.in 文件（按文件名的数字顺序排序，避免字典序如 '10' < '6' 的问题）
-    files = [f for f in os.listdir(test_dir) if f.endswith('.in')]
-    def _sort_key(fname: str):
-        base = os.path.splitext(fname)[0]
-        try:
-            return (0, int(base))
-        except Exception:
-            return (1, base)
-    files.sort(key=_sort_key)
-    if not files:
-        return {"status": "error", "message": "未找到任何测试用例"}
+    try:
+        with metrics.stage('fixtures'):
+            test_set = fixture.test_set if fixture is not None else await _load_test_set(lesson, problem)
+    except Exception as e:
+        yield "summary", {"status": "error", "message": f"无法读取测试用例: {e}"}
+        return
+    if test_set is None:
+        yield "summary", {"status": "error", "message": "测试目录未找到"}
+        return
+    if not test_set.cases:
+        yield "summary", {"status": "error", "message": "未找到任何测试用例"}
+        return
+
+    # 语法错误在本进程内即可判定：所有样例直接记为编译错误，不创建工作目录、不占用 worker
+    with metrics.stage('precheck'):
+        compile_error = check_syntax(code)
+    if compile_error is not None:
+        testResults = [_submit_entry(c, None) if c.error is not None
+                       else _compile_error_entry(c.name, c.input_text, c.expected_norm, compile_error)
+                       for c in test_set.cases]
+        for entry in testResults:
+            yield "case", entry
+        res = _compile_error_summary(testResults, compile_error)
+        if fail_fast:
+            res["skipped"] = 0
+        yield "summary", res
+        return
+
+    cache = get_verdict_cache()
+    with metrics.stage('verdict_cache'):
+        cache_key = cache.make_key(target_path, "submit" + limits.cache_tag + (":ff" if fail_fast else ""), code, test_set.fingerprint)
+        cached = cache.get(cache_key)
+    if cached is not None:
+        # 标记结果来自缓存：样例没有实际执行，不计入样例失败统计
+        cached["cached"] = True
+        for entry in cached.get("testResults", []):
+            yield "case", entry
+        yield "summary", cached
+        return
+
+    async def _run_single(case):
+        run_res = await workspace.run_async(case.input_text, limits.wall_timeout, limits.time_limit, limits.memory_limit_kb)
+        with metrics.stage('compare'):
+            return _format_run_result(run_res, expected_norm=case.expected_norm, limits=limits)
+
+    # 缺少 .out 或读取失败的样例不必执行，先行产出
+    for case in test_set.cases:
+        if case.error is not None:
+            yield "case", _submit_entry(case, None)
+
+    # 由评测引擎并发执行各样例（并发数不超过 worker 数），结果顺序与 test_set.cases 一致
+    runnable = [c for c in test_set.cases if c.error is None]
+    if priority:
+        # priority 中的样例先启动，其余保持编号顺序（sorted 为稳定排序）
+        rank = {name: i for i, name in enumerate(priority)}
+        runnable.sort(key=lambda c: rank.get(c.name, len(rank)))
+    # 整个提交共用一个工作目录，代码只写入与编译一次
+    try:
+        workspace = await get_engine().run(Workspace, code, "submit_")
+    except Exception as e:
+        yield "summary", {"status": "error", "message": f"无法创建运行环境: {e}"}
+        return
+    # fail-fast：出现未通过的样例后不再启动新样例，并在事件循环中直接终止正在运行的样例的进程组
+    stop_when = (lambda r: not r.get('passed', False)) if fail_fast else None
+    finished: "asyncio.Queue[Dict]" = asyncio.Queue()
+    task = asyncio.ensure_future(get_engine().amap(
+        _run_single, runnable, stop_when=stop_when,
+        on_result=lambda case, r: finished.put_nowait(_submit_entry(case, r)),
+        on_stop=workspace.cancel,
+    ))
+    try:
+        # 每完成一个样例就产出一条，直到全部完成（或 fail-fast 停止）
+        while not (task.done() and finished.empty()):
+            getter = asyncio.ensure_future(finished.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield "case", getter.result()
+            else:
+                getter.cancel()
+        outcomes = task.result()
+    finally:
+        # 客户端中途断开时生成器被关闭，同样需要取消评测并清理工作目录：
+        # 先在事件循环中终止子进程，删除目录放到默认线程池，不排在已占满的评测线程之后
+        workspace.cancel()
+        task.cancel()
+        await asyncio.to_thread(workspace.close)
+    outcome_by_name = {c.name: res for c, res in zip(runnable, outcomes)}
 
     testResults = []
     passed_count = 0
-
-    def _run_single(inp_path, out_path):
-        try:
-            with open(inp_path, 'r', encoding='utf-8') as f:
-                stdin_data = f.read()
-        except Exception as e:
-            return {"error": f"无法读取输入: {e}", "passed": False}
-        try:
-            with open(out_path, 'r', encoding='utf-8') as f:
-                expected_raw = f.read()
-        except Exception as e:
-            return {"error": f"无法读取期望输出: {e}", "passed": False}
-
-        def _run(code_src: str, stdin_data: str, timeout: int = 5):
-            workdir = tempfile.mkdtemp(prefix="submit_")
-            try:
-                file_path = os.path.join(workdir, "main.py")
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(code_src)
-
-                proc = subprocess.run([
-                    "python", file_path
-                ], input=stdin_data.encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-
-                stdout = proc.stdout.decode("utf-8", errors="replace")
-                stderr = proc.stderr.decode("utf-8", errors="replace")
-                return proc.returncode, stdout, stderr, False
-            except subprocess.TimeoutExpired:
-                return -1, "", "Timeout", True
-            except Exception as e:
-                return -2, "", str(e), False
-            finally:
-                try:
-                    shutil.rmtree(workdir)
-                except Exception:
-                    pass
-
-        run_res = _run(code, stdin_data)
-        formatted = _format_run_result(run_res, expected_raw)
-        return formatted
-
-    # 顺序执行每个样例（可以并行化，但为安全起见顺序执行）
-    for infile in files:
-        base = infile[:-3]
-        inp_path = os.path.join(test_dir, infile)
-        out_path = os.path.join(test_dir, f"{base}.out")
-        if not os.path.exists(out_path):
-            testResults.append({"test": base, "passed": False, "input": "", "expected": "", "actual": "", "error": "缺少对应的 .out 文件"})
-            continue
-        res = await asyncio.to_thread(lambda p=inp_path, q=out_path: _run_single(p, q))
-        ok = res.get('passed', False)
-        try:
-            with open(inp_path, 'r', encoding='utf-8') as f:
-                input_content = f.read()
-        except Exception:
-            input_content = ''
-
-        actual = res.get('output', '')
-        expected = res.get('expected', '')
-        if ok:
+    skipped_count = 0
+    for case in test_set.cases:
+        entry = _submit_entry(case, outcome_by_name.get(case.name))
+        if entry.get("skipped"):
+            # fail-fast 停止后未执行完的样例
+            skipped_count += 1
+            yield "case", entry
+        elif entry["passed"]:
             passed_count += 1
-        entry = {"test": base, "passed": ok, "input": input_content, "expected": expected, "actual": actual}
-        if 'stderr' in res:
-            entry['stderr'] = res['stderr']
-        if 'error' in res:
-            entry['error'] = res['error']
         testResults.append(entry)
 
     # 构建简要 result 字段供旧前端兼容
     result_summary = f"通过 {passed_count}/{len(testResults)} 个用例"
-    return {"status": "success", "total": len(testResults), "passed": passed_count, "result": result_summary, "testResults": testResults}
+    if skipped_count:
+        result_summary += f"（跳过 {skipped_count} 个）"
+    res = {"status": "success", "total": len(testResults), "passed": passed_count, "result": result_summary, "testResults": testResults}
+    if fail_fast:
+        res["skipped"] = skipped_count
+    res.update(_summarize_measurements(testResults))
+    cache.put(cache_key, res)
+    yield "summary", res
 
 
 def run_code_against_tests(code: str, tests: List[Dict], timeout_per_test: int = 5) -> Dict:
     """在后端运行任意代码并针对给定的测试列表（每项包含 'input' 和 'output'）进行检测。
     返回与 mock_submit_code 类似的结构：{ status, total, passed, result, testResults }
-    该函数为同步函数，适合用 asyncio.to_thread 调用。
+    该函数为同步函数，适合放到评测引擎的 worker 池中调用。
     """
+    with metrics.stage('precheck'):
+        compile_error = check_syntax(code)
+    if compile_error is not None:
+        testResults = [_compile_error_entry(str(idx + 1), t.get('input', ''), _normalize_output(t.get('output', '')),
+                                            compile_error)
+                       for idx, t in enumerate(tests)]
+        return _compile_error_summary(testResults, compile_error)
+
+    cache = get_verdict_cache()
+    cache_key = cache.make_key("check", f"check:{timeout_per_test}", code, tests_fingerprint(tests))
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     testResults = []
     passed_count = 0
 
     def _run_single_from_strings(stdin_data: str, expected_raw: str):
-        # 基于 submit 中的运行逻辑复用
-        def _run(code_src: str, stdin_data: str, timeout: int = timeout_per_test):
-            workdir = tempfile.mkdtemp(prefix="check_")
-            try:
-                file_path = os.path.join(workdir, "main.py")
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(code_src)
-
-                proc = subprocess.run([
-                    "python", file_path
-                ], input=stdin_data.encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-
-                stdout = proc.stdout.decode("utf-8", errors="replace")
-                stderr = proc.stderr.decode("utf-8", errors="replace")
-                return proc.returncode, stdout, stderr, False
-            except subprocess.TimeoutExpired:
-                return -1, "", "Timeout", True
-            except Exception as e:
-                return -2, "", str(e), False
-            finally:
-                try:
-                    shutil.rmtree(workdir)
-                except Exception:
-                    pass
-
-        run_res = _run(code, stdin_data)
-        formatted = _format_run_result(run_res, expected_raw)
-        return formatted
-
-    for idx, t in enumerate(tests):
-        inp = t.get('input', '')
-        out = t.get('output', '')
-        formatted = _run_single_from_strings(inp, out)
-        ok = formatted.get('passed', False)
-        if ok:
-            passed_count += 1
-        entry = {
-            'test': str(idx + 1),
-            'passed': ok,
-            'input': inp,
-            'expected': formatted.get('expected', ''),
-            'actual': formatted.get('output', '')
-        }
-        if 'stderr' in formatted:
-            entry['stderr'] = formatted['stderr']
-        if 'error' in formatted:
-            entry['error'] = formatted['error']
-        testResults.append(entry)
+        run_res = workspace.run(stdin_data, timeout=timeout_per_test)
+        with metrics.stage('compare'):
+            return _format_run_result(run_res, expected_raw)
+
+    try:
+        workspace = Workspace(code, prefix="check_")
+    except Exception as e:
+        return {"status": "error", "message": f"无法创建运行环境: {e}"}
+
+    try:
+        for idx, t in enumerate(tests):
+            inp = t.get('input', '')
+            out = t.get('output', '')
+            formatted = _run_single_from_strings(inp, out)
+            ok = formatted.get('passed', False)
+            if ok:
+                passed_count += 1
+            entry = {
+                'test': str(idx + 1),
+                'passed': ok,
+                'input': inp,
+                'expected': formatted.get('expected', ''),
+                'actual': formatted.get('output', '')
+            }
+            _copy_measurements(formatted, entry)
+            if 'stderr' in formatted:
+                entry['stderr'] = formatted['stderr']
+            if 'error' in formatted:
+                entry['error'] = formatted['error']
+            testResults.append(entry)
+    finally:
+        workspace.close()
 
     result_summary = f"通过 {passed_count}/{len(testResults)} 个用例"
-    return {"status": "success", "total": len(testResults), "passed": passed_count, "result": result_summary, "testResults": testResults}
+    res = {"status": "success", "total": len(testResults), "passed": passed_count, "result": result_summary, "testResults": testResults}
+    res.update(_summarize_measurements(testResults))
+    cache.put(cache_key, res)
+    return res
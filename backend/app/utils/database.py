@@ -47,6 +47,8 @@ def init_db():
     from app.models.comment import Comment
     from app.models.favorite import Favorite
     from app.models.student_result import StudentResult
+    from app.models.case_history import StudentCaseFailure, ProblemCaseStat
+    from app.models.problem_catalog import CatalogCourse, CatalogProblem, CatalogTestSet, CatalogMeta
     
     # 创建所有表
     Base.metadata.create_all(bind=engine)
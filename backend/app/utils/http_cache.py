@@ -0,0 +1,335 @@
+"""
+HTTP 缓存与压缩工具
+题面 Markdown、参考答案、题目索引与题目资源（图片等）在一节课内被同一批学生反复加载，内容却很少变化：
+- 强 ETag 取自内容的 SHA-256（按文件的修改时间、大小、inode 缓存，文件不变时不再重复计算），多台 API 服务器上一致
+- 支持 If-None-Match / If-Modified-Since 条件请求，未变化时返回 304（不带响应体）
+- 文本类内容按 Accept-Encoding 返回 gzip（安装了 brotli 时优先 br）压缩版本：文件的压缩结果按 ETag 缓存在磁盘
+  （HTTP_CACHE_DIR，默认 backend/data/.http_cache，可随时删除），内存中的内容（题目索引）压缩结果随内容一起缓存；
+  源文件变化后旧 ETag 的压缩文件随即删除，缓存目录总大小超过 HTTP_CACHE_MAX_MB 时删除最久未使用的文件
+- 压缩版本的 ETag 带 -gzip / -br 后缀，条件请求时与未压缩版本视为同一内容
+"""
+import os
+import gzip
+import asyncio
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR') or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../data/.http_cache"))
+# 题目资源的浏览器缓存时长（秒），过期后仍可用条件请求廉价地重新验证
+PROBLEM_ASSET_MAX_AGE = int(os.getenv('PROBLEM_ASSET_MAX_AGE', '3600') or 0)
+# 文本内容（题面、索引）可能随时被教师修改：允许缓存，但每次使用前向服务器验证
+TEXT_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = f"public, max-age={PROBLEM_ASSET_MAX_AGE}"
+# 每个磁盘缓存目录（压缩文件、渲染后的 HTML）的大小上限
+HTTP_CACHE_MAX_MB = float(os.getenv('HTTP_CACHE_MAX_MB', '256') or 0)
+# 小于该大小的内容压缩收益不大，直接返回
+MIN_COMPRESS_BYTES = 512
+ETAG_CACHE_SIZE = 4096
+# 命中的缓存文件距上次刷新修改时间超过该秒数时刷新，清理时按修改时间判断最久未使用
+_TOUCH_INTERVAL = 3600
+
+_COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """按 Accept-Encoding 选择 br / gzip，都不接受时返回 None"""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _etag_value(tag: str) -> str:
+    """去掉 W/ 前缀、引号与压缩后缀，用于比较"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ("-gzip", "-br"):
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """条件请求判断：有 If-None-Match 时只比较 ETag（弱比较），否则比较 If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        value = _etag_value(etag)
+        return any(_etag_value(tag) == value for tag in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def _headers(etag: str, cache_control: str, last_modified: Optional[float], vary: bool) -> Dict[str, str]:
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if vary:
+        headers["Vary"] = "Accept-Encoding"
+    return headers
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """先写同目录下的临时文件再 rename 替换，并发请求不会读到写了一半的缓存文件"""
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def touch(path: str):
+    """刷新缓存文件的修改时间（每个文件至多每 _TOUCH_INTERVAL 秒一次），使常用文件不被清理"""
+    try:
+        if time.time() - os.stat(path).st_mtime > _TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache_dir(cache_dir: str, max_bytes: int) -> int:
+    """目录下（不含子目录）的文件总大小超过 max_bytes 时，按修改时间从旧到新删除到上限的 90% 以内，返回删除的文件数"""
+    files = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for e in it:
+                try:
+                    if e.is_file(follow_symlinks=False):
+                        st = e.stat(follow_symlinks=False)
+                        files.append((st.st_mtime, st.st_size, e.path))
+                except OSError:
+                    continue
+    except OSError:
+        return 0
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+class CacheBudget:
+    """记录写入各缓存目录的字节数，累计超过上限的 1/10 时清理一次该目录（进程启动后首次写入也清理，线程安全）"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._written: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.prunes = 0
+
+    def _limit(self) -> int:
+        return int(self.max_bytes if self.max_bytes is not None else HTTP_CACHE_MAX_MB * 1024 * 1024)
+
+    def record(self, cache_dir: str, nbytes: int):
+        limit = self._limit()
+        if limit <= 0:
+            return
+        with self._lock:
+            written = self._written.get(cache_dir)
+            due = written is None or written + nbytes >= limit // 10
+            self._written[cache_dir] = 0 if due else written + nbytes
+            if due:
+                self.prunes += 1
+        if due:
+            prune_cache_dir(cache_dir, limit)
+
+
+_budget = CacheBudget()
+
+
+def get_cache_budget() -> CacheBudget:
+    """返回进程内共享的磁盘缓存大小控制"""
+    return _budget
+
+
+class FileEtags:
+    """文件内容哈希的 LRU 缓存，键为路径，文件的修改时间、大小或 inode 变化时重新计算（线程安全）"""
+
+    def __init__(self, max_entries: int = ETAG_CACHE_SIZE):
+        self.max_entries = max(1, int(max_entries))
+        self._data: "OrderedDict[str, Tuple[tuple, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path: str, st: os.stat_result) -> Optional[str]:
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            cached = self._data.get(path)
+            if cached is not None and cached[0] == signature:
+                self._data.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+        return None
+
+    def previous(self, path: str) -> Optional[str]:
+        """该路径上次计算的 ETag（不论文件是否已变化）"""
+        with self._lock:
+            cached = self._data.get(path)
+        return cached[1] if cached is not None else None
+
+    def compute(self, path: str, st: os.stat_result) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        etag = h.hexdigest()[:32]
+        with self._lock:
+            self.misses += 1
+            self._data[path] = ((st.st_mtime_ns, st.st_size, st.st_ino), etag)
+            self._data.move_to_end(path)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return etag
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_file_etags = FileEtags()
+
+
+def _compressed_path(cache_dir: str, etag: str, encoding: str) -> str:
+    return os.path.join(cache_dir, f"{etag}.{'br' if encoding == 'br' else 'gz'}")
+
+
+def _compressed_file(path: str, etag: str, encoding: str, cache_dir: str) -> str:
+    """返回文件压缩版本在磁盘缓存中的路径，不存在时生成（按内容哈希命名，内容不变即可复用）"""
+    target = _compressed_path(cache_dir, etag, encoding)
+    if os.path.exists(target):
+        touch(target)
+        return target
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path, "rb") as f:
+        data = _compress(f.read(), encoding)
+    atomic_write_bytes(target, data)
+    _budget.record(cache_dir, len(data))
+    return target
+
+
+def _drop_compressed(etag: str, cache_dir: str):
+    """源文件已变化：删除旧 ETag 的压缩文件（内容相同的其他文件需要时会重新生成）"""
+    for encoding in ("gzip", "br"):
+        try:
+            os.remove(_compressed_path(cache_dir, etag, encoding))
+        except OSError:
+            pass
+
+
+async def file_response(request: Request, path: str, media_type: Optional[str] = None,
+                        cache_control: str = TEXT_CACHE_CONTROL, cache_dir: Optional[str] = None) -> Response:
+    """返回文件内容：带强 ETag 与 Last-Modified，条件请求命中时返回 304，文本类内容按需返回压缩版本"""
+    st = os.stat(path)
+    media_type = media_type or guess_type(path)[0] or "application/octet-stream"
+    cache_dir = cache_dir or HTTP_CACHE_DIR
+    etag = _file_etags.lookup(path, st)
+    if etag is None:
+        previous = _file_etags.previous(path)
+        etag = await asyncio.to_thread(_file_etags.compute, path, st)
+        if previous is not None and previous != etag:
+            await asyncio.to_thread(_drop_compressed, previous, cache_dir)
+    compressible = is_compressible(media_type) and st.st_size >= MIN_COMPRESS_BYTES
+    headers = _headers(etag, cache_control, st.st_mtime, compressible)
+    if is_not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+    encoding = choose_encoding(request.headers.get("accept-encoding")) if compressible else None
+    if encoding is not None:
+        target = await asyncio.to_thread(_compressed_file, path, etag, encoding, cache_dir)
+        headers["ETag"] = f'"{etag}-{encoding}"'
+        headers["Content-Encoding"] = encoding
+        return FileResponse(target, media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
+
+class BytesEntity:
+    """内存中的响应内容（如题目索引的 JSON），ETag 为内容哈希，压缩版本在首次需要时生成并随实体缓存"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        data = self._variants.get(encoding)
+        if data is None:
+            data = _compress(self.body, encoding)
+            with self._lock:
+                self._variants[encoding] = data
+        return data
+
+    def response(self, request: Request, cache_control: str = TEXT_CACHE_CONTROL) -> Response:
+        compressible = is_compressible(self.media_type) and len(self.body) >= MIN_COMPRESS_BYTES
+        headers = _headers(self.etag, cache_control, None, compressible)
+        if is_not_modified(request, self.etag):
+            return Response(status_code=304, headers=headers)
+        encoding = choose_encoding(request.headers.get("accept-encoding")) if compressible else None
+        if encoding is not None:
+            headers["ETag"] = f'"{self.etag}-{encoding}"'
+            headers["Content-Encoding"] = encoding
+            return Response(self.variant(encoding), media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
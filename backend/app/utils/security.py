@@ -29,6 +29,8 @@ if SECRET_KEY == "dev-secret-key":
     print("[WARNING] Using development default secret key - DO NOT USE IN PRODUCTION!")
 # HTTP Bearer认证
 security = HTTPBearer()
+# 可选认证：未携带令牌时不报错
+optional_security = HTTPBearer(auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -116,6 +118,20 @@ def get_current_user(
     return user
 
 
+def get_optional_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Optional[int]:
+    """
+    从令牌中解析用户ID（不查询数据库），未登录或令牌无效时返回 None
+    """
+    if credentials is None:
+        return None
+    try:
+        return verify_token(credentials.credentials).user_id
+    except HTTPException:
+        return None
+
+
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """
     获取当前活跃用户
@@ -0,0 +1,129 @@
+"""
+执行后端对比：把同一批题目（data/problems 中带 solution.md 的题目）的全部样例依次交给各后端评测，
+报告单样例延迟 p50/p95 与吞吐量（样例/秒），用于按部署机器选择 JUDGE_BACKEND。
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_backends [--backends subprocess,asyncio,zygote,batched] [--rounds 3] [--json out.json]
+每个后端按提交执行：一份代码一个 Workspace，样例由评测引擎并发执行（并发数为 JUDGE_WORKERS）。
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from app.services import problems_service
+from app.services.judge import runner
+from app.services.judge.backends import close_backends, get_backend
+from app.services.judge.compare import outputs_match
+from app.services.judge.engine import get_engine
+from app.services.judge.fixtures import load_test_set
+from app.services.judge.workspace import Workspace
+
+DEFAULT_BACKENDS = 'subprocess,asyncio,zygote,batched'
+_CODE_BLOCK = re.compile(r"```(?:python\n)?([\s\S]*?)```", re.IGNORECASE)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def load_problem_set(data_dir: str = problems_service.DATA_DIR, limit: int = 0):
+    """返回 [(题目路径, 参考代码, 样例列表)]，只收录有 solution.md 与测试数据的题目"""
+    problems = []
+    for item in problems_service.load_index() or []:
+        path = item.get('path') if isinstance(item, dict) else None
+        if not path or item.get('has_test') is False:
+            continue
+        solution = os.path.join(data_dir, path, 'solution.md')
+        test_set = load_test_set(os.path.join(data_dir, path, 'test'))
+        if not os.path.exists(solution) or test_set is None:
+            continue
+        with open(solution, 'r', encoding='utf-8') as f:
+            m = _CODE_BLOCK.search(f.read())
+        cases = [c for c in test_set.cases if c.error is None]
+        if m and cases:
+            problems.append((path, m.group(1), cases))
+        if limit and len(problems) >= limit:
+            break
+    return problems
+
+
+async def _judge_problem(code: str, cases, samples: list) -> int:
+    engine = get_engine()
+    workspace = await engine.run(Workspace, code, 'bench_')
+
+    async def _one(case):
+        start = time.perf_counter()
+        res = await workspace.run_async(case.input_text)
+        samples.append((time.perf_counter() - start) * 1000)
+        return outputs_match(res.stdout, case.expected_norm)
+
+    try:
+        return sum(await engine.amap(_one, cases))
+    finally:
+        await engine.run(workspace.close)
+
+
+async def _bench_backend(problems, rounds: int):
+    samples, passed, total = [], 0, 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, code, cases in problems:
+            passed += await _judge_problem(code, cases, samples)
+            total += len(cases)
+    elapsed = time.perf_counter() - start
+    return {
+        "cases": total,
+        "passed": passed,
+        "seconds": round(elapsed, 3),
+        "throughput": round(total / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(_percentile(samples, 50), 2),
+        "p95_ms": round(_percentile(samples, 95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default=DEFAULT_BACKENDS, help='逗号分隔的后端名称')
+    parser.add_argument('--rounds', type=int, default=3, help='题目集重复评测的轮数（首轮之前另有一轮预热）')
+    parser.add_argument('--problems', type=int, default=0, help='最多使用的题目数，0 表示全部')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    problems = load_problem_set(limit=args.problems)
+    if not problems:
+        sys.exit('未找到带 solution.md 与测试数据的题目')
+    n_cases = sum(len(cases) for _, _, cases in problems)
+    print(f"题目 {len(problems)} 道，样例 {n_cases} 个，每个后端 {args.rounds} 轮，并发 {get_engine().workers}")
+
+    results = {}
+    try:
+        for name in [b.strip() for b in args.backends.split(',') if b.strip()]:
+            runner.JUDGE_BACKEND = name
+            if get_backend().name != name:
+                print(f"{name:<11} 当前平台不支持，跳过")
+                continue
+            asyncio.run(_bench_backend(problems[:1], 1))  # 预热（启动 zygote 等）
+            results[name] = asyncio.run(_bench_backend(problems, args.rounds))
+    finally:
+        close_backends()
+        get_engine().shutdown()
+
+    print(f"{'backend':<11} {'cases/s':>9} {'mean(ms)':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'passed':>9}")
+    for name, r in results.items():
+        print(f"{name:<11} {r['throughput']:>9.1f} {r['mean_ms']:>9.2f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['passed']:>4}/{r['cases']:<4}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"workers": get_engine().workers, "problems": len(problems), "cases": n_cases,
+                       "rounds": args.rounds, "backends": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+课堂提交压测：模拟整个班级在同一时间集中运行/提交代码，评估服务能承受的并发量。
+流程：注册并登录 N 个学生账号，每个学生并发地对 data/problems 中的真实题目发起 /run 与 /submit，
+程序按比例混合四类：correct（答案正确）、wrong（答案错误）、timeout（死循环）、crash（运行时异常），
+期间轮询 /api/problems/judge/stats 采样评测队列与评测引擎的占用情况。
+报告吞吐量、延迟分位数、执行器饱和度、错误率与判题结果是否符合预期，可输出 JSON 供回归对比。
+任何一类程序的判定与预期不完全一致（verdict_match_rate < 1）时列出这些类型并以退出码 1 结束，
+判题错误不会被吞吐量等指标掩盖；crash 程序有意包括期望输出为空的题目。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_classroom [--students 40] [--requests 5] [--json out.json]
+    python -m benchmarks.bench_classroom --url http://127.0.0.1:8000   # 压测已经启动的服务
+不传 --url 时在本机随机端口启动一个 uvicorn 实例（临时 SQLite 数据库，JUDGE_* 环境变量原样继承），
+结束后关闭；全程不访问外网。
+
+参考答案（solution.md）的输出带有提示语，与测试数据不完全一致，
+因此 correct 程序按测试数据生成（输入 -> 期望输出的查表程序），保证判题结果可预期。
+每个请求的代码带唯一注释，避免命中结果缓存。
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+
+from app.services import problems_service
+from app.services.judge.fixtures import load_test_set
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM_KINDS = ('correct', 'wrong', 'timeout', 'crash')
+EXPECTED_VERDICT = {'correct': 'AC', 'wrong': 'WA', 'timeout': 'TLE', 'crash': 'RE'}
+DEFAULT_MIX = 'correct=0.55,wrong=0.25,timeout=0.05,crash=0.15'
+PASSWORD = '123456'
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _latency_summary(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.mean(values), 2),
+        "p50_ms": round(_percentile(values, 50), 2),
+        "p90_ms": round(_percentile(values, 90), 2),
+        "p95_ms": round(_percentile(values, 95), 2),
+        "p99_ms": round(_percentile(values, 99), 2),
+        "max_ms": round(max(values), 2),
+    }
+
+
+def _parse_mix(text: str):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in PROGRAM_KINDS:
+            raise argparse.ArgumentTypeError(f'未知的程序类型: {name}')
+        mix[name] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError('程序比例之和须大于 0')
+    return mix
+
+
+def load_problems(limit: int = 0):
+    """返回 [(lesson 目录名, problem 目录名, 样例列表)]，只收录有测试数据且样例完整的题目"""
+    problems = []
+    for item in problems_service.load_index() or []:
+        path = item.get('path') if isinstance(item, dict) else None
+        if not path or item.get('has_test') is False:
+            continue
+        test_set = load_test_set(os.path.join(problems_service.DATA_DIR, path, 'test'))
+        if test_set is None or not test_set.cases or any(c.error for c in test_set.cases):
+            continue
+        lesson, _, problem = path.partition('/')
+        problems.append((lesson, problem, test_set.cases))
+        if limit and len(problems) >= limit:
+            break
+    return problems
+
+
+def make_program(kind: str, cases, tag: str) -> str:
+    """生成一份 kind 类型的学生程序；tag 写入注释使每份代码互不相同"""
+    header = f"# {tag}\n"
+    if kind == 'correct':
+        answers = {c.input_text.strip(): c.expected_norm for c in cases}
+        return header + f"import sys\n_ANSWERS = {answers!r}\nprint(_ANSWERS.get(sys.stdin.read().strip(), ''))\n"
+    if kind == 'wrong':
+        return header + "import sys\nsys.stdin.read()\nprint('wrong answer')\n"
+    if kind == 'timeout':
+        return header + "while True:\n    pass\n"
+    return header + "import sys\nsys.stdin.read()\nraise RuntimeError('crash')\n"
+
+
+def observed_verdict(body: dict) -> str:
+    """/run 取唯一样例的判定；/submit 取第一个未通过样例的判定，全部通过为 AC"""
+    if not isinstance(body, dict) or body.get('status') == 'error':
+        return 'error'
+    for entry in body.get('testResults') or []:
+        verdict = entry.get('verdict') or ('AC' if entry.get('passed') else 'WA')
+        if verdict not in ('AC', 'skipped'):
+            return verdict
+    return 'AC'
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str):
+    """在随机端口启动 uvicorn，返回 (进程, base_url, 日志路径)"""
+    port = _free_port()
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    env.setdefault('JUDGE_QUEUE_DB', os.path.join(workdir, 'judge_queue.db'))
+    log_path = os.path.join(workdir, 'server.log')
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(port),
+             '--log-level', 'warning'],
+            cwd=BACKEND_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'服务启动失败，日志见 {log_path}')
+        try:
+            if httpx.get(base_url + '/health', timeout=1).status_code == 200:
+                return server, base_url, log_path
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'服务启动超时，日志见 {log_path}')
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def seed_students(client: httpx.AsyncClient, count: int, prefix: str, concurrency: int = 8):
+    """注册（已存在则跳过）并登录 count 个学生，返回 token 列表"""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _one(i):
+        username = f"{prefix}{i:03d}"
+        async with sem:
+            await client.post('/api/auth/register', json={
+                "username": username, "password": PASSWORD, "role": "student",
+                "name": f"压测学生{i}", "email": f"{username}@example.com",
+            })
+            resp = await client.post('/api/auth/login', json={"username": username, "password": PASSWORD})
+        body = resp.json()
+        if body.get('code') != 200:
+            raise RuntimeError(f"学生 {username} 登录失败: {body.get('message')}")
+        return body['data']['token']
+
+    return await asyncio.gather(*(_one(i) for i in range(1, count + 1)))
+
+
+async def _student(client, token, student_no, problems, args, samples, start_gate):
+    rng = random.Random(f"{args.seed}:{student_no}")
+    kinds, weights = zip(*args.mix.items())
+    headers = {"Authorization": f"Bearer {token}"}
+    await start_gate.wait()
+    for attempt in range(args.requests):
+        if args.think > 0:
+            await asyncio.sleep(rng.uniform(0, args.think))
+        lesson, problem, cases = rng.choice(problems)
+        kind = rng.choices(kinds, weights)[0]
+        endpoint = 'run' if rng.random() < args.run_ratio else 'submit'
+        code = make_program(kind, cases, f"student {student_no} attempt {attempt} {time.time_ns()}")
+        sample = {"endpoint": endpoint, "kind": kind, "lesson": lesson, "problem": problem}
+        started = time.perf_counter()
+        try:
+            resp = await client.post(f'/api/problems/{lesson}/{problem}/{endpoint}', json={"code": code},
+                                     headers=headers)
+            sample["status_code"] = resp.status_code
+            sample["verdict"] = observed_verdict(resp.json()) if resp.status_code == 200 else None
+        except (httpx.HTTPError, ValueError) as e:
+            sample["status_code"] = None
+            sample["error"] = type(e).__name__
+            sample["verdict"] = None
+        sample["latency_ms"] = (time.perf_counter() - started) * 1000
+        samples.append(sample)
+
+
+async def _sample_stats(client, interval, stop, stats_samples):
+    while not stop.is_set():
+        try:
+            resp = await client.get('/api/problems/judge/stats')
+            if resp.status_code == 200:
+                stats_samples.append(resp.json())
+        except (httpx.HTTPError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def summarize_saturation(stats_samples):
+    """由 /judge/stats 采样计算评测队列与评测引擎的占用情况"""
+    if not stats_samples:
+        return {"samples": 0}
+    queue = [s.get('queue', {}) for s in stats_samples]
+    engine = [s.get('engine', {}) for s in stats_samples]
+    max_active = queue[-1].get('max_active') or 1
+    workers = engine[-1].get('workers') or 1
+    running = [e.get('running', 0) for e in engine]
+    active = [q.get('active', 0) for q in queue]
+    return {
+        "samples": len(stats_samples),
+        "queue_max_active": max_active,
+        "queue_active_mean": round(statistics.mean(active), 2),
+        "queue_active_max": max(active),
+        "queue_full_ratio": round(sum(a >= max_active for a in active) / len(active), 3),
+        "queue_waiting_max": max(q.get('waiting', 0) for q in queue),
+        "queue_rejected": queue[-1].get('rejected', 0) - queue[0].get('rejected', 0),
+        "queue_max_wait_ms": queue[-1].get('max_wait_ms', 0.0),
+        "queue_waiting_max_by_class": {
+            name: max(q.get('classes', {}).get(name, {}).get('waiting', 0) for q in queue)
+            for name in queue[-1].get('classes', {})
+        },
+        "engine_workers": workers,
+        "engine_running_mean": round(statistics.mean(running), 2),
+        "engine_running_max": max(running),
+        "engine_utilization": round(statistics.mean(running) / workers, 3),
+        "engine_busy_ratio": round(sum(r >= workers for r in running) / len(running), 3),
+        "engine_pending_max": max(e.get('pending', 0) for e in engine),
+    }
+
+
+def summarize(samples, elapsed):
+    latencies = [s['latency_ms'] for s in samples]
+    ok = [s for s in samples if s['status_code'] == 200]
+    errors = {
+        "http_429": sum(s['status_code'] == 429 for s in samples),
+        "http_5xx": sum((s['status_code'] or 0) >= 500 for s in samples),
+        "http_other": sum(s['status_code'] not in (None, 200, 429) and s['status_code'] < 500 for s in samples),
+        "transport": sum(s['status_code'] is None for s in samples),
+        "judge_error": sum(s['verdict'] == 'error' for s in ok),
+    }
+    errors["rate"] = round(sum(errors.values()) / len(samples), 4) if samples else 0.0
+
+    by_endpoint = {}
+    for endpoint in ('run', 'submit'):
+        group = [s for s in samples if s['endpoint'] == endpoint]
+        if group:
+            by_endpoint[endpoint] = _latency_summary([s['latency_ms'] for s in group])
+    by_kind = {}
+    for kind in PROGRAM_KINDS:
+        group = [s for s in samples if s['kind'] == kind]
+        if not group:
+            continue
+        judged = [s for s in group if s['status_code'] == 200]
+        verdicts = {}
+        for s in judged:
+            verdicts[s['verdict']] = verdicts.get(s['verdict'], 0) + 1
+        entry = _latency_summary([s['latency_ms'] for s in group])
+        entry["verdicts"] = verdicts
+        entry["verdict_match_rate"] = (round(verdicts.get(EXPECTED_VERDICT[kind], 0) / len(judged), 4)
+                                       if judged else 0.0)
+        by_kind[kind] = entry
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        # 判定与预期不完全一致的程序类型
+        "verdict_mismatches": [kind for kind, entry in by_kind.items() if entry["verdict_match_rate"] < 1.0],
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": _latency_summary(latencies),
+        "by_endpoint": by_endpoint,
+        "by_kind": by_kind,
+        "errors": errors,
+    }
+
+
+async def run_load(base_url: str, problems, args):
+    timeout = httpx.Timeout(args.request_timeout, connect=10)
+    limits = httpx.Limits(max_connections=args.students + 4, max_keepalive_connections=args.students + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, trust_env=False) as client:
+        tokens = await seed_students(client, args.students, args.prefix)
+        samples, stats_samples = [], []
+        start_gate, stop = asyncio.Event(), asyncio.Event()
+        sampler = asyncio.create_task(_sample_stats(client, args.sample_interval, stop, stats_samples))
+        students = [asyncio.create_task(_student(client, token, i, problems, args, samples, start_gate))
+                    for i, token in enumerate(tokens, 1)]
+        # 所有学生同时开始，模拟课堂上统一开始提交
+        started = time.perf_counter()
+        start_gate.set()
+        await asyncio.gather(*students)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+    report = summarize(samples, elapsed)
+    report["saturation"] = summarize_saturation(stats_samples)
+    if stats_samples:
+        report["server_mode"] = stats_samples[-1].get('mode')
+    return report
+
+
+def print_report(report):
+    """在终端打印压测摘要"""
+    lat, sat, err = report["latency"], report["saturation"], report["errors"]
+    print(f"请求 {report['requests']}（成功 {report['succeeded']}），耗时 {report['duration_s']}s，"
+          f"吞吐 {report['throughput_rps']} req/s，错误率 {err['rate']:.2%}")
+    print(f"延迟 p50 {lat.get('p50_ms')}ms  p95 {lat.get('p95_ms')}ms  p99 {lat.get('p99_ms')}ms  "
+          f"max {lat.get('max_ms')}ms")
+    if sat.get('samples'):
+        print(f"引擎利用率 {sat['engine_utilization']:.0%}（满载采样占比 {sat['engine_busy_ratio']:.0%}），"
+              f"队列满 {sat['queue_full_ratio']:.0%}，最多排队 {sat['queue_waiting_max']}，拒绝 {sat['queue_rejected']}")
+    print(f"{'kind':<9} {'count':>6} {'p50(ms)':>9} {'p95(ms)':>9} {'match':>7}  verdicts")
+    for kind, r in report["by_kind"].items():
+        print(f"{kind:<9} {r['count']:>6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['verdict_match_rate']:>7.1%}  "
+              f"{r['verdicts']}")
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help='压测已启动的服务；不传时在本机启动临时实例')
+    parser.add_argument('--students', type=int, default=40, help='并发学生数')
+    parser.add_argument('--requests', type=int, default=5, help='每个学生发起的请求数')
+    parser.add_argument('--run-ratio', type=float, default=0.3, help='/run 请求所占比例，其余为 /submit')
+    parser.add_argument('--mix', type=_parse_mix, default=_parse_mix(DEFAULT_MIX),
+                        help=f'程序类型比例（默认 {DEFAULT_MIX}）')
+    parser.add_argument('--think', type=float, default=0.0, help='每次请求前的随机思考时间上限（秒），0 表示连续提交')
+    parser.add_argument('--problems', type=int, default=0, help='最多使用的题目数，0 表示全部')
+    parser.add_argument('--prefix', default='loadstu', help='压测学生用户名前缀')
+    parser.add_argument('--seed', type=int, default=2024, help='随机种子，相同种子生成相同的请求序列')
+    parser.add_argument('--sample-interval', type=float, default=0.25, help='/judge/stats 采样间隔（秒）')
+    parser.add_argument('--request-timeout', type=float, default=300.0, help='单个请求的超时（秒）')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件，传 - 输出到标准输出')
+    args = parser.parse_args()
+
+    problems = load_problems(args.problems)
+    if not problems:
+        sys.exit('未找到带测试数据的题目')
+
+    server = None
+    with tempfile.TemporaryDirectory(prefix='bench_classroom_') as workdir:
+        try:
+            if args.url:
+                base_url = args.url.rstrip('/')
+            else:
+                server, base_url, _ = start_server(workdir)
+            report = asyncio.run(run_load(base_url, problems, args))
+        finally:
+            if server is not None:
+                stop_server(server)
+
+    report["config"] = {
+        "url": args.url, "students": args.students, "requests_per_student": args.requests,
+        "run_ratio": args.run_ratio, "mix": args.mix, "think_s": args.think, "problems": len(problems),
+        "seed": args.seed, "env": {k: v for k, v in os.environ.items() if k.startswith('JUDGE_')},
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        print_report(report)
+    if report["verdict_mismatches"]:
+        print("判题结果与预期不符：" + "，".join(
+            f"{kind}（{report['by_kind'][kind]['verdict_match_rate']:.1%}，{report['by_kind'][kind]['verdicts']}）"
+            for kind in report["verdict_mismatches"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+冷启动与 zygote 单样例延迟对比
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_zygote [--cases 50] [--warmup 5]
+"""
+import os
+import time
+import argparse
+import statistics
+import tempfile
+import shutil
+
+from app.services.judge import runner
+from app.services.judge.zygote import ZygotePool
+
+PROGRAM = "a = int(input())\nb = int(input())\nprint(a + b)\n"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _bench(run, cases: int, warmup: int):
+    for i in range(warmup):
+        run(f"{i}\n{i}\n")
+    samples = []
+    for i in range(cases):
+        start = time.perf_counter()
+        rc, out, _, _ = run(f"{i}\n{i}\n")[:4]
+        samples.append((time.perf_counter() - start) * 1000)
+        assert rc == 0 and out.strip() == str(2 * i), (rc, out)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    file_path = os.path.join(workdir, 'main.py')
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(PROGRAM)
+    pool = ZygotePool(size=1)
+    try:
+        results = {
+            'cold': _bench(lambda s: runner._run_cold(file_path, s, 5), args.cases, args.warmup),
+            'zygote': _bench(lambda s: pool.run(file_path, s, 5), args.cases, args.warmup),
+        }
+    finally:
+        pool.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'backend':<8} {'mean(ms)':>10} {'p50(ms)':>10} {'p95(ms)':>10}")
+    for name, samples in results.items():
+        print(f"{name:<8} {statistics.mean(samples):>10.2f} {_percentile(samples, 50):>10.2f} {_percentile(samples, 95):>10.2f}")
+    speedup = statistics.mean(results['cold']) / statistics.mean(results['zygote'])
+    print(f"zygote 平均加速 {speedup:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1158 @@
+"""
+评测（judge）相关的单元测试
+"""
+import os
+import json
+import asyncio
+import pytest
+from app.services import problems_service
+from app.services.judge.engine import JudgeEngine
+
+GOOD_CODE = "a = int(input())\nb = int(input())\nprint(a + b)\n"
+WRONG_CODE = "a = int(input())\nb = int(input())\nprint(a - b)\n"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """构造一个临时题库：lesson_01/problem_01 为 a+b，共 12 个样例"""
+    prob = tmp_path / "lesson_01" / "problem_01"
+    test_dir = prob / "test"
+    test_dir.mkdir(parents=True)
+    (prob / "README.md").write_text("# a+b", encoding="utf-8")
+    for i in range(1, 13):
+        (test_dir / f"{i}.in").write_text(f"{i}\n{i * 2}\n", encoding="utf-8")
+        (test_dir / f"{i}.out").write_text(f"{i * 3}\n", encoding="utf-8")
+    index = [{"lesson": 1, "problem": 1, "title": "a+b", "path": "lesson_01/problem_01", "has_test": True}]
+    (tmp_path / "index.json").write_text(json.dumps(index), encoding="utf-8")
+    monkeypatch.setattr(problems_service, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+class TestJudgeEngine:
+    """评测引擎测试类"""
+
+    def test_amap_preserves_order(self):
+        """并发执行的结果顺序与输入一致（与完成顺序无关）"""
+        engine = JudgeEngine(workers=4)
+
+        async def _square(x):
+            await asyncio.sleep(0.001 * (20 - x))
+            return x * x
+
+        assert asyncio.run(engine.amap(_square, range(20))) == [x * x for x in range(20)]
+
+    def test_amap_fail_fast_holds_slot_until_thread_returns(self):
+        """fail-fast 先调用 on_stop，被取消的项在线程返回后才释放名额，amap 返回时线程均已结束"""
+        import threading
+        import time
+        engine = JudgeEngine(workers=2)
+        release = threading.Event()
+        log = []
+
+        def _block():
+            release.wait(5)
+            time.sleep(0.05)
+            log.append("thread_done")
+
+        async def _case(x):
+            if x == 0:
+                await engine.run(_block)
+                return {"passed": True}
+            await asyncio.sleep(0.05)
+            return {"passed": False}
+
+        def _stop():
+            log.append("stop")
+            release.set()
+
+        async def scenario():
+            res = await engine.amap(_case, [0, 1], stop_when=lambda r: not r["passed"], on_stop=_stop)
+            log.append("amap_done")
+            return res
+
+        try:
+            res = asyncio.run(scenario())
+        finally:
+            engine.shutdown()
+        assert log == ["stop", "thread_done", "amap_done"]
+        assert res == [None, {"passed": False}]
+        assert engine.running == 0 and engine.completed == 2
+
+    def test_amap_occupancy_stats(self):
+        """amap 统计占用 worker 与等待 worker 的样例数，结束后归零"""
+        engine = JudgeEngine(workers=2)
+        seen = []
+
+        async def _probe(x):
+            seen.append((engine.running, engine.pending))
+            await asyncio.sleep(0.01)
+            return x
+
+        asyncio.run(engine.amap(_probe, range(6)))
+        stats = engine.stats()
+        assert max(r for r, _ in seen) == 2
+        assert max(p for _, p in seen) > 0
+        assert stats["running"] == 0 and stats["pending"] == 0
+        assert stats["peak_running"] == 2 and stats["completed"] == 6
+
+
+class TestSubmit:
+    """提交评测测试类"""
+
+    def test_submit_all_passed(self, data_dir):
+        """正确代码通过全部样例，且按数字顺序返回"""
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        assert res["status"] == "success"
+        assert res["total"] == 12
+        assert res["passed"] == 12
+        assert [t["test"] for t in res["testResults"]] == [str(i) for i in range(1, 13)]
+        assert res["testResults"][9]["input"] == "10\n20\n"
+
+    def test_submit_wrong_answer(self, data_dir):
+        """错误代码不通过"""
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", WRONG_CODE))
+        assert res["passed"] == 0
+        assert res["testResults"][0]["actual"].strip() == "-1"
+
+    def test_crash_with_empty_expected_is_re(self, data_dir):
+        """期望输出为空的样例上，异常退出的程序判为 RE 而不是 AC"""
+        test_dir = data_dir / "lesson_01" / "problem_01" / "test"
+        for i in range(1, 13):
+            (test_dir / f"{i}.out").write_text("", encoding="utf-8")
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", "import sys\nsys.exit(3)\n"))
+        assert res["passed"] == 0
+        assert {t["verdict"] for t in res["testResults"]} == {"RE"}
+        assert "退出码 3" in res["testResults"][0]["error"]
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", "1/0\n"))
+        assert res["passed"] == 0 and res["testResults"][0]["verdict"] == "RE"
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", "pass\n"))
+        assert res["passed"] == 12
+
+    def test_submit_missing_out(self, data_dir):
+        """缺少 .out 的样例记为失败"""
+        os.remove(data_dir / "lesson_01" / "problem_01" / "test" / "12.out")
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        assert res["total"] == 12
+        assert res["passed"] == 11
+        assert res["testResults"][-1]["error"] == "缺少对应的 .out 文件"
+
+    def test_run_sample(self, data_dir):
+        """运行单个样例"""
+        res = asyncio.run(problems_service.mock_run_code("lesson_01", "problem_01", GOOD_CODE))
+        assert res["result"] == "样例通过"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="zygote 后端仅支持 POSIX")
+class TestZygoteBackend:
+    """zygote 执行后端测试类"""
+
+    def setup_method(self):
+        from app.services.judge.zygote import ZygotePool
+        self.pool = ZygotePool(size=1)
+
+    def teardown_method(self):
+        self.pool.close()
+
+    def _run(self, tmp_path, src, stdin_data="", timeout=5):
+        file_path = tmp_path / "main.py"
+        file_path.write_text(src, encoding="utf-8")
+        return self.pool.run(str(file_path), stdin_data, timeout)
+
+    def test_stdout_and_returncode(self, tmp_path):
+        """标准输入输出与退出码与冷启动一致"""
+        assert self._run(tmp_path, GOOD_CODE, "1\n2\n")[:4] == (0, "3\n", "", False)
+        rc, _, _, _ = self._run(tmp_path, "import sys\nsys.exit(3)\n")[:4]
+        assert rc == 3
+
+    def test_exception_traceback(self, tmp_path):
+        """未捕获异常输出 traceback 且退出码为 1"""
+        rc, out, err, timed_out = self._run(tmp_path, "print('hi')\n1/0\n")[:4]
+        assert rc == 1 and out == "hi\n" and not timed_out
+        assert "ZeroDivisionError" in err and "main.py" in err
+
+    def test_timeout(self, tmp_path):
+        """超时后杀掉子进程，zygote 仍可继续使用"""
+        assert self._run(tmp_path, "while True: pass\n", timeout=0.5)[:4] == (-1, "", "Timeout", True)
+        assert self._run(tmp_path, GOOD_CODE, "2\n2\n")[1] == "4\n"
+
+
+class TestWorkspace:
+    """提交级工作目录测试类"""
+
+    def test_compile_once_and_reuse(self):
+        """代码只编译一次，多次运行复用 .pyc，关闭后目录被删除"""
+        from app.services.judge.workspace import Workspace
+        with Workspace(GOOD_CODE) as ws:
+            assert ws.pyc_path and os.path.exists(ws.pyc_path)
+            assert ws.run("1\n2\n")[1] == "3\n"
+            assert ws.run("5\n5\n")[1] == "10\n"
+            workdir = ws.dir
+        assert not os.path.exists(workdir)
+
+    def test_syntax_error_rejected_early(self, data_dir, monkeypatch):
+        """语法错误在编译阶段拒绝，不再为样例启动进程"""
+        from app.services.judge import runner
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("语法错误的代码不应被执行")
+
+        monkeypatch.setattr(runner, "run_file", _fail)
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", "print(\n"))
+        assert res["passed"] == 0
+        assert "SyntaxError" in res["testResults"][0]["stderr"]
+
+
+class TestJudgeQueue:
+    """评测准入队列测试类"""
+
+    def test_cap_and_reject(self):
+        """超过并发上限的请求排队，超过队列深度的请求立即拒绝"""
+        from app.services.judge.queue import JudgeQueue, JudgeQueueFull
+
+        async def scenario():
+            q = JudgeQueue(max_active=2, max_waiting=1)
+            gate = asyncio.Event()
+            peak = 0
+
+            async def job():
+                nonlocal peak
+                async with q.slot():
+                    peak = max(peak, q.active)
+                    await gate.wait()
+
+            tasks = [asyncio.create_task(job()) for _ in range(3)]
+            await asyncio.sleep(0)
+            assert q.active == 2 and q.waiting == 1
+            with pytest.raises(JudgeQueueFull) as exc:
+                await q.acquire()
+            assert exc.value.retry_after >= 1
+            gate.set()
+            await asyncio.gather(*tasks)
+            return q.stats(), peak
+
+        stats, peak = asyncio.run(scenario())
+        assert peak == 2
+        assert stats["completed"] == 3 and stats["rejected"] == 1
+        assert stats["active"] == 0 and stats["waiting"] == 0
+
+    def test_cancelled_waiter_releases(self):
+        """排队中被取消的请求不占用名额"""
+        from app.services.judge.queue import JudgeQueue
+
+        async def scenario():
+            q = JudgeQueue(max_active=1, max_waiting=5)
+            await q.acquire()
+            waiter = asyncio.create_task(q.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            q.release()
+            return q.active, q.waiting
+
+        assert asyncio.run(scenario()) == (0, 0)
+
+    def test_fair_share_between_users(self):
+        """同一类别中连续提交多次的用户不会让其他用户一直等待"""
+        from app.services.judge.queue import JudgeQueue
+
+        async def scenario():
+            q = JudgeQueue(max_active=1, max_waiting=20, max_waiting_per_user=10)
+            gate = asyncio.Event()
+            order = []
+
+            async def job(user):
+                async with q.slot("submit", user):
+                    order.append(user)
+                    await gate.wait()
+
+            tasks = [asyncio.create_task(job("a")) for _ in range(4)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(job("b")))
+            await asyncio.sleep(0)
+            assert q.stats()["classes"]["submit"]["waiting_users"] == 2
+            gate.set()
+            await asyncio.gather(*tasks)
+            return order
+
+        assert asyncio.run(scenario()) == ["a", "a", "b", "a", "a"]
+
+    def test_class_weights(self):
+        """有空闲名额时按类别权重分配，submit 优先于 run"""
+        from app.services.judge.queue import JudgeQueue
+
+        async def scenario():
+            q = JudgeQueue(max_active=1, max_waiting=20, weights={"submit": 3, "run": 1})
+            await q.acquire("run", "holder")
+            order = []
+
+            async def job(klass, user):
+                async with q.slot(klass, user):
+                    order.append(klass)
+
+            tasks = [asyncio.create_task(job("run", f"r{i}")) for i in range(3)]
+            tasks += [asyncio.create_task(job("submit", f"s{i}")) for i in range(3)]
+            await asyncio.sleep(0)
+            waiting = {k: c["waiting"] for k, c in q.stats()["classes"].items()}
+            q.release("run")
+            await asyncio.gather(*tasks)
+            return order, waiting
+
+        order, waiting = asyncio.run(scenario())
+        assert waiting == {"submit": 3, "run": 3, "check": 0}
+        assert order == ["submit", "submit", "run", "submit", "run", "run"]
+
+    def test_check_cap_and_per_user_limit(self):
+        """check 受独立并发上限限制，不挤占学生评测；单个用户排队过多时拒绝"""
+        from app.services.judge.queue import JudgeQueue, JudgeQueueFull
+
+        async def scenario():
+            q = JudgeQueue(max_active=2, max_waiting=20, max_waiting_per_user=1, check_max_active=1)
+            await q.acquire("check", "teacher")
+            waiter = asyncio.create_task(q.acquire("check", "teacher"))
+            await asyncio.sleep(0)
+            # check 已达自身上限，全局空闲名额仍可分给学生
+            await q.acquire("run", "student")
+            with pytest.raises(JudgeQueueFull):
+                await q.acquire("check", "teacher")
+            stats = q.stats()
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            return stats
+
+        stats = asyncio.run(scenario())
+        assert stats["active"] == 2 and stats["waiting"] == 1
+        assert stats["classes"]["check"]["active"] == 1 and stats["classes"]["check"]["waiting"] == 1
+        assert stats["classes"]["check"]["rejected"] == 1
+
+
+class TestVerdictCache:
+    """评测结果缓存测试类"""
+
+    @pytest.fixture(autouse=True)
+    def _fresh_cache(self, monkeypatch):
+        from app.services.judge import verdict_cache
+        monkeypatch.setattr(verdict_cache, "_cache", verdict_cache.VerdictCache())
+        return verdict_cache
+
+    def test_resubmit_hits_cache(self, data_dir, monkeypatch, _fresh_cache):
+        """仅有换行符差异的重复提交直接命中缓存"""
+        first = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        monkeypatch.setattr(problems_service, "Workspace", None)
+        again = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE.replace("\n", "\r\n")))
+        assert again == {**first, "cached": True}
+        stats = _fresh_cache.get_verdict_cache().stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+
+    def test_trailing_whitespace_in_literal_not_merged(self):
+        """行尾空白可能在字符串字面量中，不同的代码不能共用缓存键"""
+        from app.services.judge.verdict_cache import code_hash
+        plain = 's = """a\nb"""\nprint(repr(s))\n'
+        assert code_hash(plain) != code_hash(plain.replace("a\n", "a  \n"))
+        assert code_hash(plain) == code_hash(plain.replace("\n", "\r\n"))
+
+    def test_test_change_invalidates(self, data_dir, _fresh_cache):
+        """测试文件变化后重新评测"""
+        asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        (data_dir / "lesson_01" / "problem_01" / "test" / "1.out").write_text("999\n", encoding="utf-8")
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        assert res["passed"] == 11
+        assert _fresh_cache.get_verdict_cache().stats()["hits"] == 0
+
+    def test_lru_bound(self):
+        """超过条目上限时淘汰最久未使用的结果"""
+        from app.services.judge.verdict_cache import VerdictCache
+        cache = VerdictCache(max_entries=2)
+        ok = {"status": "success", "testResults": []}
+        keys = [cache.make_key("p", "submit", f"print({i})", "fp") for i in range(3)]
+        cache.put(keys[0], ok)
+        cache.put(keys[1], ok)
+        cache.get(keys[0])
+        cache.put(keys[2], ok)
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == ok
+        assert cache.stats()["evictions"] == 1
+
+
+class TestFixtureCache:
+    """测试集缓存测试类"""
+
+    def test_load_once_and_reload_on_change(self, data_dir):
+        """未变化时复用内存中的测试集，文件变化后重新加载"""
+        from app.services.judge.fixtures import TestSetCache
+        cache = TestSetCache()
+        test_dir = str(data_dir / "lesson_01" / "problem_01" / "test")
+        first = cache.get(test_dir)
+        assert [c.name for c in first.cases] == [str(i) for i in range(1, 13)]
+        assert first.get("2").expected_norm == "6"
+        assert cache.get(test_dir) is first
+        (data_dir / "lesson_01" / "problem_01" / "test" / "13.in").write_text("1\n1\n", encoding="utf-8")
+        second = cache.get(test_dir)
+        assert second is not first
+        assert second.cases[-1].error == "缺少对应的 .out 文件"
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    def test_memory_ceiling(self, data_dir):
+        """超过内存上限时淘汰最久未使用的题目"""
+        from app.services.judge.fixtures import TestSetCache
+        test_dir = str(data_dir / "lesson_01" / "problem_01" / "test")
+        cache = TestSetCache(max_bytes=10)
+        cache.get(test_dir)
+        assert cache.stats()["problems"] == 0 and cache.stats()["bytes"] == 0
+
+
+class TestAsyncioBackend:
+    """asyncio 子进程执行后端测试类"""
+
+    def test_run_and_timeout(self, tmp_path):
+        """正常执行与超时杀进程"""
+        from app.services.judge.aio import run_file_async
+        file_path = tmp_path / "main.py"
+        file_path.write_text(GOOD_CODE, encoding="utf-8")
+        assert asyncio.run(run_file_async(str(file_path), "4\n5\n"))[:4] == (0, "9\n", "", False)
+        file_path.write_text("while True: pass\n", encoding="utf-8")
+        assert asyncio.run(run_file_async(str(file_path), "", timeout=0.5))[:4] == (-1, "", "Timeout", True)
+
+    def test_submit_without_threads(self, data_dir, monkeypatch):
+        """asyncio 后端下样例执行不经过 worker 池线程"""
+        from app.services.judge import runner, verdict_cache
+        monkeypatch.setattr(runner, "JUDGE_BACKEND", "asyncio")
+        monkeypatch.setattr(verdict_cache, "_cache", verdict_cache.VerdictCache())
+
+        def _no_thread(*args, **kwargs):
+            raise AssertionError("asyncio 后端不应同步执行样例")
+
+        monkeypatch.setattr(runner, "run_file", _no_thread)
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        assert res["passed"] == 12
+
+
+class TestResourceLimits:
+    """运行耗时、峰值内存测量与 TLE/MLE 判定测试类"""
+
+    def _set_limits(self, data_dir, **limits):
+        index_path = data_dir / "index.json"
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        index[0].update(limits)
+        index_path.write_text(json.dumps(index), encoding="utf-8")
+
+    def test_measurements_reported(self, data_dir):
+        """每个样例带耗时与内存，提交汇总最大/总耗时与峰值内存"""
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", GOOD_CODE))
+        first = res["testResults"][0]
+        assert first["verdict"] == "AC"
+        assert first["time_ms"] > 0 and first["memory_kb"] > 0
+        assert res["max_time_ms"] >= first["time_ms"]
+        assert res["total_time_ms"] >= res["max_time_ms"]
+        assert res["max_memory_kb"] >= first["memory_kb"]
+
+    def test_time_limit_exceeded(self, data_dir):
+        """index.json 声明的 CPU 时间限制触发 TLE"""
+        self._set_limits(data_dir, time_limit=0.2)
+        code = GOOD_CODE + "while True: pass\n"
+        res = asyncio.run(problems_service.mock_run_code("lesson_01", "problem_01", code))
+        assert res["testResults"][0]["verdict"] == "TLE"
+        assert res["status"] == "timeout"
+
+    @pytest.mark.parametrize("backend", ["subprocess", "zygote"])
+    def test_memory_limit_exceeded(self, data_dir, monkeypatch, backend):
+        """index.json 声明的内存限制在执行前生效：超限的分配直接失败并判为 MLE"""
+        from app.services.judge import runner
+        monkeypatch.setattr(runner, "JUDGE_BACKEND", backend)
+        self._set_limits(data_dir, memory_limit=64)
+        code = GOOD_CODE + "x = bytearray(128 * 1024 * 1024)\n"
+        res = asyncio.run(problems_service.mock_run_code("lesson_01", "problem_01", code))
+        entry = res["testResults"][0]
+        assert entry["verdict"] == "MLE" and not entry["passed"]
+
+    @pytest.mark.parametrize("backend", ["subprocess", "zygote"])
+    def test_memory_limit_applied_before_run(self, tmp_path, monkeypatch, backend):
+        """超过内存上限的分配在学生代码中直接失败"""
+        from app.services.judge import runner
+        monkeypatch.setattr(runner, "JUDGE_BACKEND", backend)
+        main = tmp_path / "main.py"
+        main.write_text("try:\n    x = bytearray(128 * 1024 * 1024)\n    print('allocated')\n"
+                        "except MemoryError:\n    print('limited')\n", encoding="utf-8")
+        assert runner.run_file(str(main), "", 10).stdout.strip() == "allocated"
+        assert runner.run_file(str(main), "", 10, memory_limit_kb=64 * 1024).stdout.strip() == "limited"
+
+    def test_wait_exit_kills_at_deadline(self):
+        """wait_exit 阻塞等待，截止时间到达时杀掉进程组并回收"""
+        import sys
+        import time
+        from app.services.judge import proc
+        devnull = os.open(os.devnull, os.O_RDWR)
+        try:
+            fast = proc.spawn([sys.executable, "-c", "pass"], devnull, devnull, devnull)
+            slow = proc.spawn([sys.executable, "-c", "import time; time.sleep(30)"], devnull, devnull, devnull)
+        finally:
+            os.close(devnull)
+        assert proc.wait_exit(fast, time.monotonic() + 10)[::2] == (0, False)
+        start = time.monotonic()
+        returncode, rusage, timed_out = proc.wait_exit(slow, start + 0.3)
+        assert timed_out and returncode is None and rusage is not None
+        assert time.monotonic() - start < 5
+
+
+class TestFailFast:
+    """fail-fast 提交测试类"""
+
+    SLOW_WRONG = "import time\na = int(input())\nb = int(input())\nif a == 1:\n    print(0)\nelse:\n    time.sleep(2)\n    print(a + b)\n"
+
+    def test_stop_and_skip(self, data_dir):
+        """第一个样例失败后其余样例被跳过，正在运行的样例被终止"""
+        import time
+        start = time.monotonic()
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", self.SLOW_WRONG, fail_fast=True))
+        assert time.monotonic() - start < 1.5
+        assert res["total"] == 12 and res["passed"] == 0
+        assert res["testResults"][0]["verdict"] == "WA"
+        assert res["skipped"] == 11
+        assert all(t["verdict"] == "skipped" for t in res["testResults"][1:])
+
+    def test_index_default(self, data_dir):
+        """index.json 中的 fail_fast 作为默认值，请求参数可覆盖"""
+        index_path = data_dir / "index.json"
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        index[0]["fail_fast"] = True
+        index_path.write_text(json.dumps(index), encoding="utf-8")
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", WRONG_CODE))
+        assert res["skipped"] > 0
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", WRONG_CODE, fail_fast=False))
+        assert "skipped" not in res and res["total"] == 12
+
+    def test_cancel_kills_running(self, tmp_path):
+        """Workspace.cancel 终止正在运行的子进程"""
+        import threading
+        import time
+        from app.services.judge.workspace import Workspace
+        ws = Workspace("while True: pass\n", root=str(tmp_path))
+        try:
+            threading.Timer(0.3, ws.cancel).start()
+            start = time.monotonic()
+            res = ws.run("", timeout=5)
+            assert time.monotonic() - start < 2 and res.returncode != 0
+            assert ws.run("", timeout=5).returncode == -2
+        finally:
+            ws.close()
+
+
+@pytest.fixture
+def api_client(data_dir, monkeypatch):
+    """带独立内存数据库、独立提交去重表与固定学生身份的 TestClient"""
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.main import app
+    from app.utils.database import Base, get_db
+    from app.utils.security import get_current_active_user
+    from app.models.student_result import StudentResult  # noqa: F401  注册 student_results 表
+    from app.services.judge import dedup
+    monkeypatch.setattr(dedup, "_coalescer", dedup.SubmitCoalescer())
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def _db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    saved = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = _db
+    app.dependency_overrides[get_current_active_user] = lambda: SimpleNamespace(id=1)
+    try:
+        yield TestClient(app), Session
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(saved)
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestSubmitStream:
+    """SSE 流式提交测试类"""
+
+    def test_stage_timer_scoped_to_judging(self, data_dir):
+        """流式提交的计时器不泄漏到调用方的上下文，调用方在两次产出之间记录的阶段不计入本次提交"""
+        from app.services.judge import jobs, metrics
+
+        async def collect():
+            seen = []
+            async for event, data in jobs.iter_submit("lesson_01", "problem_01", GOOD_CODE, debug=True):
+                seen.append(metrics._current.get())
+                with metrics.stage("route_stage"):
+                    pass
+            return seen, data
+
+        seen, summary = asyncio.run(collect())
+        assert len(seen) == 13 and all(t is None for t in seen)
+        assert "total" in summary["timings"] and "route_stage" not in summary["timings"]
+
+    def test_iter_yields_cases_then_summary(self, data_dir):
+        """每个样例一条 case 事件，最后是与 mock_submit_code 相同的汇总"""
+        async def collect():
+            return [e async for e in problems_service.iter_submit_code("lesson_01", "problem_01", GOOD_CODE)]
+
+        events = asyncio.run(collect())
+        assert [e for e, _ in events] == ["case"] * 12 + ["summary"]
+        assert sorted(int(p["test"]) for _, p in events[:-1]) == list(range(1, 13))
+        assert events[-1][1]["passed"] == 12
+
+    def test_stream_route_records_result(self, api_client):
+        """流式接口发送事件并照常记录 StudentResult"""
+        from app.models.student_result import StudentResult
+        client, Session = api_client
+        resp = client.post("/api/problems/lesson_01/problem_01/submit/stream", json={"code": WRONG_CODE})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = _parse_sse(resp.text)
+        assert len([e for e, _ in events if e == "case"]) == 12
+        event, summary = events[-1]
+        assert event == "summary" and summary["passed"] == 0 and "testResults" not in summary
+        from app.services.judge.queue import get_judge_queue
+        assert get_judge_queue().stats()["active"] == 0
+        db = Session()
+        try:
+            row = db.query(StudentResult).filter_by(student_id=1).one()
+            assert row.attempts == 1 and not row.passed
+        finally:
+            db.close()
+
+
+class TestOutputLimit:
+    """输出限制与流式比较测试类"""
+
+    def test_outputs_match_equivalent(self):
+        """流式比较与 normalize_output 的结果一致"""
+        import random
+        from app.services.judge.compare import normalize_output, outputs_match
+
+        def reference(s):
+            lines = [line.rstrip() for line in s.strip().splitlines()]
+            return "\n".join(lines).strip()
+
+        rng = random.Random(0)
+        alphabet = ["a", "b", " ", "\t", "\n", "\r", "\r\n", "\x0b", "\x0c", "\x1c", "\x1f", "\x85", " ", "　"]
+        for _ in range(20000):
+            s = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 10)))
+            t = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 10)))
+            assert normalize_output(s) == reference(s)
+            assert outputs_match(s, reference(t)) == (reference(s) == reference(t))
+
+    def test_infinite_print_is_ole(self, data_dir, monkeypatch):
+        """无限输出在达到上限后被终止并判为 OLE"""
+        from app.services.judge import runner
+        monkeypatch.setattr(runner, "OUTPUT_LIMIT", 64 * 1024)
+        code = GOOD_CODE + "while True:\n    print('x' * 100)\n"
+        res = asyncio.run(problems_service.mock_run_code("lesson_01", "problem_01", code))
+        entry = res["testResults"][0]
+        assert entry["verdict"] == "OLE" and not entry["passed"]
+        assert res["error"] == "输出超出限制"
+        assert len(entry["actual"]) <= problems_service.OLE_PREVIEW_CHARS
+
+    def test_asyncio_backend_ole(self, tmp_path, monkeypatch):
+        """asyncio 后端同样限制输出大小"""
+        from app.services.judge import runner
+        from app.services.judge.aio import run_file_async
+        monkeypatch.setattr(runner, "OUTPUT_LIMIT", 64 * 1024)
+        file_path = tmp_path / "main.py"
+        file_path.write_text("while True:\n    print('x' * 100)\n", encoding="utf-8")
+        res = asyncio.run(run_file_async(str(file_path), ""))
+        assert res.output_exceeded and not res.timed_out
+        assert len(res.stdout) <= 64 * 1024
+
+
+class TestJobQueue:
+    """持久化任务队列与独立 worker 测试类"""
+
+    @pytest.fixture
+    def queue_mode(self, tmp_path, monkeypatch):
+        from app.services.judge import jobs
+        monkeypatch.setattr(jobs, "QUEUE_DB", str(tmp_path / "jobs.db"))
+        monkeypatch.setattr(jobs, "JUDGE_MODE", "queue")
+        return jobs
+
+    def test_claim_is_exclusive(self, queue_mode):
+        """同一个任务只会被一个 worker 领取，按入队顺序领取"""
+        store_a = queue_mode.JobStore(queue_mode.QUEUE_DB)
+        store_b = queue_mode.JobStore(queue_mode.QUEUE_DB)
+        first = store_a.enqueue("run", {"n": 1})
+        second = store_a.enqueue("run", {"n": 2})
+        job = store_a.claim("a")
+        assert job.id == first and job.payload == {"n": 1}
+        assert store_b.claim("b").id == second
+        assert store_b.claim("b") is None
+        store_a.finish(first, {"status": "success"})
+        assert store_b.get(first) == {"status": "done", "result": {"status": "success"}}
+
+    def test_stale_job_requeued(self, queue_mode):
+        """失联 worker 的任务被放回队列，重试次数用尽后记为失败"""
+        store = queue_mode.JobStore(queue_mode.QUEUE_DB)
+        job_id = store.enqueue("run", {})
+        for _ in range(queue_mode.MAX_ATTEMPTS - 1):
+            store.claim("dead")
+            assert store.requeue_stale(stale_after=-1) == 1
+            assert store.get(job_id)["status"] == "queued"
+        store.claim("dead")
+        store.requeue_stale(stale_after=-1)
+        assert store.get(job_id)["status"] == "failed"
+
+    def test_route_judging_through_worker(self, data_dir, queue_mode):
+        """queue 模式下评测请求写入任务表，由 worker 执行并写回结果"""
+        from app.services.judge.worker import JudgeWorker
+
+        async def scenario():
+            stop = asyncio.Event()
+            worker = JudgeWorker(concurrency=2)
+            task = asyncio.ensure_future(worker.run(stop))
+            try:
+                submit = await queue_mode.judge("submit", {"lesson": "lesson_01", "problem": "problem_01", "code": GOOD_CODE})
+                run = await queue_mode.judge("run", {"lesson": "lesson_01", "problem": "problem_01", "code": WRONG_CODE})
+            finally:
+                stop.set()
+                await task
+            return submit, run, worker.processed
+
+        submit, run, processed = asyncio.run(scenario())
+        assert submit["passed"] == 12 and run["result"] == "样例未通过"
+        assert processed == 2
+        assert queue_mode.get_job_store().stats()["done"] == 2
+
+    def test_cancelled_wait_abandons_and_worker_purges(self, queue_mode, monkeypatch):
+        """等待方被取消时撤销排队中的任务；worker 启动时删除超过保留时长的已完成任务"""
+        from app.services.judge.worker import JudgeWorker
+        store = queue_mode.get_job_store()
+        done_id = store.enqueue("run", {})
+        store.claim("w")
+        store.finish(done_id, {"status": "success"})
+
+        async def cancel_wait():
+            task = asyncio.ensure_future(queue_mode.run_job("run", {}))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_wait())
+        assert store.stats() == {"queued": 0, "running": 0, "done": 1, "failed": 1}
+
+        monkeypatch.setattr(queue_mode, "JOB_RETENTION", -1)
+
+        async def purge_once():
+            stop = asyncio.Event()
+            task = asyncio.ensure_future(JudgeWorker(concurrency=1).run(stop))
+            await asyncio.sleep(0.2)
+            stop.set()
+            await task
+
+        asyncio.run(purge_once())
+        assert store.get(done_id) is None and sum(store.stats().values()) == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="zygote/batched 后端仅支持 POSIX")
+class TestExecutionBackends:
+    """各执行后端语义一致性测试类"""
+
+    @pytest.mark.parametrize("name", ["subprocess", "asyncio", "zygote", "batched"])
+    def test_same_semantics(self, name, monkeypatch):
+        """同一份代码在各后端上的输出、退出码、异常与超时表现一致"""
+        from app.services.judge import backends, runner
+        from app.services.judge.workspace import Workspace
+        monkeypatch.setattr(runner, "JUDGE_BACKEND", name)
+        assert backends.get_backend().name == name
+
+        async def scenario():
+            with Workspace("import sys\nn = int(input())\nif n < 0:\n    sys.exit(3)\nif n == 0:\n    1/0\n"
+                           "if n > 100:\n    while True: pass\nprint(n * 2)\n") as ws:
+                return await asyncio.gather(
+                    ws.run_async("21\n"), ws.run_async("-1\n"), ws.run_async("0\n"), ws.run_async("101\n", timeout=0.5),
+                )
+
+        ok, exited, crashed, looped = asyncio.run(scenario())
+        assert ok[:4] == (0, "42\n", "", False)
+        assert exited.returncode == 3
+        assert crashed.returncode == 1 and "ZeroDivisionError" in crashed.stderr
+        assert looped.timed_out
+
+
+class TestSyntaxPrecheck:
+    """语法预检测试类"""
+
+    @pytest.fixture
+    def no_workspace(self, monkeypatch):
+        def _fail(*args, **kwargs):
+            raise AssertionError("语法错误的代码不应创建工作目录")
+
+        monkeypatch.setattr(problems_service, "Workspace", _fail)
+
+    def test_check_syntax(self):
+        """返回出错的行、列与信息；只编译不执行"""
+        from app.services.judge.precheck import check_syntax
+        assert check_syntax("import os\nos._exit(1)\n") is None
+        err = check_syntax("a = 1\nprint(a +)\n")
+        assert err.line == 2 and err.column == 10
+        assert err.message.startswith("SyntaxError")
+        assert "main.py" in err.detail and err.summary().startswith("编译错误：第 2 行")
+        assert check_syntax("if True:\nprint(1)\n").message.startswith("IndentationError")
+        assert check_syntax("return 1\n").line == 1
+        assert check_syntax("print(1)\x00\n") is not None
+
+    def test_submit_compile_error(self, data_dir, no_workspace):
+        """提交的所有样例判为 CE，不创建工作目录与子进程"""
+        res = asyncio.run(problems_service.mock_submit_code("lesson_01", "problem_01", "print(\n"))
+        assert res["total"] == 12 and res["passed"] == 0
+        assert res["compile_error"]["line"] == 1
+        assert {t["verdict"] for t in res["testResults"]} == {"CE"}
+        assert res["testResults"][0]["test"] == "1" and "SyntaxError" in res["testResults"][0]["stderr"]
+
+    def test_run_and_check_compile_error(self, data_dir, no_workspace):
+        """运行样例与教师检测同样走预检"""
+        res = asyncio.run(problems_service.mock_run_code("lesson_01", "problem_01", "for i in range(3)\n    print(i)\n"))
+        assert res["testResults"][0]["verdict"] == "CE"
+        assert res["compile_error"]["line"] == 1
+        res = problems_service.run_code_against_tests("x = (\n", [{"input": "", "output": "1"}] * 2)
+        assert res["total"] == 2 and [t["verdict"] for t in res["testResults"]] == ["CE", "CE"]
+
+
+class TestCasePriority:
+    """失败样例优先执行测试类"""
+
+    FAIL_ON_7 = "a = int(input())\nb = int(input())\nprint(0 if a == 7 else a + b)\n"
+
+    def test_priority_runs_first_results_in_order(self, data_dir, monkeypatch):
+        """priority 中的样例先执行（fail-fast 下其余样例被跳过），结果仍按编号排列"""
+        monkeypatch.setattr(problems_service, "get_engine", lambda: JudgeEngine(workers=1))
+
+        def submit(priority):
+            # 代码带不同注释，避免命中结果缓存
+            return asyncio.run(problems_service.mock_submit_code(
+                "lesson_01", "problem_01", f"# {priority}\n" + self.FAIL_ON_7, fail_fast=True, priority=priority))
+
+        res = submit(None)
+        assert res["passed"] == 6 and res["skipped"] == 5
+        res = submit(["7"])
+        assert [t["test"] for t in res["testResults"]] == [str(i) for i in range(1, 13)]
+        assert res["passed"] == 0 and res["skipped"] == 11
+        assert not res["testResults"][6]["passed"] and not res["testResults"][6].get("skipped")
+
+    def test_history_recorded_and_ordered(self, api_client):
+        """提交后记录学生上次失败的样例与各样例失败率，据此给出执行顺序"""
+        from app.services.case_history_service import get_case_priority, record_case_results
+        client, Session = api_client
+        resp = client.post("/api/problems/lesson_01/problem_01/submit", json={"code": self.FAIL_ON_7})
+        assert resp.status_code == 200 and resp.json()["passed"] == 11
+        db = Session()
+        try:
+            assert get_case_priority(db, 1, "lesson_01", "problem_01") == ["7"]
+            # 其他学生的提交：样例 3 失败两次、样例 5 失败一次；学生 1 上次失败的样例 7 仍排在最前
+            fake = lambda failed: {"testResults": [{"test": str(i), "passed": i not in failed} for i in range(1, 13)]}
+            record_case_results(db, 2, "lesson_01", "problem_01", fake({3, 5}))
+            record_case_results(db, 3, "lesson_01", "problem_01", fake({3}))
+            db.commit()
+            assert get_case_priority(db, 1, "lesson_01", "problem_01") == ["7", "3", "5"]
+            assert get_case_priority(db, 3, "lesson_01", "problem_01")[:1] == ["3"]
+            # fail-fast 跳过的样例没有执行，沿用上次的失败记录
+            skipped = {"testResults": [{"test": "1", "passed": False}] +
+                       [{"test": str(i), "passed": False, "skipped": True} for i in range(2, 13)]}
+            record_case_results(db, 2, "lesson_01", "problem_01", skipped)
+            db.commit()
+            assert get_case_priority(db, 2, "lesson_01", "problem_01")[:3] == ["1", "3", "5"]
+        finally:
+            db.close()
+
+
+    def test_stats_skip_cache_and_survive_errors(self, api_client, monkeypatch):
+        """命中结果缓存的提交不计入样例统计；样例统计写入失败不回滚提交记录"""
+        from app.api.problems import routes
+        from app.models.case_history import ProblemCaseStat
+        from app.models.student_result import StudentResult
+        from app.services.judge import dedup, verdict_cache
+        client, Session = api_client
+        monkeypatch.setattr(verdict_cache, "_cache", verdict_cache.VerdictCache())
+        url = "/api/problems/lesson_01/problem_01/submit"
+        assert client.post(url, json={"code": self.FAIL_ON_7}).json().get("cached") is None
+        # 换一个去重表，使第二次提交走到结果缓存而不是合并到第一次
+        monkeypatch.setattr(dedup, "_coalescer", dedup.SubmitCoalescer())
+        assert client.post(url, json={"code": self.FAIL_ON_7}).json()["cached"] is True
+
+        def broken(*args, **kwargs):
+            raise RuntimeError("stats unavailable")
+        monkeypatch.setattr(routes, "record_case_results", broken)
+        assert client.post(url, json={"code": "print(0)\n"}).status_code == 200
+        db = Session()
+        try:
+            assert db.query(StudentResult).one().attempts == 3
+            stat = db.query(ProblemCaseStat).filter(ProblemCaseStat.case == "7").one()
+            assert stat.runs == 1 and stat.failures == 1
+        finally:
+            db.close()
+
+class TestStageMetrics:
+    """分阶段计时测试类"""
+
+    def test_histogram_quantiles(self):
+        """分位数按桶上限估计，不超过最大值；桶计数为累计值"""
+        from app.services.judge.metrics import Histogram
+        h = Histogram()
+        for ms in [0.05] * 90 + [7] * 9 + [40]:
+            h.observe(ms)
+        snap = h.snapshot()
+        assert snap["count"] == 100 and snap["max_ms"] == 40
+        assert snap["p50_ms"] == 0.1 and snap["p95_ms"] == 10 and snap["p99_ms"] == 10
+        assert h.quantile(1.0) == 40
+        assert snap["buckets"]["0.1"] == 90 and snap["buckets"]["+Inf"] == 100
+
+    def test_debug_timings_and_metrics_endpoint(self, api_client):
+        """debug 时结果附带各阶段耗时，样例级阶段按样例数计次；监控接口返回直方图"""
+        from app.services.judge.dedup import get_submit_coalescer
+        client, _ = api_client
+        # 关闭提交去重，使重复提交走到结果缓存
+        get_submit_coalescer().window = 0
+        resp = client.post("/api/problems/lesson_01/problem_01/submit", json={"code": GOOD_CODE, "debug": True})
+        timings = resp.json()["timings"]
+        for name in ("precheck", "fixtures", "verdict_cache", "mkdtemp", "write", "compile", "cleanup", "total"):
+            assert timings[name]["count"] == 1, name
+        assert timings["execute"]["count"] == 12 and timings["compare"]["count"] == 12
+        assert timings["worker_wait"]["count"] == 12
+        assert timings["total"]["total_ms"] >= timings["execute"]["max_ms"]
+
+        # 未开启 debug 时不附带；命中结果缓存时只有前置阶段
+        resp = client.post("/api/problems/lesson_01/problem_01/submit", json={"code": GOOD_CODE})
+        assert "timings" not in resp.json()
+        resp = client.post("/api/problems/lesson_01/problem_01/submit", json={"code": GOOD_CODE, "debug": True})
+        assert "execute" not in resp.json()["timings"]
+
+        stages = client.get("/api/problems/judge/metrics").json()["stages"]
+        assert stages["execute"]["count"] >= 12
+        assert set(stages["execute"]) >= {"p50_ms", "p95_ms", "buckets"}
+
+
+class TestSubmitDedup:
+    """重复提交去重测试类"""
+
+    def test_concurrent_duplicates_judged_once(self):
+        """评测进行中到达的相同请求等待并共享结果；leader 放弃时由等待者重新评测"""
+        from app.services.judge.dedup import SubmitCoalescer, submit_key
+
+        async def scenario():
+            c = SubmitCoalescer(window=60)
+            calls = 0
+
+            async def judge():
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.01)
+                return {"passed": calls}
+
+            key = submit_key(1, "lesson_01", "problem_01", "print(1)\n", None)
+            assert key == submit_key(1, "lesson_01", "problem_01", "print(1)\r\n", None)
+            assert key != submit_key(2, "lesson_01", "problem_01", "print(1)", None)
+            results = await asyncio.gather(*[c.run(key, judge) for _ in range(3)])
+            # 窗口内的后续重复请求直接复用结果
+            again = await c.run(key, judge)
+
+            other = submit_key(1, "lesson_01", "problem_01", "print(2)", None)
+
+            async def failing():
+                await asyncio.sleep(0.01)
+                raise RuntimeError("boom")
+
+            first = asyncio.create_task(c.run(other, failing))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(c.run(other, judge))
+            with pytest.raises(RuntimeError):
+                await first
+            retried = await second
+            return calls, results, again, retried, c.stats()
+
+        calls, results, again, retried, stats = asyncio.run(scenario())
+        assert [r for r, _ in results] == [{"passed": 1}] * 3
+        assert [shared for _, shared in results] == [False, True, True]
+        assert again == ({"passed": 1}, True)
+        assert retried == ({"passed": 2}, False) and calls == 2
+        assert stats["in_flight"] == 0 and stats["abandoned"] == 1
+
+    def test_route_counts_attempt_once(self, api_client):
+        """重复提交返回同一结果并只记一次 attempts；Idempotency-Key 相同时即使代码不同也复用"""
+        from app.models.student_result import StudentResult
+        client, Session = api_client
+        url = "/api/problems/lesson_01/problem_01/submit"
+        first = client.post(url, json={"code": WRONG_CODE})
+        second = client.post(url, json={"code": WRONG_CODE})
+        assert second.json() == first.json()
+        assert "x-idempotent-replay" not in first.headers
+        assert second.headers["x-idempotent-replay"] == "true"
+        stream = client.post(url + "/stream", json={"code": WRONG_CODE})
+        assert _parse_sse(stream.text)[-1][1]["passed"] == 0
+
+        headers = {"Idempotency-Key": "click-1"}
+        keyed = client.post(url, json={"code": GOOD_CODE}, headers=headers)
+        retry = client.post(url, json={"code": WRONG_CODE}, headers=headers)
+        assert keyed.json()["passed"] == 12 and retry.json() == keyed.json()
+        db = Session()
+        try:
+            row = db.query(StudentResult).filter_by(student_id=1).one()
+            assert row.attempts == 2 and row.passed
+        finally:
+            db.close()
+
+
+def _free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url, proc=None, timeout=30):
+    import time
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"进程已退出: {url}")
+        try:
+            if httpx.get(url, timeout=1, trust_env=False).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"等待 {url} 超时")
+
+
+class TestRemoteWorkers:
+    """远程 HTTP 评测 worker 测试类（API 与 worker 均在本机启动）"""
+
+    @pytest.fixture
+    def cluster(self, data_dir, tmp_path, monkeypatch):
+        """本进程线程中启动只含题目路由的 API，另起一个 worker 进程（没有题库，测试集从 API 拉取）"""
+        import sys
+        import subprocess
+        import threading
+        import uvicorn
+        from fastapi import FastAPI
+        from app.api.problems.routes import router
+        from app.services.judge import jobs, fixtures
+
+        # 独立的测试集缓存，保证 worker 拉取的是临时题库中的测试集
+        monkeypatch.setattr(fixtures, "_cache", fixtures.TestSetCache())
+        api = FastAPI()
+        api.include_router(router, prefix="/api")
+        api_port, worker_port = _free_port(), _free_port()
+        server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=api_port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = {**os.environ, "JUDGE_WORKER_TOKEN": "", "JUDGE_BACKEND": "subprocess"}
+        worker = subprocess.Popen(
+            [sys.executable, "-m", "app.services.judge.http_worker", "--host", "127.0.0.1", "--port", str(worker_port),
+             "--api-url", f"http://127.0.0.1:{api_port}", "--concurrency", "2"],
+            cwd=backend_root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_http(f"http://127.0.0.1:{api_port}/api/problems/index")
+            _wait_http(f"http://127.0.0.1:{worker_port}/health", worker)
+            monkeypatch.setattr(jobs, "JUDGE_MODE", "remote")
+            yield f"http://127.0.0.1:{worker_port}", worker
+        finally:
+            worker.kill()
+            worker.wait()
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    def test_failover_and_local_fallback(self, cluster):
+        """跳过不可达的 worker；worker 全部失联后回退到本进程评测"""
+        from app.services.judge import jobs, remote
+        worker_url, worker = cluster
+        dead_url = f"http://127.0.0.1:{_free_port()}"
+        pool = remote.RemotePool([dead_url, worker_url], token="", health_interval=60)
+        remote._pool, saved = pool, remote._pool
+        payload = {"lesson": "lesson_01", "problem": "problem_01"}
+        try:
+            submit = asyncio.run(jobs.judge("submit", {**payload, "code": GOOD_CODE}))
+            run = asyncio.run(jobs.judge("run", {**payload, "code": WRONG_CODE}))
+            check = asyncio.run(jobs.judge("check", {"code": GOOD_CODE, "tests": [{"input": "1\n2\n", "output": "3\n"}]}))
+            stats = pool.stats()
+
+            worker.kill()
+            worker.wait()
+            fallback = asyncio.run(jobs.judge("submit", {**payload, "code": WRONG_CODE}))
+        finally:
+            remote._pool = saved
+
+        assert submit["passed"] == 12 and run["result"] == "样例未通过" and check["passed"] == 1
+        dead, live = stats["workers"]
+        assert dead["healthy"] is False and live["healthy"] is True
+        assert live["completed"] == 3 and stats["fallbacks"] == 0
+        assert fallback["passed"] == 0 and fallback["total"] == 12
+        assert pool.stats()["fallbacks"] == 1 and pool.stats()["workers"][1]["healthy"] is False
+
+    def test_worker_fetches_test_set_once(self, cluster, data_dir):
+        """worker 按指纹拉取一次测试集，之后直接使用缓存；测试数据变化后拉取新指纹"""
+        import httpx
+        from app.services.judge import remote
+        worker_url, _ = cluster
+        pool = remote.RemotePool([worker_url], token="", health_interval=60)
+        payload = {"lesson": "lesson_01", "problem": "problem_01"}
+
+        first = asyncio.run(pool.judge("submit", {**payload, "code": GOOD_CODE}))
+        second = asyncio.run(pool.judge("submit", {**payload, "code": WRONG_CODE}))
+        assert first["passed"] == 12 and second["passed"] == 0
+        health = httpx.get(f"{worker_url}/health", trust_env=False).json()
+        assert health["test_sets"]["fetches"] == 1 and health["completed"] == 2
+
+        (data_dir / "lesson_01" / "problem_01" / "test" / "1.out").write_text("wrong\n", encoding="utf-8")
+        third = asyncio.run(pool.judge("submit", {**payload, "code": GOOD_CODE}))
+        assert third["passed"] == 11
+        health = httpx.get(f"{worker_url}/health", trust_env=False).json()
+        assert health["test_sets"]["fetches"] == 2
+
+
+    def test_worker_requires_token_off_loopback(self):
+        """未配置令牌时：拒绝监听非本机地址，也拒绝非本机客户端的请求"""
+        from fastapi.testclient import TestClient
+        from app.services.judge import http_worker, remote
+        with pytest.raises(SystemExit):
+            http_worker.main(["--host", "0.0.0.0", "--api-url", "http://127.0.0.1:1", "--token", ""])
+        assert remote.is_loopback("127.0.0.1") and remote.is_loopback("::1") and not remote.is_loopback("10.0.0.2")
+
+        open_app = http_worker.create_app("http://127.0.0.1:1", "", 1, "w")
+        assert TestClient(open_app, client=("10.0.0.2", 50000)).get("/health").status_code == 403
+        assert TestClient(open_app, client=("127.0.0.1", 50000)).get("/health").status_code == 200
+        secured = TestClient(http_worker.create_app("http://127.0.0.1:1", "s3cret", 1, "w"), client=("10.0.0.2", 50000))
+        assert secured.get("/health").status_code == 401
+        assert secured.get("/health", headers={remote.TOKEN_HEADER: "s3cret"}).status_code == 200
+
+class TestCourseStatus:
+    """课程题目通过状态接口测试类"""
+
+    def test_status_single_query(self, api_client):
+        """按题目路径返回当前学生的提交结果，不混入其他学生与其他课次"""
+        from app.models.student_result import StudentResult
+        client, Session = api_client
+        db = Session()
+        try:
+            db.add_all([
+                StudentResult(student_id=1, lesson="lesson_01", problem="problem_01", attempts=3, passed=True),
+                StudentResult(student_id=2, lesson="lesson_01", problem="problem_01", attempts=9, passed=False),
+                StudentResult(student_id=1, lesson="lesson_02", problem="problem_01", attempts=1, passed=False),
+            ])
+            db.commit()
+        finally:
+            db.close()
+        resp = client.get("/api/problems/courses/lesson_01/status")
+        assert resp.status_code == 200
+        assert resp.json() == {"status": {"lesson_01/problem_01": {"passed": True, "attempts": 3}}}
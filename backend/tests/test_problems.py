@@ -0,0 +1,361 @@
+"""
+题库（problems）相关的单元测试
+"""
+import os
+import json
+import pytest
+from app.services import problems_service
+from app.services.problem_catalog import ProblemCatalog
+
+
+def _write_json(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def problems_dir(tmp_path, monkeypatch):
+    """两门课程、三道题的临时题库"""
+    index = [
+        {"lesson": 1, "problem": 1, "title": "A", "path": "lesson_01/problem_01", "has_test": True},
+        {"lesson": 1, "problem": 2, "title": "B", "path": "lesson_01/problem_02", "has_test": False},
+        {"lesson": 2, "problem": 1, "title": "C", "path": "lesson_02/problem_01", "has_test": True},
+    ]
+    _write_json(tmp_path / "index.json", index)
+    monkeypatch.setattr(problems_service, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+class TestProblemCatalog:
+    """题库目录缓存测试类"""
+
+    def test_indexed_lookups(self, problems_dir):
+        """按 path、课程、(lesson, problem) 查找；未变化时不重新解析"""
+        catalog = ProblemCatalog(str(problems_dir))
+        snap = catalog.snapshot()
+        assert catalog.entry("lesson_01/problem_02")["title"] == "B"
+        assert catalog.entry("lesson_09/problem_01") is None
+        assert [e["title"] for e in catalog.course_entries("lesson_01")] == ["A", "B"]
+        assert snap.by_key[("2", "1")]["path"] == "lesson_02/problem_01"
+        assert snap.course_ids == ("lesson_01", "lesson_02")
+        assert catalog.snapshot() is snap and catalog.reloads == 1
+
+    def test_reload_on_change(self, problems_dir):
+        """index.json / courses.json 变化后重新加载；格式不正确的 courses.json 回退到 index.json 推断"""
+        assert [c["id"] for c in problems_service.get_courses()] == ["lesson_01", "lesson_02"]
+        assert problems_service.get_courses()[0]["name"] == "课程一"
+        _write_json(problems_dir / "courses.json", [{"id": "lesson_02", "name": "进阶"}])
+        assert problems_service.get_courses() == [{"id": "lesson_02", "name": "进阶"}]
+        _write_json(problems_dir / "courses.json", [{"id": "lesson_02"}])
+        assert len(problems_service.get_courses()) == 2
+
+        index = json.loads((problems_dir / "index.json").read_text(encoding="utf-8"))
+        index.append({"lesson": 2, "problem": 2, "title": "D", "path": "lesson_02/problem_02"})
+        _write_json(problems_dir / "index.json", index)
+        assert [p["title"] for p in problems_service.get_course_problems("lesson_02")] == ["C", "D"]
+        assert problems_service._find_index_entry("lesson_02/problem_02")["title"] == "D"
+
+    def test_writes_visible_immediately(self, problems_dir):
+        """创建、删除题目后立即反映在目录中"""
+        res = problems_service.create_problem("lesson_02", "新题", tests=[{"input": "", "output": ""}])
+        assert res["status"] == "success"
+        titles = [p["title"] for p in problems_service.get_course_problems("lesson_02")]
+        assert titles[-1] == "新题"
+        problems_service.delete_problem("lesson_02", res["problem"])
+        assert problems_service._find_index_entry(res["path"]) is None
+
+    def test_missing_index(self, tmp_path, monkeypatch):
+        """没有 index.json 时按目录扫描"""
+        (tmp_path / "lesson_03" / "problem_01").mkdir(parents=True)
+        monkeypatch.setattr(problems_service, "DATA_DIR", str(tmp_path))
+        assert problems_service.load_index() is None
+        assert problems_service.get_courses() == [{"id": "lesson_03", "name": "课程三"}]
+        assert problems_service.get_course_problems("lesson_03")[0]["problem"] == "problem_01"
+
+
+class TestCatalogJournal:
+    """题库写入（文件锁、变更日志与合并）测试类"""
+
+    def test_concurrent_create_unique_numbers(self, problems_dir):
+        """多线程同时创建题目：编号不重复，条目全部写入"""
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda i: problems_service.create_problem("lesson_03", f"T{i}"), range(12)))
+        assert all(r["status"] == "success" for r in results)
+        assert len({r["problem"] for r in results}) == 12
+        assert {p["title"] for p in problems_service.get_course_problems("lesson_03")} == {f"T{i}" for i in range(12)}
+
+    def test_journal_replay_and_compaction(self, problems_dir):
+        """写入只追加日志；达到阈值后合并回 index.json / courses.json 并删除日志"""
+        catalog = ProblemCatalog(str(problems_dir), compact_every=3)
+        catalog.append({"op": "put_course", "course": {"id": "lesson_02", "name": "进阶"}})
+        catalog.append({"op": "remove_problem", "path": "lesson_01/problem_02"})
+        journal = problems_dir / ".catalog.journal"
+        assert journal.exists()
+        assert len(json.loads((problems_dir / "index.json").read_text(encoding="utf-8"))) == 3
+        assert catalog.entry("lesson_01/problem_02") is None
+        assert catalog.snapshot().journal_entries == 2
+
+        catalog.append({"op": "put_problem", "entry": {"lesson": 2, "problem": 2, "title": "D", "path": "lesson_02/problem_02"}})
+        assert not journal.exists() and catalog.compactions == 1
+        index = json.loads((problems_dir / "index.json").read_text(encoding="utf-8"))
+        assert [it["path"] for it in index] == ["lesson_01/problem_01", "lesson_02/problem_01", "lesson_02/problem_02"]
+        courses = json.loads((problems_dir / "courses.json").read_text(encoding="utf-8"))
+        assert courses == [{"id": "lesson_02", "name": "进阶"}]
+        assert catalog.snapshot().journal_entries == 0
+
+    def test_replay_idempotent_after_crash(self, problems_dir):
+        """合并后日志未删除（崩溃）时重复重放不产生重复条目；写了一半的最后一行被忽略"""
+        catalog = ProblemCatalog(str(problems_dir), compact_every=0)
+        ops = [
+            {"op": "put_problem", "entry": {"lesson": 2, "problem": 2, "title": "D", "path": "lesson_02/problem_02"}},
+            {"op": "remove_course_problems", "course": "lesson_01"},
+        ]
+        catalog.append(*ops)
+        journal = (problems_dir / ".catalog.journal").read_text(encoding="utf-8")
+        catalog.compact()
+        (problems_dir / ".catalog.journal").write_text(journal + '{"op": "remove_pro', encoding="utf-8")
+        assert [it["path"] for it in catalog.snapshot().index] == ["lesson_02/problem_01", "lesson_02/problem_02"]
+        assert catalog.snapshot().journal_entries == 2
+
+
+    def test_put_course_keeps_order_and_corrupt_courses_rejected(self, problems_dir, monkeypatch):
+        """同 id 的课程原位替换；courses.json 无法解析时拒绝创建课程；compact_catalogs 合并日志"""
+        from app.services import problem_catalog
+        monkeypatch.setattr(problem_catalog, "_catalogs", {})
+        _write_json(problems_dir / "courses.json", [{"id": "lesson_01", "name": "一"}, {"id": "lesson_02", "name": "二"}])
+        catalog = problem_catalog.get_problem_catalog(str(problems_dir))
+        catalog.append({"op": "put_course", "course": {"id": "lesson_01", "name": "入门"}})
+        assert [c["name"] for c in catalog.snapshot().courses] == ["入门", "二"]
+        problem_catalog.compact_catalogs()
+        assert not (problems_dir / ".catalog.journal").exists()
+        assert json.loads((problems_dir / "courses.json").read_text(encoding="utf-8"))[0]["name"] == "入门"
+
+        (problems_dir / "courses.json").write_text("[{", encoding="utf-8")
+        res = problems_service.create_course("lesson_09", "新课")
+        assert res["status"] == "error"
+        assert (problems_dir / "courses.json").read_text(encoding="utf-8") == "[{"
+        assert not (problems_dir / ".catalog.journal").exists()
+
+@pytest.fixture
+def db_catalog(problems_dir, monkeypatch):
+    """使用内存数据库目录的题库（PROBLEM_CATALOG_BACKEND=db）"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from app.services import problem_catalog
+    from app.services.problem_catalog_db import DbProblemCatalog
+
+    (problems_dir / "lesson_01" / "problem_01" / "test").mkdir(parents=True)
+    (problems_dir / "lesson_01" / "problem_01" / "test" / "1.in").write_text("1\n")
+    (problems_dir / "lesson_01" / "problem_01" / "test" / "1.out").write_text("1\n")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    catalog = DbProblemCatalog(str(problems_dir), engine=engine)
+    monkeypatch.setattr(problem_catalog, "_catalogs", {str(problems_dir): catalog})
+    return catalog
+
+
+class TestDbCatalog:
+    """数据库题库目录测试类"""
+
+    def test_import_and_queries(self, db_catalog, problems_dir):
+        """首次访问时自动导入；按课程、path 查询与整表快照和文件目录一致"""
+        _write_json(problems_dir / "courses.json", [{"id": "lesson_01", "name": "入门"}])
+        file_snap = ProblemCatalog(str(problems_dir)).snapshot()
+        assert [p["title"] for p in problems_service.get_course_problems("lesson_01")] == ["A", "B"]
+        assert problems_service._find_index_entry("lesson_02/problem_01")["title"] == "C"
+        assert problems_service.load_index() == file_snap.index
+        assert problems_service.get_courses() == [{"id": "lesson_01", "name": "入门"}]
+        assert problems_service.get_index_by_key()[("1", "2")]["path"] == "lesson_01/problem_02"
+        meta = db_catalog.test_set_meta("lesson_01/problem_01")
+        assert meta["case_count"] == 1 and meta["bytes"] == 4
+        assert db_catalog.test_set_meta("lesson_01/problem_02") is None
+
+    def test_indexed_queries_cached_by_version(self, db_catalog, problems_dir):
+        """按 path、课程、(lesson, problem) 的查询走索引而不加载整表快照，结果按版本号缓存；
+        其他进程的写入在下次检查版本号后可见"""
+        from app.services.problem_catalog_db import DbProblemCatalog
+        db_catalog.check_interval = 3600
+        assert db_catalog.entry("lesson_01/problem_01")["title"] == "A"
+        assert [p["title"] for p in db_catalog.course_entries("lesson_01")] == ["A", "B"]
+        assert problems_service.find_index_entry_by_key(1, 2)["path"] == "lesson_01/problem_02"
+        assert db_catalog.entry_by_key("9", "9") is None
+        assert db_catalog._snapshot is None
+        queries = db_catalog.queries
+        assert db_catalog.entry("lesson_01/problem_01")["title"] == "A"
+        assert db_catalog.queries == queries and db_catalog.query_hits == 1
+
+        other = DbProblemCatalog(str(problems_dir), engine=db_catalog._sessions.kw["bind"])
+        other.append({"op": "remove_problem", "path": "lesson_01/problem_01"})
+        assert db_catalog.entry("lesson_01/problem_01")["title"] == "A"
+        db_catalog.check_interval = 0
+        assert db_catalog.entry("lesson_01/problem_01") is None
+        assert [p["title"] for p in db_catalog.course_entries("lesson_01")] == ["B"]
+        assert db_catalog.test_set_meta("lesson_01/problem_01") is None
+
+    def test_writes_and_export(self, db_catalog, problems_dir):
+        """写入只更新数据库；导出后 index.json / courses.json 与数据库一致"""
+        from app.services.problem_catalog_db import export_catalog
+        before = (problems_dir / "index.json").read_text(encoding="utf-8")
+        res = problems_service.create_problem("lesson_01", "新题", tests=[{"input": "2", "output": "2"}])
+        assert res["problem"] == "problem_03"
+        assert problems_service.create_course("lesson_05", "课程五")["status"] == "success"
+        assert problems_service.create_course("lesson_05", "重复")["status"] == "error"
+        problems_service.delete_course("lesson_02")
+        assert (problems_dir / "index.json").read_text(encoding="utf-8") == before
+        assert db_catalog.test_set_meta(res["path"])["case_count"] == 1
+        assert [p["title"] for p in problems_service.get_course_problems("lesson_01")] == ["A", "B", "新题"]
+        assert problems_service.get_course_problems("lesson_02") == []
+
+        export_catalog(str(problems_dir), db_catalog._sessions)
+        exported = ProblemCatalog(str(problems_dir)).snapshot()
+        assert [it["path"] for it in exported.index] == ["lesson_01/problem_01", "lesson_01/problem_02", res["path"]]
+        assert exported.courses == [{"id": "lesson_05", "name": "课程五"}]
+
+
+@pytest.fixture
+def http_client(problems_dir, tmp_path_factory, monkeypatch):
+    """题面、资源与索引接口的测试客户端；压缩缓存写入临时目录"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.utils import http_cache
+    from app.services import markdown_render
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_DIR", str(tmp_path_factory.mktemp("http_cache")))
+    monkeypatch.setattr(markdown_render, "_cache", markdown_render.MarkdownRenderCache())
+    prob = problems_dir / "lesson_01" / "problem_01"
+    prob.mkdir(parents=True)
+    (prob / "README.md").write_text("# 题目\n" + "输入两个整数。\n" * 100, encoding="utf-8")
+    (prob / "dop.png").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 64)
+    return TestClient(app)
+
+
+class TestHttpCaching:
+    """题面、资源与索引的 HTTP 缓存测试类"""
+
+    def test_markdown_etag_and_gzip(self, http_client, problems_dir):
+        """强 ETag 与 304；接受 gzip 时返回压缩版本，文件修改后 ETag 变化"""
+        url = "/api/problems/lesson_01/problem_01/problem"
+        plain = http_client.get(url, headers={"Accept-Encoding": "identity"})
+        assert plain.status_code == 200 and "content-encoding" not in plain.headers
+        etag = plain.headers["etag"]
+        assert plain.headers["cache-control"] == "no-cache" and "last-modified" in plain.headers
+
+        gz = http_client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip" and gz.text == plain.text
+        assert gz.headers["etag"] == etag[:-1] + '-gzip"'
+        assert int(gz.headers["content-length"]) < len(plain.content)
+
+        for tag in (etag, gz.headers["etag"], f'W/{etag}'):
+            resp = http_client.get(url, headers={"If-None-Match": tag})
+            assert resp.status_code == 304 and resp.content == b""
+        resp = http_client.get(url, headers={"If-Modified-Since": plain.headers["last-modified"]})
+        assert resp.status_code == 304
+
+        (problems_dir / "lesson_01" / "problem_01" / "README.md").write_text("# 新题面\n", encoding="utf-8")
+        resp = http_client.get(url, headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and resp.text == "# 新题面\n" and resp.headers["etag"] != etag
+
+    def test_compressed_copies_bounded(self, http_client, problems_dir, tmp_path_factory):
+        """源文件变化后旧的压缩文件被删除；缓存目录超过上限时删除最旧的文件"""
+        import os
+        import time
+        from app.utils import http_cache
+        url = "/api/problems/lesson_01/problem_01/problem"
+        cache_dir = http_cache.HTTP_CACHE_DIR
+        http_client.get(url, headers={"Accept-Encoding": "gzip"})
+        old = os.listdir(cache_dir)
+        assert len(old) == 1
+        (problems_dir / "lesson_01" / "problem_01" / "README.md").write_text("# 新题面\n" * 200, encoding="utf-8")
+        assert http_client.get(url, headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+        new = os.listdir(cache_dir)
+        assert len(new) == 1 and new != old
+
+        tmp_path = tmp_path_factory.mktemp("prune")
+        for i in range(5):
+            path = tmp_path / f"{i}.gz"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        assert http_cache.prune_cache_dir(str(tmp_path), 300) == 3
+        assert sorted(os.listdir(tmp_path)) == ["3.gz", "4.gz"]
+
+    def test_asset_cache_control_and_traversal(self, http_client):
+        """资源可缓存，不压缩二进制内容；不允许跳出题目目录"""
+        resp = http_client.get("/api/problems/lesson_01/problem_01/assets/dop.png", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200 and "content-encoding" not in resp.headers
+        assert resp.headers["cache-control"].startswith("public, max-age=")
+        assert http_client.get("/api/problems/lesson_01/problem_01/assets/..%2F..%2Findex.json").status_code == 404
+
+    def test_index_etag(self, http_client, problems_dir):
+        """索引的 ETag 随内容变化"""
+        resp = http_client.get("/api/problems/index")
+        assert resp.status_code == 200 and len(resp.json()) == 3
+        etag = resp.headers["etag"]
+        assert http_client.get("/api/problems/index", headers={"If-None-Match": etag}).status_code == 304
+        problems_service.delete_problem("lesson_01", "problem_01")
+        resp = http_client.get("/api/problems/index", headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and len(resp.json()) == 2
+
+
+class TestMarkdownRender:
+    """题面服务端渲染测试类"""
+
+    def test_render_and_sanitize(self):
+        """常用语法；代码块与前端一样带 hljs 类，危险链接被去掉，相对路径改写到资源路由"""
+        from app.services.markdown_render import render_markdown
+        text = ("# 标题\n\n请输出 **两数之和**，例如 `a+b`。\n第二行\n\n![图](./dop.png)\n\n"
+                "```python\nprint('<b>')\n```\n\n- 一\n- 二\n\n"
+                "[坏](javascript:alert(1)) [好](https://example.com) ![x](data:image/png;base64,AA==)")
+        out = render_markdown(text, "http://h/api/problems/l/p/assets/")
+        assert "<h1>标题</h1>" in out
+        assert "<p>请输出 <strong>两数之和</strong>，例如 <code>a+b</code>。<br>\n第二行</p>" in out
+        assert '<img src="http://h/api/problems/l/p/assets/dop.png" alt="图">' in out
+        assert "<pre class=\"hljs\"><code class=\"language-python\">print(&#x27;&lt;b&gt;&#x27;)\n</code></pre>" in out
+        assert "<ul>\n<li>一</li>\n<li>二</li>\n</ul>" in out
+        assert "javascript:" not in out and '<a href="https://example.com">好</a>' in out
+        assert '<img src="data:image/png;base64,AA=="' in out
+
+    @pytest.mark.parametrize("text", [
+        "**a *b** c*", "<b>粗体</b>", "面积为 $x^2$", "输出 \"Yes\"", "见 https://example.com", "a -- b",
+    ])
+    def test_unsupported_syntax_rejected(self, text):
+        """前端（markdown-it + KaTeX + DOMPurify）渲染结果不同的写法不做服务端渲染"""
+        from app.services.markdown_render import UnsupportedMarkdown, render_markdown
+        with pytest.raises(UnsupportedMarkdown):
+            render_markdown(text)
+
+    def test_html_endpoint_cached_and_invalidated(self, http_client, problems_dir):
+        """渲染结果缓存在磁盘并支持 304；删除后重建同编号题目时返回新内容"""
+        from app.services.markdown_render import get_markdown_cache
+        url = "/api/problems/lesson_01/problem_01/problem/html"
+        resp = http_client.get(url)
+        assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/html")
+        assert "<h1>题目</h1>" in resp.text
+        assert http_client.get(url, headers={"If-None-Match": resp.headers["etag"]}).status_code == 304
+        assert get_markdown_cache().stats()["renders"] == 1 and get_markdown_cache().stats()["hits"] == 1
+
+        first = problems_service.create_problem("lesson_01", "旧题", description="# 旧题面")
+        url = f"/api/problems/{first['path']}/problem/html"
+        assert "<h1>旧题面</h1>" in http_client.get(url).text
+        problems_service.delete_problem("lesson_01", first["problem"])
+        created = problems_service.create_problem("lesson_01", "新题", description="# 新题面\n\n![图](dop.png)")
+        assert created["problem"] == first["problem"]
+        resp = http_client.get(url)
+        assert "<h1>新题面</h1>" in resp.text
+        assert f'src="http://testserver/api/problems/{created["path"]}/assets/dop.png"' in resp.text
+        assert http_client.get("/api/problems/lesson_01/problem_09/problem/html").status_code == 404
+
+    def test_html_endpoint_unsupported_and_stale_files_removed(self, http_client, problems_dir):
+        """不支持的写法返回 422；题面修改后旧的渲染文件被删除"""
+        from app.services.markdown_render import get_markdown_cache
+        url = "/api/problems/lesson_01/problem_01/problem/html"
+        readme = problems_dir / "lesson_01" / "problem_01" / "README.md"
+        http_client.get(url)
+        cache_dir = get_markdown_cache()._dir()
+        assert len(os.listdir(cache_dir)) == 1
+        readme.write_text("# 改过的题目\n", encoding="utf-8")
+        assert "<h1>改过的题目</h1>" in http_client.get(url).text
+        assert len(os.listdir(cache_dir)) == 1
+
+        readme.write_text("输出 $a+b$\n", encoding="utf-8")
+        resp = http_client.get(url)
+        assert resp.status_code == 422 and "客户端渲染" in resp.json()["detail"]
+        assert http_client.get(url).status_code == 422
+        assert os.listdir(cache_dir) == [] and get_markdown_cache().stats()["unsupported"] == 1